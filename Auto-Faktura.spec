@@ -1,5 +1,12 @@
 # -*- mode: python ; coding: utf-8 -*-
+import importlib.util
 
+# The warm OCR engine (src.core.ocr_engine) is imported lazily, so PyInstaller
+# cannot see it - bundled when tesserocr is installed in the build environment,
+# otherwise the build falls back to pytesseract only
+OPTIONAL_IMPORTS = ['tesserocr'] if importlib.util.find_spec('tesserocr') is not None else []
+if not OPTIONAL_IMPORTS:
+    print("[WARN] tesserocr not installed - the build uses pytesseract only")
 
 a = Analysis(
     ['launcher.py'],
@@ -11,13 +18,29 @@ a = Analysis(
     ],
     hiddenimports=[
         'src.ui',
+        'src.cli',
         'src.core.ai_processor', 
         'src.core.excel_exporter',
         'src.core.get_eur_to_pln_rate',
         'src.core.ocr',
+        'src.core.ocr_engine',
+        'src.core.roi',
+        'src.core.pipeline',
+        'src.core.rate_limiter',
+        'src.core.ai_cache',
+        'src.core.local_extractor',
+        'src.core.vendor_templates',
+        'src.core.prompt_compactor',
+        'src.core.resilience',
+        'src.core.model_tiers',
+        'src.core.sinks',
+        'src.core.duplicate_index',
+        'src.core.rate_store',
+        'src.core.rate_table',
         'src.core.filename_parser',
+        'src.core.app_paths',
+        'src.core.disk_cache',
         'src.models.CompanyData',
-        'pandas',
         'openpyxl',
         'pytesseract',
         'fitz',
@@ -25,17 +48,20 @@ a = Analysis(
         'google.genai',
         'pydantic',
         'dotenv',
+        'watchdog.observers',
+        'watchdog.events',
         'tkinter',
         'tkinter.ttk',
         'tkinter.filedialog',
         'tkinter.messagebox',
         'threading',
         'datetime'
-    ],
+    ] + OPTIONAL_IMPORTS,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
     excludes=[
+        'pandas',  # no longer used - keeps the one-file bundle smaller to unpack
         'torch',
         'torchvision', 
         'tensorflow',
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exporting a small batch into a growing Excel ledger.
+
+For each ledger size the same batch of new invoices is exported with the
+previous implementation (pandas read -> concat -> write, then reopen with
+openpyxl for column widths) and with the in-place openpyxl append.
+Both produce a file with the same rows.
+
+Usage: python benchmarks/bench_excel_export.py [batch_size] [ledger sizes...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Convert with the fixed rate below - no NBP requests while timing
+os.environ.setdefault('PER_INVOICE_RATES', '0')
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from src.core.excel_exporter import COLUMN_WIDTHS, build_row, export_to_excel
+from src.models.CompanyData import CompanyDataModel
+
+
+def make_records(count: int, offset: int = 0):
+    return [
+        CompanyDataModel(
+            company_name=f"Firma{(offset + i) % 50}",
+            invoice_number=f"FV/{offset + i}",
+            topic_number=f"T{(offset + i) % 200}",
+            net_value=1000.0 + i,
+            gross_value=1230.0 + i,
+            vat_value=230.0,
+            currency="EUR" if i % 5 == 0 else "PLN",
+            filepath=f"Firma{i} FV{offset + i} T{i}.pdf",
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_export(records, rate: float, excel_file: str) -> None:
+    """The read-concat-rewrite-reload export this repo used before"""
+    new_df = pd.DataFrame([build_row(record, rate) for record in records])
+    if os.path.exists(excel_file):
+        combined_df = pd.concat([pd.read_excel(excel_file), new_df], ignore_index=True)
+    else:
+        combined_df = new_df
+    combined_df.to_excel(excel_file, index=False)
+    workbook = load_workbook(excel_file)
+    worksheet = workbook.active
+    for column, name in zip("ABCDEFGHIJ", COLUMN_WIDTHS):
+        worksheet.column_dimensions[column].width = COLUMN_WIDTHS[name]
+    workbook.save(excel_file)
+    workbook.close()
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sizes = [int(size) for size in sys.argv[2:]] or [1000, 5000, 20000]
+    batch = make_records(batch_size, offset=10 ** 6)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Eksport {batch_size} rekordów do rejestru o rozmiarze:")
+        for size in sizes:
+            base = os.path.join(directory, f"base_{size}.xlsx")
+            export_to_excel(make_records(size), 4.3, base)
+
+            legacy_file = os.path.join(directory, f"legacy_{size}.xlsx")
+            append_file = os.path.join(directory, f"append_{size}.xlsx")
+            shutil.copy(base, legacy_file)
+            shutil.copy(base, append_file)
+
+            legacy_ms = timed(legacy_export, batch, 4.3, legacy_file)
+            append_ms = timed(export_to_excel, batch, 4.3, append_file)
+            print(f"{size:>8} wierszy: read-concat-rewrite {legacy_ms:9.0f} ms, "
+                  f"dopisanie w miejscu {append_ms:9.0f} ms")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OCR route vs direct multimodal (page image) route, end to end.
+
+Builds scanned-looking multi-page TIF invoices and runs the whole pipeline
+over them in both extraction modes against a local stub model with a fixed
+per-request latency, so no network or API key is needed. Reports wall time
+and CPU time (this process plus child processes such as tesseract).
+Caches, the local extractor and vendor templates are disabled so every
+invoice reaches the model in both modes.
+
+Usage: python benchmarks/bench_extraction_mode.py [invoices] [pages] [stub_latency_s]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Indexes and caches of the run go to a scratch directory, never the user's own
+DATA_DIR = tempfile.mkdtemp(prefix="auto-faktura-bench-")
+os.environ['AUTO_FAKTURA_DATA_DIR'] = DATA_DIR
+os.environ.setdefault('OCR_CACHE', '0')
+os.environ.setdefault('AI_CACHE', '0')
+os.environ.setdefault('LOCAL_EXTRACTION', '0')
+os.environ.setdefault('VENDOR_TEMPLATES', '0')
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from src.core import ai_processor
+from src.core.pipeline import run_pipeline
+
+STUB_ANSWER = {"net_value": 20000.0, "gross_value": 24600.0, "vat_value": 4600.0, "currency": "PLN"}
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class StubClient:
+    """Stands in for genai.Client - answers every request after a fixed latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.models = self
+        self.requests = 0
+
+    def generate_content(self, model, contents, config):
+        self.requests += 1
+        time.sleep(self.latency)
+        return _StubResponse(json.dumps(STUB_ANSWER))
+
+
+def build_sample_tif(path: str, pages: int, index: int = 0) -> None:
+    """Render invoice-like pages at ~144 DPI and save them as a multi-page TIF scan"""
+    document = fitz.open()
+    images = []
+    for page_num in range(pages):
+        page = document.new_page(width=595, height=842)
+        # The invoice number makes every sample a different file
+        lines = [f"FAKTURA VAT nr FV/2024/{index + 1:03d}/{page_num + 1}", "Sprzedawca: Przykładowa Firma Sp. z o.o."]
+        lines += [f"{i + 1}. Usługa transportowa  1 000,00  23%  1 230,00" for i in range(20)]
+        if page_num == pages - 1:
+            lines += ["Razem netto: 20 000,00 zł", "VAT 23%: 4 600,00 zł", "Do zapłaty: 24 600,00 zł"]
+        for line_num, line in enumerate(lines):
+            page.insert_text((40, 60 + line_num * 18), line, fontsize=11)
+        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), colorspace=fitz.csGRAY, alpha=False)
+        images.append(Image.frombytes("L", (pix.width, pix.height), pix.samples))
+    document.close()
+    images[0].save(path, save_all=True, append_images=images[1:], compression="tiff_deflate")
+
+
+def run(file_paths, mode: str):
+    times_before = os.times()
+    start = time.perf_counter()
+    # Every mode processes every invoice - nothing is skipped as already exported
+    result = run_pipeline(file_paths, 4.3, exporter=lambda records, rate: True, extraction_mode=mode,
+                          skip_known=False)
+    wall = time.perf_counter() - start
+    times_after = os.times()
+    cpu = sum(after - before for after, before in zip(times_after[:4], times_before[:4]))
+    return wall, cpu, result
+
+
+if __name__ == "__main__":
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+
+    stub = StubClient(latency)
+    ai_processor.set_client(stub)
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_paths = []
+        for index in range(invoices):
+            path = os.path.join(directory, f"Firma{index} FV{index} T{index}.tif")
+            build_sample_tif(path, pages, index)
+            file_paths.append(path)
+
+        print(f"{invoices} faktur TIF x {pages} stron, opóźnienie stubu {latency:.2f} s")
+        for mode in ('ocr', 'image'):
+            stub.requests = 0
+            wall, cpu, result = run(file_paths, mode)
+            print(f"{mode:>5}: {wall:7.2f} s wall, {cpu:7.2f} s CPU, "
+                  f"{wall / invoices * 1000:7.0f} ms/fakturę, zapytań do modelu: {stub.requests}, "
+                  f"błędy: {len(result.failed_files)}")
+
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
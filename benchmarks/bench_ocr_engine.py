@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-call pytesseract vs warm tesserocr engine.
+
+OCRs the same synthetic invoice page several times with each engine and
+reports the average time per page. The difference is mostly tesseract
+process startup and traineddata loading, which the warm engine pays once.
+
+Usage: python benchmarks/bench_ocr_engine.py [pages]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import fitz  # PyMuPDF
+
+from src.core.ocr import _pixmap_to_image, _render_page
+from src.core.ocr_engine import PytesseractEngine, TesserocrEngine, tesserocr_available
+
+
+def build_sample_page():
+    """Create an A4 page with an invoice-like summary block"""
+    document = fitz.open()
+    page = document.new_page(width=595, height=842)
+    lines = ["FAKTURA VAT nr FV/2024/001", "Sprzedawca: Przykładowa Firma Sp. z o.o."]
+    lines += [f"{i + 1}. Usługa transportowa  1 000,00  23%  1 230,00" for i in range(20)]
+    lines += ["Razem netto: 20 000,00 zł", "VAT 23%: 4 600,00 zł", "Do zapłaty: 24 600,00 zł"]
+    for line_num, line in enumerate(lines):
+        page.insert_text((40, 60 + line_num * 18), line, fontsize=11)
+    return document, page
+
+
+def measure(engine, image, pages: int) -> float:
+    # First call includes engine warm-up for the warm engine - keep it in the total
+    start = time.perf_counter()
+    for _ in range(pages):
+        engine.recognize(image)
+    return (time.perf_counter() - start) * 1000 / pages
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    document, page = build_sample_page()
+    pix = _render_page(page, grayscale=True)
+    image = _pixmap_to_image(pix).copy()
+    document.close()
+    
+    per_call = PytesseractEngine()
+    print(f"pytesseract (per-call process): {measure(per_call, image, pages):8.1f} ms/page")
+    
+    if tesserocr_available():
+        start = time.perf_counter()
+        warm = TesserocrEngine()
+        init_ms = (time.perf_counter() - start) * 1000
+        try:
+            print(f"tesserocr   (warm engine):      {measure(warm, image, pages):8.1f} ms/page"
+                  f"  (one-time init {init_ms:.0f} ms)")
+        finally:
+            warm.close()
+    else:
+        print("tesserocr not installed - pip install tesserocr to compare the warm engine")
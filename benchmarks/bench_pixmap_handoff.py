@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: PNG round-trip vs direct pixmap buffer handoff to PIL.
+
+Renders a synthetic invoice-like page at OCR resolution and measures only the
+pixmap -> PIL image step (no Tesseract), so the numbers show the per-page
+overhead removed from the OCR path.
+
+Usage: python benchmarks/bench_pixmap_handoff.py [iterations]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from src.core.ocr import _pixmap_to_image, _render_page
+
+
+def build_sample_page():
+    """Create an A4 page filled with invoice-like text lines"""
+    document = fitz.open()
+    page = document.new_page(width=595, height=842)
+    for line in range(60):
+        page.insert_text((40, 40 + line * 13), f"Pozycja {line + 1:02d}  Usługa transportowa  1 234,56 zł  23%  1 518,51 zł", fontsize=9)
+    return document, page
+
+
+def png_round_trip(pix) -> Image.Image:
+    image = Image.open(io.BytesIO(pix.tobytes("png")))
+    image.load()
+    return image
+
+
+def direct_handoff(pix) -> Image.Image:
+    image = _pixmap_to_image(pix)
+    image.load()
+    return image
+
+
+def measure(label: str, page, grayscale: bool, convert, iterations: int):
+    pix = _render_page(page, grayscale)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        convert(pix)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+    buffer_kb = len(pix.samples) / 1024
+    print(f"{label:<28} {elapsed_ms:8.2f} ms/page   pixmap buffer {buffer_kb:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    document, page = build_sample_page()
+    try:
+        measure("RGB  + PNG round-trip", page, False, png_round_trip, iterations)
+        measure("RGB  + direct buffer", page, False, direct_handoff, iterations)
+        measure("Gray + PNG round-trip", page, True, png_round_trip, iterations)
+        measure("Gray + direct buffer", page, True, direct_handoff, iterations)
+    finally:
+        document.close()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: EUR/PLN lookup against slow and failing rate sources, offline.
+
+Local HTTP servers stand in for NBP, exchangerate-api and fixer. Each scenario
+makes some of them slow or failing, and the lookup is timed both with the
+previous sequential failover and with the hedged parallel lookup.
+
+The hedged lookup is also checked: NBP must win whenever it answers within the
+hedge delay, a fallback must win when NBP hangs, and every result must come
+back within the deadline. A failed check ends the run with an AssertionError.
+
+Usage: python benchmarks/bench_rate_sources.py [hedge_delay] [deadline]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.get_eur_to_pln_rate import (
+    RATE_REQUEST_TIMEOUT, fetch_eur_to_pln_quote, fetch_exchangerate_api, fetch_fixer, fetch_nbp,
+)
+
+NBP_BODY = {'rates': [{'mid': 4.2711, 'effectiveDate': '2024-05-06'}]}
+LATEST_BODY = {'rates': {'PLN': 4.2750}, 'date': '2024-05-06'}
+
+# Time the lookup may take past the deadline (thread start-up, HTTP round trips)
+DEADLINE_SLACK = 0.2
+
+
+def scenarios(hedge_delay: float):
+    """
+    Scenario name -> (behaviour of (nbp, exchangerate-api, fixer), expected winning source).
+    A behaviour is a delay in seconds, or 'fail' / 'hang'.
+    """
+    slow = hedge_delay + 2.5
+    return {
+        'wszystkie sprawne': ((0.05, 0.05, 0.05), 'nbp'),
+        # Fallbacks would answer first, but NBP is within its head start
+        'NBP w czasie hedgingu': ((hedge_delay * 0.6, 0.01, 0.01), 'nbp'),
+        f'NBP wolne ({slow:.1f} s)': ((slow, 0.1, 0.1), 'exchangerate-api'),
+        'NBP zwraca 500': (('fail', 0.1, 0.1), 'exchangerate-api'),
+        'NBP wisi, API zwraca 500': (('hang', 'fail', 0.2), 'fixer'),
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves a rate body after the configured delay, or an error"""
+    behaviour = {}
+
+    def do_GET(self):
+        name = self.path.strip('/').split('?')[0]
+        mode = self.behaviour.get(name, 0)
+        if mode == 'fail':
+            self.send_error(500)
+            return
+        time.sleep(30 if mode == 'hang' else mode)
+        body = json.dumps(NBP_BODY if name == 'nbp' else LATEST_BODY).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # client gave up
+
+    def log_message(self, *args):
+        pass
+
+
+def sequential_quote(sources):
+    """The failover this repo used before: one source after another, full timeout each"""
+    for name, fetch in sources:
+        try:
+            rate, effective_date = fetch(timeout=RATE_REQUEST_TIMEOUT)
+            return rate, name, effective_date
+        except Exception:
+            continue
+    return None
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+if __name__ == "__main__":
+    hedge_delay = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    deadline = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    sources = [
+        ('nbp', partial(fetch_nbp, f"{base}/nbp")),
+        ('exchangerate-api', partial(fetch_exchangerate_api, f"{base}/exchangerate-api")),
+        ('fixer', partial(fetch_fixer, f"{base}/fixer")),
+    ]
+
+    print(f"Opóźnienie hedgingu {hedge_delay} s, limit całkowity {deadline} s")
+    try:
+        for scenario, (behaviour, expected) in scenarios(hedge_delay).items():
+            StandInHandler.behaviour = dict(zip(('nbp', 'exchangerate-api', 'fixer'), behaviour))
+            sequential_ms, sequential = timed(sequential_quote, sources)
+            hedged_ms, hedged = timed(fetch_eur_to_pln_quote, deadline=deadline,
+                                      hedge_delay=hedge_delay, sources=sources)
+            print(f"{scenario:<28} sekwencyjnie {sequential_ms:8.0f} ms ({sequential[1] if sequential else '-'}), "
+                  f"równolegle {hedged_ms:8.0f} ms ({hedged[1] if hedged else '-'})")
+
+            assert hedged is not None, f"{scenario}: no rate within the deadline"
+            assert hedged[1] == expected, f"{scenario}: {hedged[1]} won, expected {expected}"
+            assert hedged_ms <= (deadline + DEADLINE_SLACK) * 1000, \
+                f"{scenario}: {hedged_ms:.0f} ms exceeds the {deadline} s deadline"
+    finally:
+        server.shutdown()
+    print("[OK] Wszystkie scenariusze zgodne z oczekiwaniami")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-invoice-date EUR/USD/GBP rates, one request per invoice vs range prefetch.
+
+A local HTTP server stands in for the NBP table A API (with a fixed latency per
+request). The same invoices are converted once by asking for each invoice's
+rate separately, and once through RateTable, which fetches the whole date range
+in as few requests as possible and then answers every lookup from memory.
+
+Usage: python benchmarks/bench_rate_table.py [invoices] [days] [latency_ms]
+"""
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.rate_table import RATE_LOOKBACK_DAYS, RateTable, fetch_nbp_tables
+
+CURRENCIES = ('EUR', 'USD', 'GBP')
+
+
+class NbpStandIn(BaseHTTPRequestHandler):
+    """Serves /tables/A/<start>/<end>/ with a table for every weekday in the range"""
+    latency = 0.05
+    requests = 0
+
+    def do_GET(self):
+        NbpStandIn.requests += 1
+        time.sleep(self.latency)
+        parts = self.path.split('?')[0].strip('/').split('/')
+        start, end = datetime.date.fromisoformat(parts[2]), datetime.date.fromisoformat(parts[3])
+        tables = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                tables.append({'effectiveDate': day.isoformat(), 'rates': [
+                    {'code': code, 'mid': 4.0 + index / 10 + day.toordinal() % 100 / 1000}
+                    for index, code in enumerate(CURRENCIES)]})
+            day += datetime.timedelta(days=1)
+        if not tables:
+            self.send_error(404)
+            return
+        body = json.dumps(tables).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_invoice(invoices, fetcher):
+    """One request per invoice: the tables of the days before its date, the latest one wins"""
+    rates = []
+    for currency, day in invoices:
+        tables = fetcher(day - datetime.timedelta(days=RATE_LOOKBACK_DAYS), day - datetime.timedelta(days=1))
+        rates.append(tables[max(tables)][currency])
+    return rates
+
+
+def prefetched(invoices, table):
+    table.prefetch_dates(day for _, day in invoices)
+    return [table.lookup(currency, day)[0] for currency, day in invoices]
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    NbpStandIn.latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), NbpStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/tables/A/{{start}}/{{end}}/"
+    fetcher = partial(fetch_nbp_tables, url=url)
+
+    random.seed(1)
+    last_day = datetime.date.today() - datetime.timedelta(days=1)
+    invoices = [(random.choice(CURRENCIES), last_day - datetime.timedelta(days=random.randrange(days)))
+                for _ in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        naive = per_invoice(invoices, fetcher)
+        naive_ms = (time.perf_counter() - start) * 1000
+        naive_requests, NbpStandIn.requests = NbpStandIn.requests, 0
+
+        table = RateTable(os.path.join(directory, "nbp_table_a.json"), fetcher=fetcher)
+        start = time.perf_counter()
+        bulk = prefetched(invoices, table)
+        bulk_ms = (time.perf_counter() - start) * 1000
+        bulk_requests = NbpStandIn.requests
+
+        start = time.perf_counter()
+        for currency, day in invoices:
+            table.lookup(currency, day)
+        lookup_us = (time.perf_counter() - start) * 1e6 / count
+
+    assert naive == bulk, "both methods must pick the same rates"
+    print(f"{count} faktur z {days} dni, opóźnienie {NbpStandIn.latency * 1000:.0f} ms na zapytanie")
+    print(f"kurs na fakturę:   {naive_ms:8.0f} ms, {naive_requests} zapytań")
+    print(f"pobranie zakresu:  {bulk_ms:8.0f} ms, {bulk_requests} zapytań, wyszukanie {lookup_us:.1f} µs")
+    server.shutdown()
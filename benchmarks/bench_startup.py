@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: import time of the application entry modules, from `python -X importtime`.
+
+Each module is imported in a fresh interpreter several times; the median
+cumulative import time is reported with the slowest imported modules.
+Startup modules (the UI) must not import any of the heavy packages - those
+load on first use - so the benchmark exits with status 1 when one of them
+shows up, or when the median exceeds the optional budget.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--budget MS] [modules...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Imported before the window is shown - nothing heavy allowed
+STARTUP_MODULES = ('src.ui',)
+# Packages that must load lazily
+HEAVY_MODULES = ('fitz', 'PIL', 'pytesseract', 'tesserocr', 'google.genai', 'pydantic',
+                 'openpyxl', 'pandas', 'requests', 'dotenv.main')
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """{imported module: (self us, cumulative us)} of importing module in a fresh interpreter"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def heavy_imports(times: Dict[str, Tuple[int, int]]) -> List[str]:
+    return sorted(name for name in times
+                  if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Czas importu modułów startowych")
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_MODULES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, help="maksymalny czas importu w ms")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        # The first run also compiles bytecode - not counted
+        import_times(module)
+        runs = [import_times(module) for _ in range(args.runs)]
+        median_ms = statistics.median(times[module][1] for times in runs) / 1000
+
+        print(f"{module}: {median_ms:.1f} ms (mediana z {args.runs})")
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:10]
+        for name, (self_us, cumulative_us) in slowest:
+            print(f"    {self_us / 1000:7.1f} ms  {name}")
+
+        heavy = heavy_imports(runs[-1])
+        if module in STARTUP_MODULES and heavy:
+            print(f"[WARN] {module} ładuje przy starcie: {', '.join(heavy)}")
+            failed = True
+        if args.budget is not None and median_ms > args.budget:
+            print(f"[WARN] {module} przekracza budżet {args.budget:.0f} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Check: concurrent AI extraction keeps the input order and stays within the quota.
+
+A stub client stands in for Gemini and answers each invoice with its own
+amounts after a random delay, so calls complete out of order. The shared rate
+limiter is replaced with a small, fast-refilling request bucket, and the times
+of the stub calls must never exceed what the bucket allows. No network or API
+key is needed.
+
+Usage: python benchmarks/check_concurrent_extraction.py [invoices] [concurrency]
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('AI_CACHE', '0')
+os.environ.setdefault('LOCAL_EXTRACTION', '0')
+os.environ.setdefault('VENDOR_TEMPLATES', '0')
+os.environ.setdefault('AI_BATCH_TOKEN_BUDGET', '0')
+
+from src.core import ai_processor
+from src.core.rate_limiter import RateLimiter, TokenBucket
+
+# Request bucket of the check: a burst of BURST calls, then REFILL_PER_SECOND
+BURST = 3
+REFILL_PER_SECOND = 10.0
+NET_PATTERN = re.compile(r'Razem netto: (\d+)')
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class StubClient:
+    """Answers with the net amount found in the prompt, after a random delay"""
+
+    def __init__(self):
+        self.models = self
+        self.call_times = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        with self._lock:
+            self.call_times.append(time.monotonic())
+        time.sleep(random.uniform(0, 0.08))
+        net_value = float(NET_PATTERN.search(contents).group(1))
+        vat_value = round(net_value * 0.23, 2)
+        return _StubResponse(json.dumps({"net_value": net_value, "vat_value": vat_value,
+                                         "gross_value": net_value + vat_value, "currency": "PLN"}))
+
+
+def invoice_text(number: int) -> str:
+    net_value = (number + 1) * 100
+    return (f"Faktura VAT nr FV/{number}\nRazem netto: {net_value},00 zł\n"
+            f"VAT 23%: {net_value * 0.23:.2f} zł\nDo zapłaty: {net_value * 1.23:.2f} zł")
+
+
+def quota_violations(call_times):
+    """Pairs of calls closer together than the bucket allows"""
+    call_times = sorted(call_times)
+    violations = []
+    for first in range(len(call_times)):
+        for last in range(first + BURST, len(call_times)):
+            allowed = BURST + (call_times[last] - call_times[first]) * REFILL_PER_SECOND
+            # One extra call of slack for timer resolution
+            if last - first + 1 > allowed + 1:
+                violations.append((first, last))
+    return violations
+
+
+if __name__ == "__main__":
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+
+    random.seed(1)
+    stub = StubClient()
+    ai_processor.set_client(stub)
+    limiter = RateLimiter()
+    limiter.requests = TokenBucket(BURST, REFILL_PER_SECOND)
+    ai_processor.set_rate_limiter(limiter)
+
+    invoice_data = [(f"Firma{number} FV{number} T{number}.pdf", invoice_text(number)) for number in range(invoices)]
+    start = time.perf_counter()
+    records = ai_processor.gather_specific_data(invoice_data, concurrency=concurrency, deadline_seconds=0)
+    elapsed = time.perf_counter() - start
+
+    assert [record.filepath for record in records] == [file_path for file_path, _ in invoice_data], \
+        "records must come back in input order"
+    for number, record in enumerate(records):
+        assert record.extraction_error is None, f"{record.filepath}: {record.extraction_error}"
+        assert record.net_value == (number + 1) * 100, f"{record.filepath} got the amounts of another invoice"
+    assert len(stub.call_times) == invoices, f"expected {invoices} model calls, got {len(stub.call_times)}"
+    violations = quota_violations(stub.call_times)
+    assert not violations, f"{len(violations)} call windows exceed the rate limit"
+    minimum = (invoices - BURST) / REFILL_PER_SECOND
+    assert elapsed >= minimum * 0.9, f"{elapsed:.2f} s is faster than the limiter allows ({minimum:.2f} s)"
+
+    print(f"{invoices} faktur, {concurrency} wątków: {elapsed:.2f} s (limit pozwala najszybciej {minimum:.2f} s)")
+    print("[OK] Kolejność zachowana, limit zapytań przestrzegany")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Check: near-duplicate detection keeps different invoices printed from one template.
+
+Two invoices of one vendor are drawn from the same layout - only the invoice
+number and the amounts differ - so their perceptual page hashes are close.
+Both must still be processed, while a rescan of the first one under a file name
+outside the naming scheme is skipped. Runs against a temporary duplicate index.
+
+Usage: python benchmarks/check_near_duplicates.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from PIL import Image, ImageDraw
+
+from src.core.disk_cache import file_sha256
+from src.core.duplicate_index import DuplicateIndex, document_distance
+from src.core.ocr import page_hashes
+from src.core.pipeline import skip_duplicates
+
+
+def draw_invoice(invoice_number: str, amounts) -> Image.Image:
+    """A4 page at 100 DPI: vendor header, item table and totals in fixed places"""
+    image = Image.new('L', (827, 1169), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((60, 60, 400, 160), outline=0, width=3)
+    draw.text((80, 80), "ACME Sp. z o.o.\nul. Przykładowa 1\n00-001 Warszawa", fill=0)
+    draw.text((500, 80), f"Faktura VAT nr {invoice_number}", fill=0)
+    for row in range(12):
+        top = 260 + row * 40
+        draw.line((60, top, 767, top), fill=0, width=2)
+        if row < len(amounts):
+            draw.text((80, top + 12), f"Pozycja {row + 1}", fill=0)
+            draw.text((620, top + 12), f"{amounts[row]:.2f}", fill=0)
+    draw.rectangle((480, 800, 767, 900), outline=0, width=3)
+    draw.text((500, 820), f"Netto: {sum(amounts):.2f}\nVAT: {sum(amounts) * 0.23:.2f}", fill=0)
+    return image
+
+
+def rescan(image: Image.Image) -> Image.Image:
+    """The same paper scanned again: wider margins and another resolution"""
+    padded = Image.new('L', (image.width + 80, image.height + 60), 255)
+    padded.paste(image, (50, 20))
+    return padded.resize((padded.width * 3 // 2, padded.height * 3 // 2), Image.Resampling.BILINEAR)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        first = draw_invoice("FV/001/2024", [120.0, 80.5, 42.0])
+        second = draw_invoice("FV/002/2024", [999.0, 15.0, 310.25, 7.5])
+        paths = {
+            'first': os.path.join(directory, "ACME FV-001-2024 T12.tif"),
+            'second': os.path.join(directory, "ACME FV-002-2024 T12.tif"),
+            'rescan': os.path.join(directory, "skan0001.tif"),
+        }
+        first.save(paths['first'])
+        second.save(paths['second'])
+        rescan(first).save(paths['rescan'])
+
+        index = DuplicateIndex(os.path.join(directory, "index.sqlite3"))
+        distance = document_distance(page_hashes(paths['first']), page_hashes(paths['second']))
+        print(f"Różnica skrótów faktur z jednego szablonu: {distance} bitów (próg {index.near_threshold})")
+
+        to_process, duplicates, _ = skip_duplicates([paths['first'], paths['second'], paths['rescan']], index)
+        for file_path, reason in duplicates:
+            print(f"pominięto {os.path.basename(file_path)}: {reason}")
+        assert to_process == [paths['first'], paths['second']], \
+            f"both invoices must be processed, got {[os.path.basename(path) for path in to_process]}"
+        assert [path for path, _ in duplicates] == [paths['rescan']], "the rescan must be skipped"
+
+        # The same against invoices exported in an earlier run
+        index = DuplicateIndex(os.path.join(directory, "exported.sqlite3"))
+        index.register("ACME", "FV-001-2024", file_sha256(paths['first']), os.path.basename(paths['first']),
+                       page_hashes(paths['first']))
+        reason, _ = index.check_file(paths['second'], near_duplicates=True)
+        assert reason is None, f"the second invoice must not be skipped: {reason}"
+        reason, _ = index.check_file(paths['rescan'], near_duplicates=True)
+        assert reason is not None, "the rescan of an exported invoice must be skipped"
+    print("[OK] Faktury z jednego szablonu nie są pomijane, ponowny skan jest")
@@ -4,12 +4,20 @@ Main launcher for the Invoice Reader application
 """
 import sys
 import os
+import multiprocessing
 
 # Add the src directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+from dotenv import load_dotenv
+
+# Before any src module reads its settings from the environment
+load_dotenv()
+
 from src.ui import ModernPDFProcessor
 
 if __name__ == "__main__":
+    # Required for the OCR process pool in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     app = ModernPDFProcessor()
     app.run()
\ No newline at end of file
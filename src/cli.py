@@ -0,0 +1,306 @@
+"""
+Headless batch processing: files, folders and glob patterns, optionally
+watching inbox folders and processing new scans as they land.
+
+Usage: python -m src.cli [paths / folders / "globs"...] [--recursive] [--watch] ...
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+# Before any src module reads its settings from the environment
+load_dotenv()
+
+from src.core.duplicate_index import SUPPORTED_EXTENSIONS, list_invoice_files
+from src.core.pipeline import DEFAULT_AI_WORKERS, EXTRACTION_MODE, EXTRACTION_MODES, PipelineResult, run_pipeline
+from src.core.rate_store import get_eur_to_pln_rate_cached
+from src.core.sinks import LEDGER_SINK, SINK_NAMES, create_sink
+
+# Watch mode: seconds between checks of the inbox, and how long a new file
+# must stay unchanged before it is processed (scanners write files gradually)
+WATCH_INTERVAL = float(os.getenv('WATCH_INTERVAL', '2'))
+WATCH_SETTLE_SECONDS = float(os.getenv('WATCH_SETTLE_SECONDS', '3'))
+# Failed files are retried after WATCH_RETRY_DELAY seconds, doubling up to
+# WATCH_RETRY_MAX_DELAY, and given up after WATCH_MAX_RETRIES attempts
+WATCH_RETRY_DELAY = float(os.getenv('WATCH_RETRY_DELAY', '30'))
+WATCH_RETRY_MAX_DELAY = float(os.getenv('WATCH_RETRY_MAX_DELAY', '900'))
+WATCH_MAX_RETRIES = int(os.getenv('WATCH_MAX_RETRIES', '5'))
+
+
+def _is_invoice_file(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS and os.path.isfile(path)
+
+
+def collect_files(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """
+    Invoice files named by the inputs, each listed once in input order.
+
+    Args:
+        inputs: Files, folders or glob patterns (** matches subfolders with recursive)
+        recursive: Include subfolders of folders and let ** span folder levels
+
+    Returns:
+        PDF and TIF files; folders are listed in name order
+    """
+    files: List[str] = []
+    seen: Set[str] = set()
+
+    def add(path: str) -> None:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for path in list_invoice_files(item, recursive):
+                add(path)
+        elif os.path.isfile(item):
+            if _is_invoice_file(item):
+                add(item)
+            else:
+                print(f"[WARN] Pominięto nieobsługiwany plik: {item}")
+        else:
+            matches = sorted(glob.glob(item, recursive=recursive))
+            if not matches:
+                print(f"[WARN] Brak plików pasujących do: {item}")
+            for path in matches:
+                if os.path.isdir(path):
+                    for folder_file in list_invoice_files(path, recursive):
+                        add(folder_file)
+                elif _is_invoice_file(path):
+                    add(path)
+    return files
+
+
+class InboxWatcher:
+    """
+    New invoice files in watched folders, handed out once they stop changing.
+
+    Filesystem events come from watchdog (inotify / ReadDirectoryChangesW / FSEvents)
+    when it is installed; otherwise the folders are listed every check.
+    Files reported as failed are handed out again after a growing delay.
+    """
+
+    def __init__(self, folders: List[str], recursive: bool = False, settle_seconds: Optional[float] = None):
+        self.folders = folders
+        self.recursive = recursive
+        self.settle_seconds = WATCH_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self._lock = threading.Lock()
+        self._seen: Set[str] = set()
+        # path -> ((size, mtime), monotonic time it last changed)
+        self._pending: Dict[str, Tuple[Optional[Tuple[int, int]], float]] = {}
+        # path -> (failed attempts, monotonic time of the next attempt)
+        self._retries: Dict[str, Tuple[int, float]] = {}
+        self._observer = None
+
+    @property
+    def mode(self) -> str:
+        return "watchdog" if self._observer is not None else "polling"
+
+    def _list_files(self) -> List[str]:
+        files = []
+        for folder in self.folders:
+            files.extend(list_invoice_files(folder, self.recursive))
+        return files
+
+    def _add(self, path: str) -> None:
+        if os.path.splitext(path)[1].lower() not in SUPPORTED_EXTENSIONS:
+            return
+        with self._lock:
+            if path not in self._seen and path not in self._pending:
+                self._pending[path] = (None, time.monotonic())
+
+    def start(self) -> List[str]:
+        """
+        Start watching. Files already in the folders are not reported.
+
+        Returns:
+            Files present when watching started
+        """
+        existing = self._list_files()
+        with self._lock:
+            self._seen.update(existing)
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return existing
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher._add(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher._add(event.dest_path)
+
+        observer = Observer()
+        for folder in self.folders:
+            observer.schedule(Handler(), folder, recursive=self.recursive)
+        observer.start()
+        self._observer = observer
+        return existing
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def take_ready(self) -> List[str]:
+        """New files that have not changed for settle_seconds - each is returned once"""
+        if self._observer is None:
+            for path in self._list_files():
+                self._add(path)
+
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            pending = list(self._pending.items())
+        for path, (signature, changed_at) in pending:
+            with self._lock:
+                retry = self._retries.get(path)
+            if retry is not None and now < retry[1]:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Moved away or deleted before it settled
+                with self._lock:
+                    self._pending.pop(path, None)
+                    self._retries.pop(path, None)
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                with self._lock:
+                    self._pending[path] = (current, now)
+            elif stat.st_size > 0 and now - changed_at >= self.settle_seconds:
+                ready.append(path)
+                with self._lock:
+                    self._pending.pop(path, None)
+                    self._seen.add(path)
+        return sorted(ready)
+
+    def mark_processed(self, file_paths: List[str], failed_paths: List[str]) -> None:
+        """Report the outcome of a run: failed files are queued again with a backoff"""
+        now = time.monotonic()
+        failed = set(failed_paths)
+        with self._lock:
+            for path in file_paths:
+                if path not in failed:
+                    self._retries.pop(path, None)
+                    continue
+                attempts = self._retries.get(path, (0, 0.0))[0] + 1
+                if attempts > WATCH_MAX_RETRIES:
+                    print(f"[WARN] Rezygnuję z {os.path.basename(path)} po {WATCH_MAX_RETRIES} próbach")
+                    self._retries.pop(path, None)
+                    continue
+                delay = min(WATCH_RETRY_DELAY * 2 ** (attempts - 1), WATCH_RETRY_MAX_DELAY)
+                self._retries[path] = (attempts, now + delay)
+                self._seen.discard(path)
+                # Ready again once the delay is over and the file is still unchanged
+                self._pending[path] = (None, now)
+
+
+def process_files(file_paths: List[str], args: argparse.Namespace) -> PipelineResult:
+    """One pipeline run over the files with the stored EUR/PLN rate"""
+    eur_to_pln_rate, rate_source = get_eur_to_pln_rate_cached()
+    print(f"[INFO] Przetwarzanie {len(file_paths)} plików (kurs EUR/PLN {eur_to_pln_rate:.4f}, {rate_source})")
+    result = run_pipeline(file_paths, eur_to_pln_rate, ocr_workers=args.ocr_workers, ai_workers=args.ai_workers,
+                          exporter=create_sink(args.sink, args.output), extraction_mode=args.mode,
+                          skip_known=False if args.no_dedupe else None)
+
+    if result.duplicate_files:
+        print(f"{len(result.duplicate_files)} file(s) skipped as already exported.")
+    if result.processed == 0 and not result.duplicate_files:
+        print("No valid files to process.")
+    if result.failed_files:
+        print(f"{len(result.failed_files)} file(s) failed and can be re-queued.")
+    return result
+
+
+def watch(folders: List[str], args: argparse.Namespace) -> None:
+    """Process new files in the folders until interrupted"""
+    watcher = InboxWatcher(folders, args.recursive, args.settle)
+    existing = watcher.start()
+    print(f"[INFO] Obserwuję {', '.join(folders)} ({watcher.mode}) - Ctrl+C kończy")
+
+    def run(file_paths: List[str]) -> None:
+        try:
+            failed = [path for path, _ in process_files(file_paths, args).failed_files]
+        except Exception as e:
+            # Keep watching - the whole batch is retried later
+            print(f"[WARN] Błąd podczas przetwarzania {len(file_paths)} plików: {e}")
+            failed = file_paths
+        watcher.mark_processed(file_paths, failed)
+
+    try:
+        # Files already waiting in the inbox - the duplicate index skips exported ones
+        if existing and not args.skip_existing:
+            run(existing)
+
+        while True:
+            ready = watcher.take_ready()
+            if ready:
+                run(ready)
+            else:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("[INFO] Zakończono obserwowanie")
+    finally:
+        watcher.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Eksport danych z faktur PDF/TIFF bez interfejsu graficznego")
+    parser.add_argument("inputs", nargs="*", help="pliki, foldery lub wzorce (np. \"skany/**/*.pdf\")")
+    parser.add_argument("-r", "--recursive", action="store_true", help="przeszukaj też podfoldery")
+    parser.add_argument("--ocr-workers", type=int, default=1, help="dokumenty OCR-owane równocześnie")
+    parser.add_argument("--ai-workers", type=int, default=DEFAULT_AI_WORKERS, help="równoczesne zapytania AI")
+    parser.add_argument("--mode", choices=EXTRACTION_MODES, default=EXTRACTION_MODE, help="sposób odczytu kwot")
+    parser.add_argument("--sink", choices=SINK_NAMES, default=LEDGER_SINK, help="miejsce eksportu")
+    parser.add_argument("-o", "--output", help="plik Excel / rejestru (domyślnie w Pobranych)")
+    parser.add_argument("--no-dedupe", action="store_true", help="przetwórz też faktury wyeksportowane wcześniej")
+    parser.add_argument("-w", "--watch", action="store_true", help="obserwuj foldery i przetwarzaj nowe pliki")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="sekundy między sprawdzeniami")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS,
+                        help="sekundy bez zmian, po których nowy plik jest przetwarzany")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="w trybie obserwacji pomiń pliki obecne przed startem")
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        folders = [item for item in args.inputs if os.path.isdir(item)]
+        if not folders:
+            parser.error("--watch wymaga co najmniej jednego folderu")
+        # Files and patterns next to the folders are processed once
+        file_paths = collect_files([item for item in args.inputs if not os.path.isdir(item)], args.recursive)
+        if file_paths:
+            process_files(file_paths, args)
+        watch(folders, args)
+        return 0
+
+    file_paths = collect_files(args.inputs, args.recursive)
+    if not file_paths:
+        print("No valid files to process.")
+        return 0
+    result = process_files(file_paths, args)
+    return 1 if result.failed_files else 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    # Required for the OCR process pool in frozen builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Optional
+
+from src.core.app_paths import get_app_data_dir
+from src.core.disk_cache import DiskCache
+
+# Persistent cache of AI extraction results - identical invoice text is not sent to the model twice
+AI_CACHE_ENABLED = os.getenv('AI_CACHE', '1') not in ('0', 'false', 'False')
+AI_CACHE_MAX_MB = int(os.getenv('AI_CACHE_MAX_MB', '20'))
+AI_CACHE_MAX_AGE_DAYS = int(os.getenv('AI_CACHE_MAX_AGE_DAYS', '180'))
+
+_ai_cache: Optional[DiskCache] = None
+_ai_cache_lock = threading.Lock()
+
+
+def get_ai_cache() -> DiskCache:
+    """Return the shared AI result cache"""
+    global _ai_cache
+    with _ai_cache_lock:
+        if _ai_cache is None:
+            _ai_cache = DiskCache(
+                get_app_data_dir("ai_cache"),
+                max_bytes=AI_CACHE_MAX_MB * 1024 * 1024,
+                max_age_seconds=AI_CACHE_MAX_AGE_DAYS * 24 * 3600,
+                suffix='.json',
+            )
+        return _ai_cache
+
+
+def normalize_invoice_text(invoice_text: str) -> str:
+    """Collapse whitespace so OCR spacing differences do not change the key"""
+    return re.sub(r'\s+', ' ', invoice_text).strip()
+
+
+def ai_cache_key(invoice_text: str, prompt_version: int, model: str) -> str:
+    """Cache key: hash of the normalized invoice text, prompt version and model (tier spec)"""
+    payload = json.dumps({
+        'text': normalize_invoice_text(invoice_text),
+        'prompt_version': prompt_version,
+        'model': model,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_cached_result(key: str) -> Optional[dict]:
+    """Return the cached result or None on a miss (or a damaged entry)"""
+    cached = get_ai_cache().get(key)
+    if cached is None:
+        return None
+    try:
+        return json.loads(cached)
+    except json.JSONDecodeError:
+        get_ai_cache().delete(key)
+        return None
+
+
+def store_result(key: str, result: dict) -> None:
+    """Store a successful extraction result"""
+    get_ai_cache().set(key, json.dumps(result))
+
+
+def _invalidate_files(file_paths) -> int:
+    """Remove cached results of the given invoice files, returns number of removed entries"""
+    # Imported here - the CLI is the only user and ai_processor imports this module
+    from src.core.ai_processor import CACHE_MODEL_KEY, PROMPT_VERSION
+    from src.core.ocr import extract_text_from_file
+    from src.core.pipeline import clean_ocr_text
+    
+    removed = 0
+    for file_path in file_paths:
+        try:
+            text = clean_ocr_text(extract_text_from_file(file_path))
+        except Exception as e:
+            print(f"[WARN] Nie udało się odczytać {file_path}: {e}")
+            continue
+        if get_ai_cache().delete(ai_cache_key(text, PROMPT_VERSION, CACHE_MODEL_KEY)):
+            removed += 1
+    return removed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Zarządzanie cache wyników AI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("clear", help="usuń wszystkie wpisy")
+    subparsers.add_parser("evict", help="usuń przeterminowane wpisy i przytnij cache do limitu rozmiaru")
+    invalidate = subparsers.add_parser("invalidate", help="usuń wpisy dla wskazanych faktur")
+    invalidate.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+    
+    if args.command == "clear":
+        removed = get_ai_cache().clear()
+    elif args.command == "evict":
+        removed = get_ai_cache().evict()
+    else:
+        removed = _invalidate_files(args.files)
+    
+    print(f"Usunięto {removed} wpisów z {get_ai_cache().directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,203 @@
 import os
 import re
 import json
-from typing import List, Tuple
-from google import genai
-from dotenv import load_dotenv
-
+import hashlib
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from src.models.CompanyData import CompanyDataModel
-from src.core.filename_parser import parse_invoice_filename
+from src.core.filename_parser import parse_invoice_filename, validate_filename_format
+from src.core.rate_limiter import RateLimiter, estimate_tokens
+from src.core.ai_cache import AI_CACHE_ENABLED, ai_cache_key, get_cached_result, store_result
+from src.core.local_extractor import detect_invoice_date, extract_amounts_locally
+from src.core.vendor_templates import VENDOR_TEMPLATES_ENABLED, get_template_store
+from src.core.prompt_compactor import compact_invoice_text
+from src.core.resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, call_with_retry
+from src.core.model_tiers import AI_MODEL_TIERS, ModelTier, parse_model_tiers, validate_amounts
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+# HTTP timeout of a single request in seconds
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', '60'))
+
+GENAI_MODEL = "gemini-2.0-flash"
+# Cascade of models - every answer is validated and only failures escalate to the next tier
+MODEL_TIERS = parse_model_tiers(AI_MODEL_TIERS)
+# Model part of the AI cache key - answers come from the whole cascade, so a
+# different tier spec must not reuse them
+CACHE_MODEL_KEY = ",".join(tier.name for tier in MODEL_TIERS)
+# Bump whenever the prompt changes - it is part of the AI cache key
+PROMPT_VERSION = 3
+
+# Batched extraction: several invoices per request up to this many input tokens (0 = off)
+AI_BATCH_TOKEN_BUDGET = int(os.getenv('AI_BATCH_TOKEN_BUDGET', '0'))
+AI_BATCH_MAX_ITEMS = 20
+
+# Try the rule-based extractor first and call the AI only when it finds nothing consistent
+LOCAL_EXTRACTION_ENABLED = os.getenv('LOCAL_EXTRACTION', '1') not in ('0', 'false', 'False')
+
+# Input tokens Gemini counts for one page image
+IMAGE_TOKENS_PER_PAGE = 258
+
+# Concurrent extraction calls in gather_specific_data (1 = serial)
+AI_CONCURRENCY = int(os.getenv('AI_CONCURRENCY', '4'))
+# API quota - 0 disables the limit
+AI_REQUESTS_PER_MINUTE = int(os.getenv('AI_REQUESTS_PER_MINUTE', '60'))
+AI_TOKENS_PER_MINUTE = int(os.getenv('AI_TOKENS_PER_MINUTE', '500000'))
+
+# Transient errors (429/5xx, timeouts) are retried with jittered exponential backoff
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '3'))
+AI_RETRY_BASE_DELAY = 1.0
+AI_RETRY_MAX_DELAY = 30.0
+# Seconds one extraction may take including retries, and a whole batch (0 = no limit)
+AI_CALL_DEADLINE = float(os.getenv('AI_CALL_DEADLINE', '180'))
+AI_BATCH_DEADLINE = float(os.getenv('AI_BATCH_DEADLINE', '0'))
+# Consecutive transient failures that open the circuit, and how long it stays open
+AI_BREAKER_FAILURES = 5
+AI_BREAKER_RESET_SECONDS = 60.0
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+# Gemini client - created by get_client() on the first AI call
+_client = None
+_client_lock = threading.Lock()
+
+# Shared by every caller - one degraded API should stop all of them
+circuit_breaker = CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_RESET_SECONDS)
+
+
+class AIExtractionError(Exception):
+    """Amounts could not be extracted - the invoice should be re-queued, not exported as zeros"""
+
+
+class ExtractionStats:
+    """Thread-safe per-run counters of where invoice amounts came from"""
+    
+    LABELS = {
+        'template': 'z szablonu',
+        'local': 'lokalnie',
+        'cache': 'z cache',
+        'ai': 'przez AI',
+        'failed': 'błędy',
+    }
+    
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._tokens: Counter = Counter()
+        self._tier_calls: Counter = Counter()
+        self._tier_accepted: Counter = Counter()
+        self._tier_seconds: Counter = Counter()
+        self._lock = threading.Lock()
+    
+    def record(self, source: str) -> None:
+        with self._lock:
+            self._counts[source] += 1
+    
+    def record_compaction(self, original_tokens: int, compacted_tokens: int) -> None:
+        with self._lock:
+            self._tokens['original'] += original_tokens
+            self._tokens['compacted'] += compacted_tokens
+    
+    def record_tier(self, tier_name: str, accepted: bool, seconds: float) -> None:
+        """One invoice answered by a model tier; accepted = passed validation"""
+        with self._lock:
+            self._tier_calls[tier_name] += 1
+            self._tier_accepted[tier_name] += int(accepted)
+            self._tier_seconds[tier_name] += seconds
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._tokens.clear()
+            self._tier_calls.clear()
+            self._tier_accepted.clear()
+            self._tier_seconds.clear()
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+    
+    def tier_snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per model tier: invoices sent, accepted answers, hit rate and average latency"""
+        with self._lock:
+            return {
+                tier_name: {
+                    'calls': calls,
+                    'accepted': self._tier_accepted[tier_name],
+                    'hit_rate': self._tier_accepted[tier_name] / calls,
+                    'avg_seconds': self._tier_seconds[tier_name] / calls,
+                }
+                for tier_name, calls in self._tier_calls.items()
+            }
+    
+    def summary(self) -> str:
+        counts = self.snapshot()
+        total = sum(counts.values())
+        if total == 0:
+            return "Brak przetworzonych faktur"
+        local_share = 100 * (counts.get('local', 0) + counts.get('template', 0)) / total
+        parts = [f"{label}: {counts.get(source, 0)}" for source, label in self.LABELS.items()]
+        summary = f"Źródła kwot ({total} faktur, {local_share:.0f}% lokalnie) - " + ", ".join(parts)
+        with self._lock:
+            original_tokens = self._tokens['original']
+            compacted_tokens = self._tokens['compacted']
+        if original_tokens:
+            summary += f"; tokeny tekstu wysłane do AI: {compacted_tokens} z {original_tokens}"
+        tiers = self.tier_snapshot()
+        if tiers:
+            summary += "; modele: " + ", ".join(
+                f"{tier_name} {stats['accepted']}/{stats['calls']} ({stats['hit_rate']:.0%}, "
+                f"śr. {stats['avg_seconds']:.1f} s)"
+                for tier_name, stats in tiers.items())
+        return summary
+
+
+# Counters of the current run - reset by the caller at the start of a batch
+extraction_stats = ExtractionStats()
+
 
-genai_api_key = os.getenv('GENAI_API_KEY')
-client = genai.Client(api_key=genai_api_key)
+def get_rate_limiter() -> RateLimiter:
+    """Return the limiter shared by every extraction call of this process"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(AI_REQUESTS_PER_MINUTE, AI_TOKENS_PER_MINUTE)
+        return _rate_limiter
+
+
+def set_rate_limiter(new_rate_limiter: RateLimiter) -> None:
+    """Replace the shared limiter, e.g. with a tighter quota for an offline check"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = new_rate_limiter
+
+
+def get_client():
+    """
+    Return the shared Gemini client, created on first use - importing the
+    google-genai SDK and building the client is left out of application startup.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from dotenv import load_dotenv
+            from google import genai
+            # Entry points load .env before anything else; this covers direct imports
+            load_dotenv()
+            _client = genai.Client(api_key=os.getenv('GENAI_API_KEY'),
+                                   http_options={'timeout': int(AI_REQUEST_TIMEOUT * 1000)})
+        return _client
+
+
+def set_client(new_client) -> None:
+    """
+    Replace the Gemini client, e.g. with a local stub for offline runs.
+    The stub only needs models.generate_content(model=, contents=, config=) returning an object with .text
+    """
+    global _client
+    with _client_lock:
+        _client = new_client
 
 
 class InvoiceAmountsModel(BaseModel):
@@ -22,6 +206,12 @@ class InvoiceAmountsModel(BaseModel):
     gross_value: float    # Gross amount (brutto)
     vat_value: float      # VAT amount (podatek VAT)
     currency: str = "PLN" # Currency (PLN, EUR, USD, etc.)
+    invoice_date: Optional[str] = None  # Issue date (YYYY-MM-DD)
+
+
+class BatchInvoiceAmountsModel(InvoiceAmountsModel):
+    """Amounts of one invoice inside a batched response"""
+    invoice_id: str       # Id of the invoice in the batch prompt
 
 def clean_json_response(response_text: str | None) -> str:
     """Clean up malformed JSON response from AI"""
@@ -40,131 +230,748 @@ def clean_json_response(response_text: str | None) -> str:
     
     return cleaned.strip()
 
-def extract_amounts_from_invoice(invoice_text: str) -> InvoiceAmountsModel:
-    """
-    Extract only financial amounts (net, gross, VAT) and currency from invoice text using AI.
-    """
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", 
-            contents=f"""Extract ONLY the financial amounts from this invoice text. 
-            Return ONLY valid JSON with the amounts:
-            
-            - net_value: Net amount (netto) - the amount before tax
+
+# Field descriptions and normalization rules shared by the single and batch prompts
+_EXTRACTION_RULES = """- net_value: Net amount (netto) - the amount before tax
             - gross_value: Gross amount (brutto) - the total amount including tax  
             - vat_value: VAT/tax amount (podatek VAT) - the tax amount
             - currency: Currency code (PLN, EUR, USD, GBP, etc.)
+            - invoice_date: Issue date (data wystawienia) as YYYY-MM-DD, null if not present
             
             Currency normalization:
             - If currency is zł, pln, or zloty, use "PLN"
             - If currency is euro, use "EUR" 
             - If currency is dollar, use "USD"
             - If currency is pound, use "GBP"
+            - Any other currency: its 3-letter ISO 4217 code (e.g. CZK, SEK, NOK)
+            
+            For a correction invoice (faktura korygująca) that lowers the amounts, keep the minus signs
             
             If net_value is not present but vat_value and gross_value are present, calculate net_value as gross_value - vat_value
             
-            Focus on the FINAL amounts after any corrections or totals.
+            Focus on the FINAL amounts after any corrections or totals."""
+
+
+def _build_prompt(invoice_text: str) -> str:
+    """Build the extraction prompt for a single invoice"""
+    return f"""Extract ONLY the financial amounts from this invoice text. 
+            Return ONLY valid JSON with the amounts:
+            
+            {_EXTRACTION_RULES}
             
             Invoice text:
-            {invoice_text}""",
+            {invoice_text}"""
+
+
+def _build_image_prompt(page_count: int) -> str:
+    """Build the extraction prompt sent together with page images of one invoice"""
+    pages = "the attached invoice page image" if page_count == 1 else f"the {page_count} attached invoice page images"
+    return f"""Extract ONLY the financial amounts from {pages}.
+            Return ONLY valid JSON with the amounts:
+            
+            {_EXTRACTION_RULES}"""
+
+
+def _build_batch_prompt(items: List[Tuple[str, str]]) -> str:
+    """Build one extraction prompt for several invoices given as (invoice_id, text) pairs"""
+    invoices = "\n\n".join(f"### INVOICE {invoice_id}\n{invoice_text}" for invoice_id, invoice_text in items)
+    return f"""Extract ONLY the financial amounts from each of the {len(items)} invoices below.
+            Each invoice starts with a line "### INVOICE <id>".
+            Return ONLY a valid JSON array with exactly one object per invoice, each with:
+            
+            - invoice_id: The <id> from the invoice header line, copied exactly
+            {_EXTRACTION_RULES}
+            
+            Treat every invoice separately - never mix amounts between invoices.
+            
+            Invoices:
+            {invoices}"""
+
+
+def _compact_for_prompt(invoice_text: str) -> str:
+    """Cut the invoice text down to the parts relevant for the totals and record the savings"""
+    compaction = compact_invoice_text(invoice_text)
+    extraction_stats.record_compaction(compaction.original_tokens, compaction.compacted_tokens)
+    if compaction.compacted_tokens < compaction.original_tokens:
+        print(f"[INFO] Kompresja tekstu faktury: {compaction.original_tokens} -> "
+              f"{compaction.compacted_tokens} tokenów")
+    return compaction.text
+
+
+def _call_model(prompt: Any, response_schema, ai_client, rate_limiter: RateLimiter,
+                deadline: Optional[Deadline] = None, model: str = GENAI_MODEL,
+                estimated_tokens: Optional[int] = None) -> str:
+    """
+    Send one generate_content request within the quota and return the cleaned JSON text.
+    Transient errors are retried with backoff until the call deadline (or the
+    stricter batch deadline) expires; the circuit breaker refuses calls while the API is degraded.
+    
+    The prompt is a string or a list of contents (e.g. image parts and text),
+    the latter needs estimated_tokens for the quota.
+    """
+    if estimated_tokens is None:
+        estimated_tokens = estimate_tokens(prompt)
+    
+    def attempt() -> str:
+        # Wait for a free slot in the requests/tokens per minute quota
+        rate_limiter.acquire(estimated_tokens)
+        
+        response = ai_client.models.generate_content(
+            model=model, 
+            contents=prompt,
             config={
                 "response_mime_type": "application/json",
-                "response_schema": InvoiceAmountsModel,
+                "response_schema": response_schema,
                 "temperature": 0.1,
             },
         )
         
-        cleaned_response = clean_json_response(response.text)
-        data_dict = json.loads(cleaned_response)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            rate_limiter.record_usage(estimated_tokens, getattr(usage, 'total_token_count', 0) or 0)
+        
+        return clean_json_response(response.text)
+    
+    return call_with_retry(
+        attempt,
+        retries=AI_MAX_RETRIES,
+        base_delay=AI_RETRY_BASE_DELAY,
+        max_delay=AI_RETRY_MAX_DELAY,
+        deadline=Deadline(AI_CALL_DEADLINE).earliest(deadline),
+        breaker=circuit_breaker,
+    )
+
+
+def _validation_problem(amounts: InvoiceAmountsModel) -> Optional[str]:
+    return validate_amounts(amounts.net_value, amounts.vat_value, amounts.gross_value, amounts.currency)
+
+
+def _is_cacheable(amounts: InvoiceAmountsModel) -> bool:
+    """Only validated answers are cached - anything else is retried next time"""
+    return _validation_problem(amounts) is None
+
+
+def _has_amounts(amounts: InvoiceAmountsModel) -> bool:
+    """An all-zero result means the model found nothing"""
+    return bool(amounts.net_value or amounts.gross_value or amounts.vat_value)
+
+
+def _extract_locally(invoice_text: str) -> Optional[InvoiceAmountsModel]:
+    """Rule-based extraction, None when the totals are missing or inconsistent"""
+    local = extract_amounts_locally(invoice_text)
+    if local is None:
+        return None
+    return InvoiceAmountsModel(
+        net_value=local.net_value,
+        gross_value=local.gross_value,
+        vat_value=local.vat_value,
+        currency=local.currency,
+        invoice_date=local.invoice_date
+    )
+
+
+def _get_cached_amounts(cache_key: str) -> Optional[InvoiceAmountsModel]:
+    cached = get_cached_result(cache_key)
+    if cached is None:
+        return None
+    try:
+        amounts = InvoiceAmountsModel(**cached)
+    except Exception:
+        # Entry from an incompatible model version - fetch again
+        return None
+    # Entries stored before answers were validated may be wrong
+    return amounts if _is_cacheable(amounts) else None
+
+
+def _run_cascade(contents_for_tier: Callable[[ModelTier], Tuple[Any, Any]], ai_client, rate_limiter: RateLimiter,
+                 deadline: Optional[Deadline] = None, start_tier: int = 0,
+                 estimated_tokens: Optional[int] = None) -> InvoiceAmountsModel:
+    """
+    Ask the model tiers in order until an answer passes validation.
+    
+    contents_for_tier returns (key, contents) for a tier; a tier whose key was
+    already asked is skipped, as it would repeat the same request.
+    
+    If no answer validates, the last answer with any amounts is returned - the same
+    best effort as a single model gives. Errors of one tier escalate to the next one,
+    except an open circuit or an expired deadline, which no other tier can fix.
+    
+    Raises:
+        The last error when no tier produced an answer
+    """
+    attempted = set()
+    best_effort: Optional[InvoiceAmountsModel] = None
+    last_error: Optional[Exception] = None
+    
+    for tier in MODEL_TIERS[start_tier:]:
+        key, contents = contents_for_tier(tier)
+        if key in attempted:
+            continue
+        attempted.add(key)
         
-        return InvoiceAmountsModel(**data_dict)
+        started = time.perf_counter()
+        try:
+            response_text = _call_model(contents, InvoiceAmountsModel, ai_client, rate_limiter,
+                                        deadline, tier.model, estimated_tokens)
+            amounts = InvoiceAmountsModel(**json.loads(response_text))
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            extraction_stats.record_tier(tier.name, False, time.perf_counter() - started)
+            print(f"[WARN] Model {tier.name}: {e}")
+            last_error = e
+            continue
         
+        problem = _validation_problem(amounts)
+        extraction_stats.record_tier(tier.name, problem is None, time.perf_counter() - started)
+        if problem is None:
+            return amounts
+        print(f"[INFO] Odpowiedź modelu {tier.name} odrzucona ({problem})")
+        if _has_amounts(amounts):
+            best_effort = amounts
+    
+    if best_effort is not None:
+        return best_effort
+    if last_error is not None:
+        raise last_error
+    raise ValueError("Żaden model nie znalazł kwot na fakturze")
+
+
+def _extract_with_cascade(invoice_text: str, ai_client, rate_limiter: RateLimiter,
+                          deadline: Optional[Deadline] = None, start_tier: int = 0) -> InvoiceAmountsModel:
+    """Text extraction through the model tiers - ':full' tiers get the uncompacted text"""
+    compacted_text = None
+    
+    def contents_for_tier(tier: ModelTier) -> Tuple[Any, Any]:
+        nonlocal compacted_text
+        if tier.full_text:
+            prompt_text = invoice_text
+        else:
+            if compacted_text is None:
+                compacted_text = _compact_for_prompt(invoice_text)
+            prompt_text = compacted_text
+        # Short invoices are not compacted - the ':full' tier would repeat the same request
+        return (tier.model, prompt_text), _build_prompt(prompt_text)
+    
+    return _run_cascade(contents_for_tier, ai_client, rate_limiter, deadline, start_tier)
+
+
+def extract_amounts_from_images(images: List[bytes], ai_client=None,
+                                rate_limiter: Optional[RateLimiter] = None,
+                                use_cache: Optional[bool] = None,
+                                deadline: Optional[Deadline] = None,
+                                mime_type: str = 'image/jpeg') -> InvoiceAmountsModel:
+    """
+    Extract amounts straight from page images with a multimodal model, without OCR.
+    
+    The images go through the same model tiers and validation as text; the images
+    are the same for every tier, so ':full' tiers don't repeat a model.
+    
+    Args:
+        images: Encoded page images, e.g. from ocr.render_pages_for_model
+        ai_client: Client to use instead of the module client (e.g. a local stub)
+        rate_limiter: Quota limiter, the shared one by default
+        use_cache: Use the AI result cache (None = AI_CACHE_ENABLED)
+        deadline: Batch deadline, the call gives up when it expires
+        mime_type: Format of the images
+    
+    Raises:
+        AIExtractionError: No page images, or the extraction failed (see extract_amounts_from_invoice)
+    """
+    if not images:
+        raise AIExtractionError("Brak stron do wysłania")
+    if ai_client is None:
+        ai_client = get_client()
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter()
+    if use_cache is None:
+        use_cache = AI_CACHE_ENABLED
+    
+    cache_key = None
+    if use_cache:
+        digest = hashlib.sha256()
+        for image in images:
+            digest.update(image)
+        cache_key = ai_cache_key(f"image {digest.hexdigest()}", PROMPT_VERSION, CACHE_MODEL_KEY)
+        amounts = _get_cached_amounts(cache_key)
+        if amounts is not None:
+            extraction_stats.record('cache')
+            return amounts
+    
+    prompt = _build_image_prompt(len(images))
+    from google.genai import types
+    contents = [types.Part.from_bytes(data=image, mime_type=mime_type) for image in images] + [prompt]
+    estimated_tokens = IMAGE_TOKENS_PER_PAGE * len(images) + estimate_tokens(prompt)
+    
+    try:
+        amounts = _run_cascade(lambda tier: (tier.model, contents), ai_client, rate_limiter, deadline,
+                               estimated_tokens=estimated_tokens)
+    except Exception as e:
+        print(f"Error extracting amounts from images: {e}")
+        extraction_stats.record('failed')
+        raise AIExtractionError(str(e)) from e
+    
+    if cache_key is not None and _is_cacheable(amounts):
+        store_result(cache_key, amounts.model_dump())
+    
+    extraction_stats.record('ai')
+    return amounts
+
+
+def extract_amounts_from_invoice(invoice_text: str, ai_client=None,
+                                 rate_limiter: Optional[RateLimiter] = None,
+                                 use_cache: Optional[bool] = None,
+                                 use_local: Optional[bool] = None,
+                                 deadline: Optional[Deadline] = None) -> InvoiceAmountsModel:
+    """
+    Extract only financial amounts (net, gross, VAT) and currency from invoice text.
+    
+    The local rule-based extractor is tried first; its result is accepted only when
+    net + VAT matches gross. Otherwise the model tiers are asked in order until an
+    answer validates, with results for identical invoice text served from the
+    persistent AI cache.
+    
+    Args:
+        invoice_text: Text extracted from the invoice
+        ai_client: Client to use instead of the module client (e.g. a local stub)
+        rate_limiter: Quota limiter, the shared one by default
+        use_cache: Use the AI result cache (None = AI_CACHE_ENABLED)
+        use_local: Try the local extractor first (None = LOCAL_EXTRACTION_ENABLED)
+        deadline: Batch deadline, the call gives up when it expires
+    
+    Raises:
+        AIExtractionError: The AI call failed after retries, was refused by the circuit
+                           breaker, ran out of time or no tier found any amounts
+    """
+    if ai_client is None:
+        ai_client = get_client()
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter()
+    if use_cache is None:
+        use_cache = AI_CACHE_ENABLED
+    if use_local is None:
+        use_local = LOCAL_EXTRACTION_ENABLED
+    
+    if use_local:
+        amounts = _extract_locally(invoice_text)
+        if amounts is not None:
+            extraction_stats.record('local')
+            return amounts
+    
+    cache_key = None
+    if use_cache:
+        cache_key = ai_cache_key(invoice_text, PROMPT_VERSION, CACHE_MODEL_KEY)
+        amounts = _get_cached_amounts(cache_key)
+        if amounts is not None:
+            extraction_stats.record('cache')
+            return amounts
+    
+    try:
+        amounts = _extract_with_cascade(invoice_text, ai_client, rate_limiter, deadline)
     except json.JSONDecodeError as e:
         print(f"JSON decode error: {e}")
-        # Return fallback data
-        return InvoiceAmountsModel(
-            net_value=0.0,
-            gross_value=0.0,
-            vat_value=0.0,
-            currency="PLN"
-        )
+        extraction_stats.record('failed')
+        raise AIExtractionError(f"Nieprawidłowa odpowiedź AI: {e}") from e
     except Exception as e:
         print(f"Error extracting amounts: {e}")
-        # Return fallback data  
-        return InvoiceAmountsModel(
-            net_value=0.0,
-            gross_value=0.0,
-            vat_value=0.0,
-            currency="PLN"
+        extraction_stats.record('failed')
+        raise AIExtractionError(str(e)) from e
+    
+    if cache_key is not None and _is_cacheable(amounts):
+        store_result(cache_key, amounts.model_dump())
+    
+    extraction_stats.record('ai')
+    return amounts
+
+
+def _pack_batches(items: List[Tuple[str, str]], token_budget: int,
+                  max_items: int = AI_BATCH_MAX_ITEMS) -> List[List[Tuple[str, str]]]:
+    """Group (invoice_id, text) pairs into batches that fit the token budget"""
+    batches: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    current_tokens = 0
+    
+    for item in items:
+        item_tokens = estimate_tokens(item[1])
+        if current and (current_tokens + item_tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        # An invoice larger than the budget still goes out, alone
+        current.append(item)
+        current_tokens += item_tokens
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _extract_batch(batch: List[Tuple[str, str]], ai_client, rate_limiter: RateLimiter,
+                   deadline: Optional[Deadline] = None) -> Dict[str, InvoiceAmountsModel]:
+    """
+    Extract amounts of several invoices with one request to the first model tier.
+    Returns only the items that came back complete - the caller retries the rest.
+    """
+    tier = MODEL_TIERS[0]
+    started = time.perf_counter()
+    try:
+        response_text = _call_model(_build_batch_prompt(batch), list[BatchInvoiceAmountsModel], ai_client,
+                                    rate_limiter, deadline, tier.model)
+        items = json.loads(response_text)
+    except Exception as e:
+        print(f"Error extracting batch of {len(batch)} invoices: {e}")
+        return {}
+    seconds = time.perf_counter() - started
+    
+    if not isinstance(items, list):
+        return {}
+    
+    expected_ids = {invoice_id for invoice_id, _ in batch}
+    results: Dict[str, InvoiceAmountsModel] = {}
+    for item in items:
+        try:
+            parsed = BatchInvoiceAmountsModel(**item)
+        except Exception:
+            # Malformed item - retried on its own
+            continue
+        if parsed.invoice_id in expected_ids and parsed.invoice_id not in results:
+            amounts = InvoiceAmountsModel(**parsed.model_dump(exclude={'invoice_id'}))
+            extraction_stats.record_tier(tier.name, _validation_problem(amounts) is None, seconds)
+            results[parsed.invoice_id] = amounts
+    
+    return results
+
+
+def extract_amounts_batch(invoice_texts: List[str], token_budget: Optional[int] = None, ai_client=None,
+                          rate_limiter: Optional[RateLimiter] = None, concurrency: Optional[int] = None,
+                          use_cache: Optional[bool] = None,
+                          use_local: Optional[bool] = None,
+                          deadline: Optional[Deadline] = None) -> List[Optional[InvoiceAmountsModel]]:
+    """
+    Extract amounts of many invoices, packing several invoices into each request.
+    
+    Invoices are grouped up to token_budget input tokens per request to the first
+    model tier. Items that are missing or malformed in a batched response are retried
+    on their own with extract_amounts_from_invoice; items that fail validation
+    escalate to the next tiers.
+    
+    Args:
+        invoice_texts: Texts extracted from the invoices
+        token_budget: Input tokens per batched request (None = AI_BATCH_TOKEN_BUDGET)
+        ai_client: Client to use instead of the module client (e.g. a local stub)
+        rate_limiter: Quota limiter, the shared one by default
+        concurrency: Batches sent concurrently (None = AI_CONCURRENCY)
+        use_cache: Use the AI result cache (None = AI_CACHE_ENABLED)
+        use_local: Try the local extractor first (None = LOCAL_EXTRACTION_ENABLED)
+        deadline: Batch deadline, remaining invoices fail once it expires
+    
+    Returns:
+        List of InvoiceAmountsModel in the order of invoice_texts,
+        None for invoices whose extraction failed (to be re-queued)
+    """
+    if token_budget is None:
+        token_budget = AI_BATCH_TOKEN_BUDGET
+    if ai_client is None:
+        ai_client = get_client()
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter()
+    if concurrency is None:
+        concurrency = AI_CONCURRENCY
+    if use_cache is None:
+        use_cache = AI_CACHE_ENABLED
+    if use_local is None:
+        use_local = LOCAL_EXTRACTION_ENABLED
+    
+    results: List[Optional[InvoiceAmountsModel]] = [None] * len(invoice_texts)
+    
+    # Locally resolved and cached invoices never enter a batch
+    pending: List[Tuple[str, str]] = []
+    for index, invoice_text in enumerate(invoice_texts):
+        if use_local:
+            results[index] = _extract_locally(invoice_text)
+            if results[index] is not None:
+                extraction_stats.record('local')
+                continue
+        if use_cache:
+            results[index] = _get_cached_amounts(ai_cache_key(invoice_text, PROMPT_VERSION, CACHE_MODEL_KEY))
+            if results[index] is not None:
+                extraction_stats.record('cache')
+                continue
+        pending.append((str(index), invoice_text))
+    
+    # Batches carry compacted text; retries and cache keys use the original text
+    original_texts = dict(pending)
+    compacted = [(invoice_id, _compact_for_prompt(invoice_text)) for invoice_id, invoice_text in pending]
+    batches = _pack_batches(compacted, max(token_budget, 1))
+    
+    def run_batch(batch: List[Tuple[str, str]]) -> None:
+        batch_results = _extract_batch(batch, ai_client, rate_limiter, deadline)
+        for invoice_id, _ in batch:
+            invoice_text = original_texts[invoice_id]
+            amounts = batch_results.get(invoice_id)
+            if amounts is None:
+                # Missing or malformed in the batched response - retry on its own
+                try:
+                    amounts = extract_amounts_from_invoice(invoice_text, ai_client, rate_limiter, use_cache,
+                                                           use_local=False, deadline=deadline)
+                except AIExtractionError:
+                    amounts = None
+            else:
+                if not _is_cacheable(amounts) and len(MODEL_TIERS) > 1:
+                    # The first tier already answered - continue with the stronger ones
+                    try:
+                        escalated = _extract_with_cascade(invoice_text, ai_client, rate_limiter, deadline,
+                                                          start_tier=1)
+                        if _is_cacheable(escalated):
+                            amounts = escalated
+                    except Exception as e:
+                        print(f"[WARN] Eskalacja nie powiodła się: {e}")
+                extraction_stats.record('ai')
+                if use_cache and _is_cacheable(amounts):
+                    store_result(ai_cache_key(invoice_text, PROMPT_VERSION, CACHE_MODEL_KEY), amounts.model_dump())
+            results[int(invoice_id)] = amounts
+    
+    if concurrency <= 1 or len(batches) <= 1:
+        for batch in batches:
+            run_batch(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as executor:
+            list(executor.map(run_batch, batches))
+    
+    return results
+
+
+def _fallback_company_data(file_path: str, error: str) -> CompanyDataModel:
+    """
+    Placeholder record for a document that could not be processed.
+
+    It carries extraction_error, so it is never exported or registered as a
+    processed invoice - the file can be fixed (e.g. renamed) and processed again.
+    """
+    return CompanyDataModel(
+        company_name=f"Error: {os.path.basename(file_path)}",
+        invoice_number="N/A",
+        topic_number="N/A",
+        invoice_type=None,
+        net_value=0.0,
+        gross_value=0.0,
+        vat_value=0.0,
+        currency="PLN",
+        filepath=file_path,
+        extraction_error=error
+    )
+
+
+def _failed_company_data(file_path: str, error: str) -> CompanyDataModel:
+    """Record of an invoice whose amounts could not be extracted - marked for re-queueing"""
+    company_name, invoice_number, topic_number, invoice_type = parse_invoice_filename(os.path.basename(file_path))
+    return CompanyDataModel(
+        company_name=company_name,
+        invoice_number=invoice_number,
+        topic_number=topic_number,
+        invoice_type=invoice_type,
+        net_value=0.0,
+        gross_value=0.0,
+        vat_value=0.0,
+        currency="PLN",
+        filepath=file_path,
+        extraction_error=error
+    )
+
+
+def _extract_with_template(company_name: str, invoice_text: str) -> Optional[InvoiceAmountsModel]:
+    """Read the totals with the vendor's learned layout, None if there is none or it does not validate"""
+    template_amounts = get_template_store().extract(company_name, invoice_text)
+    if template_amounts is None:
+        return None
+    extraction_stats.record('template')
+    return InvoiceAmountsModel(
+        net_value=template_amounts.net_value,
+        gross_value=template_amounts.gross_value,
+        vat_value=template_amounts.vat_value,
+        currency=template_amounts.currency,
+        invoice_date=template_amounts.invoice_date
+    )
+
+
+def build_company_data(file_path: str, invoice_text: str,
+                       amounts: Optional[InvoiceAmountsModel] = None,
+                       deadline: Optional[Deadline] = None) -> CompanyDataModel:
+    """
+    Combine filename parsing with AI content extraction for a single invoice.
+    
+    Invoices from a vendor with a learned layout template are read from the
+    template without any network call. Every other consistent result is used
+    to (re)learn the vendor's template.
+    
+    Args:
+        file_path: Path of the invoice file
+        invoice_text: Text extracted from the invoice
+        amounts: Already extracted amounts (e.g. from a batched request), skips the AI call
+        deadline: Batch deadline passed on to the AI call
+    
+    Returns:
+        CompanyDataModel with complete invoice information (fallback data on errors).
+        If the AI extraction failed, extraction_error is set so the invoice can be re-queued.
+    """
+    try:
+        # Parse filename to get company info
+        filename = os.path.basename(file_path)
+        company_name, invoice_number, topic_number, invoice_type = parse_invoice_filename(filename)
+        
+        from_template = False
+        if amounts is None and VENDOR_TEMPLATES_ENABLED:
+            amounts = _extract_with_template(company_name, invoice_text)
+            from_template = amounts is not None
+        
+        # Extract amounts from invoice content using AI
+        if amounts is None:
+            try:
+                amounts = extract_amounts_from_invoice(invoice_text, deadline=deadline)
+            except AIExtractionError as e:
+                return _failed_company_data(file_path, str(e))
+        
+        if VENDOR_TEMPLATES_ENABLED and not from_template:
+            # Only consistent totals are learned - fallback zeros are rejected by the store
+            get_template_store().learn(company_name, invoice_text, amounts.net_value,
+                                       amounts.vat_value, amounts.gross_value)
+        
+        # Create complete CompanyDataModel
+        return CompanyDataModel(
+            company_name=company_name,
+            invoice_number=invoice_number,
+            topic_number=topic_number,
+            invoice_type=invoice_type,
+            net_value=amounts.net_value,
+            gross_value=amounts.gross_value,
+            vat_value=amounts.vat_value,
+            currency=amounts.currency,
+            # The model may miss the date (e.g. cut from a compacted prompt) - read it from the full text
+            invoice_date=amounts.invoice_date or detect_invoice_date(invoice_text),
+            filepath=file_path
         )
+        
+    except ValueError as filename_error:
+        print(f"Error parsing filename {file_path}: {filename_error}")
+        # Create fallback data with error indication
+        return _fallback_company_data(file_path, str(filename_error))
+        
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        # Create fallback data
+        return _fallback_company_data(file_path, str(e))
 
 
-def gather_specific_data(invoice_data: List[Tuple[str, str]]) -> List[CompanyDataModel]:
+def build_company_data_from_images(file_path: str, images: List[bytes],
+                                   deadline: Optional[Deadline] = None) -> CompanyDataModel:
     """
-    Process invoice data combining filename parsing with AI content extraction.
+    Image extraction mode of build_company_data - amounts are read by the model
+    from page images, so vendor templates (which need OCR text) are not used.
+    
+    Args:
+        file_path: Path of the invoice file
+        images: Page images from ocr.render_pages_for_model
+        deadline: Batch deadline passed on to the AI call
+    """
+    try:
+        filename = os.path.basename(file_path)
+        company_name, invoice_number, topic_number, invoice_type = parse_invoice_filename(filename)
+        
+        try:
+            amounts = extract_amounts_from_images(images, deadline=deadline)
+        except AIExtractionError as e:
+            return _failed_company_data(file_path, str(e))
+        
+        return CompanyDataModel(
+            company_name=company_name,
+            invoice_number=invoice_number,
+            topic_number=topic_number,
+            invoice_type=invoice_type,
+            net_value=amounts.net_value,
+            gross_value=amounts.gross_value,
+            vat_value=amounts.vat_value,
+            currency=amounts.currency,
+            invoice_date=amounts.invoice_date,
+            filepath=file_path
+        )
+        
+    except ValueError as filename_error:
+        print(f"Error parsing filename {file_path}: {filename_error}")
+        return _fallback_company_data(file_path, str(filename_error))
+        
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return _fallback_company_data(file_path, str(e))
+
+
+def build_company_data_batch(invoice_data: List[Tuple[str, str]], token_budget: Optional[int] = None,
+                             concurrency: int = 1, deadline: Optional[Deadline] = None) -> List[CompanyDataModel]:
+    """
+    build_company_data for several invoices, with the AI calls packed into
+    batched requests (see extract_amounts_batch).
     
     Args:
         invoice_data: List of tuples (file_path, extracted_text)
+        token_budget: Input tokens per batched request (None = AI_BATCH_TOKEN_BUDGET)
+        concurrency: Batches sent concurrently
+        deadline: Batch deadline passed on to the AI calls
     
     Returns:
-        List of CompanyDataModel objects with complete invoice information
+        CompanyDataModel per invoice in input order, extraction_error set where it failed
     """
-    gathered_information: List[CompanyDataModel] = []
+    if token_budget is None:
+        token_budget = AI_BATCH_TOKEN_BUDGET
+    
+    # Invoices with an invalid filename end up as fallback records anyway - don't send them.
+    # Vendors with a learned template are read locally in build_company_data.
+    valid = [(file_path, invoice_text) for file_path, invoice_text in invoice_data
+             if validate_filename_format(os.path.basename(file_path))
+             and not (VENDOR_TEMPLATES_ENABLED and get_template_store().has_template(
+                 parse_invoice_filename(os.path.basename(file_path))[0]))]
+    amounts_list = extract_amounts_batch([invoice_text for _, invoice_text in valid], token_budget,
+                                         concurrency=concurrency, deadline=deadline)
+    amounts_by_path = {file_path: amounts for (file_path, _), amounts in zip(valid, amounts_list)}
     
+    gathered_information: List[CompanyDataModel] = []
     for file_path, invoice_text in invoice_data:
-        try:
-            # Parse filename to get company info
-            filename = os.path.basename(file_path)
-            company_name, invoice_number, topic_number, invoice_type = parse_invoice_filename(filename)
-            
-            # Extract amounts from invoice content using AI
-            amounts = extract_amounts_from_invoice(invoice_text)
-            
-            # Create complete CompanyDataModel
-            company_data = CompanyDataModel(
-                company_name=company_name,
-                invoice_number=invoice_number,
-                topic_number=topic_number,
-                invoice_type=invoice_type,
-                net_value=amounts.net_value,
-                gross_value=amounts.gross_value,
-                vat_value=amounts.vat_value,
-                currency=amounts.currency,
-                filepath=file_path
-            )
-            
-            gathered_information.append(company_data)
-            
-        except ValueError as filename_error:
-            print(f"Error parsing filename {file_path}: {filename_error}")
-            # Create fallback data with error indication
-            fallback_data = CompanyDataModel(
-                company_name=f"Error: {os.path.basename(file_path)}",
-                invoice_number="N/A",
-                topic_number="N/A",
-                invoice_type=None,
-                net_value=0.0,
-                gross_value=0.0,
-                vat_value=0.0,
-                currency="PLN",
-                filepath=file_path
-            )
-            gathered_information.append(fallback_data)
-            
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-            # Create fallback data
-            fallback_data = CompanyDataModel(
-                company_name=f"Error: {os.path.basename(file_path)}",
-                invoice_number="N/A", 
-                topic_number="N/A",
-                invoice_type=None,
-                net_value=0.0,
-                gross_value=0.0,
-                vat_value=0.0,
-                currency="PLN",
-                filepath=file_path
-            )
-            gathered_information.append(fallback_data)
-    
-    return gathered_information
\ No newline at end of file
+        if file_path in amounts_by_path and amounts_by_path[file_path] is None:
+            gathered_information.append(_failed_company_data(file_path, "Ekstrakcja AI nie powiodła się"))
+        else:
+            gathered_information.append(build_company_data(file_path, invoice_text,
+                                                           amounts_by_path.get(file_path), deadline))
+    return gathered_information
+
+
+def gather_specific_data(invoice_data: List[Tuple[str, str]], concurrency: Optional[int] = None,
+                         batch_token_budget: Optional[int] = None,
+                         deadline_seconds: Optional[float] = None) -> List[CompanyDataModel]:
+    """
+    Process invoice data combining filename parsing with AI content extraction.
+    
+    Args:
+        invoice_data: List of tuples (file_path, extracted_text)
+        concurrency: Number of concurrent AI calls (None = AI_CONCURRENCY, 1 = serial).
+                     Calls share the rate limiter, so the quota holds at any concurrency.
+        batch_token_budget: Pack several invoices per request up to this many tokens
+                            (None = AI_BATCH_TOKEN_BUDGET, 0 = one request per invoice)
+        deadline_seconds: Time limit for the whole batch (None = AI_BATCH_DEADLINE, 0 = none)
+    
+    Returns:
+        List of CompanyDataModel objects with complete invoice information, in input order.
+        Invoices whose extraction failed have extraction_error set.
+    """
+    if concurrency is None:
+        concurrency = AI_CONCURRENCY
+    if batch_token_budget is None:
+        batch_token_budget = AI_BATCH_TOKEN_BUDGET
+    deadline = Deadline(AI_BATCH_DEADLINE if deadline_seconds is None else deadline_seconds)
+    
+    if batch_token_budget > 0:
+        return build_company_data_batch(invoice_data, batch_token_budget, concurrency, deadline)
+    
+    if concurrency <= 1 or len(invoice_data) <= 1:
+        return [build_company_data(file_path, invoice_text, deadline=deadline) for file_path, invoice_text in invoice_data]
+    
+    # map() returns results in input order regardless of completion order
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(invoice_data))) as executor:
+        return list(executor.map(lambda item: build_company_data(item[0], item[1], deadline=deadline), invoice_data))
@@ -0,0 +1,32 @@
+import os
+import sys
+
+
+APP_NAME = "Auto-Faktura"
+
+
+def get_app_data_dir(*parts: str) -> str:
+    """
+    Return (and create) a per-user directory for application caches and indexes.
+    
+    Location:
+        AUTO_FAKTURA_DATA_DIR env variable if set,
+        %LOCALAPPDATA%\\Auto-Faktura on Windows,
+        ~/.cache/auto-faktura elsewhere
+    
+    Args:
+        parts: Optional sub-directories below the application directory
+    """
+    base_dir = os.getenv('AUTO_FAKTURA_DATA_DIR')
+    
+    if not base_dir:
+        if sys.platform.startswith('win'):
+            local_app_data = os.getenv('LOCALAPPDATA') or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+            base_dir = os.path.join(local_app_data, APP_NAME)
+        else:
+            cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache")
+            base_dir = os.path.join(cache_home, APP_NAME.lower())
+    
+    path = os.path.join(base_dir, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed text cache stored as one file per key.
+    
+    Entries are evicted in LRU order: a hit refreshes the entry's modification
+    time, entries unused for longer than max_age_seconds are dropped, and the
+    least recently used entries are removed once the cache exceeds max_bytes.
+    Writes go through a temporary file, so concurrent processes never see a
+    partially written entry.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024,
+                 max_age_seconds: float = 90 * 24 * 3600, suffix: str = '.txt',
+                 evict_every: int = 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.suffix = suffix
+        self.evict_every = evict_every
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value or None on a miss"""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                os.remove(path)
+                return None
+            
+            with open(path, 'r', encoding='utf-8') as file:
+                value = file.read()
+            
+            # Mark as recently used
+            os.utime(path, None)
+            return value
+        except OSError:
+            return None
+    
+    def set(self, key: str, value: str) -> None:
+        """Store a value, evicting old entries from time to time"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] Nie udało się zapisać wpisu w cache {self.directory}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= self.evict_every
+            if should_evict:
+                self._writes_since_evict = 0
+        
+        if should_evict:
+            self.evict()
+    
+    def delete(self, key: str) -> bool:
+        """Remove a single entry, returns True if it existed"""
+        try:
+            os.remove(self._path(key))
+            return True
+        except OSError:
+            return False
+    
+    def evict(self) -> int:
+        """Drop expired entries and trim the cache to max_bytes. Returns number of removed entries."""
+        now = time.time()
+        entries = []
+        removed = 0
+        
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.suffix) or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            
+            if now - stat.st_mtime > self.max_age_seconds:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total_size = sum(size for _, size, _ in entries)
+        if total_size > self.max_bytes:
+            # Least recently used first
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                    removed += 1
+                except OSError:
+                    pass
+        
+        return removed
+    
+    def clear(self) -> int:
+        """Remove all entries. Returns number of removed entries."""
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix) and entry.is_file():
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
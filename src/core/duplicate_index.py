@@ -0,0 +1,377 @@
+import argparse
+import datetime
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.core.app_paths import get_app_data_dir
+from src.core.disk_cache import file_sha256
+from src.core.filename_parser import parse_invoice_filename
+from src.core.ocr import page_hashes
+
+# Skip invoices that were already exported - by (company, invoice number) or identical file content
+DUPLICATE_CHECK_ENABLED = os.getenv('DUPLICATE_CHECK', '1') not in ('0', 'false', 'False')
+
+# Near-duplicate scans - the same paper scanned again with another crop or DPI.
+# Documents match when every page hash differs in at most this many of 256 bits;
+# a match is skipped only when the file names don't name two different invoices.
+NEAR_DUPLICATE_CHECK = os.getenv('NEAR_DUPLICATE_CHECK', '1') not in ('0', 'false', 'False')
+NEAR_DUPLICATE_THRESHOLD = int(os.getenv('NEAR_DUPLICATE_THRESHOLD', '12'))
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.tif', '.tiff')
+
+
+def invoice_key(company_name: str, invoice_number: str) -> Tuple[str, str]:
+    """Normalized (company, invoice number) - case and surrounding spaces don't make a new invoice"""
+    return company_name.strip().lower(), invoice_number.strip().lower()
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+
+def document_distance(first: List[int], second: List[int]) -> Optional[int]:
+    """Largest page hash distance of two documents, None if their page counts differ"""
+    if not first or len(first) != len(second):
+        return None
+    return max(hamming_distance(a, b) for a, b in zip(first, second))
+
+
+def filename_key(file_path: str) -> Optional[Tuple[str, str]]:
+    """Invoice key from the file name, None if the name doesn't follow the naming scheme"""
+    try:
+        company_name, invoice_number, _, _ = parse_invoice_filename(os.path.basename(file_path))
+    except ValueError:
+        return None
+    return invoice_key(company_name, invoice_number)
+
+
+def similar_scan_reason(file_path: str, similar_name: str, distance: int, where: str = "") -> Optional[str]:
+    """
+    Skip reason for a scan that looks like another document, None if it is kept.
+
+    Invoices printed from one template hash alike even when their numbers and
+    amounts differ, so a look-alike only counts as a rescan when the two file
+    names don't name different invoices. Otherwise the match is just reported.
+    """
+    key, similar_key = filename_key(file_path), filename_key(similar_name)
+    if key is not None and similar_key is not None and key != similar_key:
+        print(f"[INFO] {os.path.basename(file_path)} przypomina {similar_name}{where} (różnica {distance} bitów), "
+              f"ale nazwa pliku wskazuje inną fakturę - nie pominięto")
+        return None
+    return f"skan podobny do {similar_name}{where} (różnica {distance} bitów)"
+
+
+class DuplicateIndex:
+    """
+    Persistent index of exported invoices.
+
+    An invoice is known when its (company, invoice number) from the file name
+    or its file content hash was exported before. Lookups are indexed, so the
+    check costs one file hash and two queries - far less than OCR.
+
+    Perceptual page hashes of exported documents are kept as well; a rescan of
+    a known paper invoice is found by comparing them within a bit threshold.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, near_threshold: Optional[int] = None):
+        self.db_path = db_path or os.path.join(get_app_data_dir(), "processed_invoices.sqlite3")
+        self.near_threshold = NEAR_DUPLICATE_THRESHOLD if near_threshold is None else near_threshold
+        self._lock = threading.Lock()
+        # Page hashes of known documents by page count, loaded on first use
+        self._known_pages: Optional[Dict[int, List[Tuple[str, List[int]]]]] = None
+        # Page hashes computed during this run, by content hash
+        self._computed_pages: Dict[str, List[int]] = {}
+        connection = self._connect()
+        try:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS processed (
+                    company TEXT NOT NULL,
+                    invoice_number TEXT NOT NULL,
+                    file_hash TEXT,
+                    file_name TEXT,
+                    processed_at TEXT NOT NULL,
+                    PRIMARY KEY (company, invoice_number)
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_processed_file_hash ON processed (file_hash)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS page_hashes (
+                    file_hash TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    page_hash TEXT NOT NULL,
+                    file_name TEXT,
+                    PRIMARY KEY (file_hash, page)
+                )""")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def find(self, key: Optional[Tuple[str, str]], file_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Look an invoice up by key and/or content hash.
+
+        Returns:
+            Description of the earlier export, None if the invoice is new
+        """
+        connection = self._connect()
+        try:
+            row = None
+            if key is not None:
+                row = connection.execute(
+                    "SELECT file_name, processed_at FROM processed WHERE company = ? AND invoice_number = ?",
+                    key).fetchone()
+            if row is None and file_hash:
+                row = connection.execute(
+                    "SELECT file_name, processed_at FROM processed WHERE file_hash = ? LIMIT 1",
+                    (file_hash,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return f"już wyeksportowana ({row[0]}, {row[1]})"
+
+    def page_hashes_of(self, file_path: str, file_hash: str) -> List[int]:
+        """Perceptual page hashes of a file, computed once per run"""
+        if file_hash not in self._computed_pages:
+            try:
+                self._computed_pages[file_hash] = page_hashes(file_path)
+            except Exception as e:
+                print(f"[WARN] Nie udało się obliczyć skrótów stron {os.path.basename(file_path)}: {e}")
+                self._computed_pages[file_hash] = []
+        return self._computed_pages[file_hash]
+
+    def _load_known_pages(self) -> Dict[int, List[Tuple[str, List[int]]]]:
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT file_hash, file_name, page, page_hash FROM page_hashes ORDER BY file_hash, page").fetchall()
+        finally:
+            connection.close()
+        documents: Dict[str, Tuple[str, List[int]]] = {}
+        for file_hash, file_name, _, page_hash in rows:
+            documents.setdefault(file_hash, (file_name, []))[1].append(int(page_hash, 16))
+        known: Dict[int, List[Tuple[str, List[int]]]] = {}
+        for file_name, hashes in documents.values():
+            known.setdefault(len(hashes), []).append((file_name, hashes))
+        return known
+
+    def find_similar(self, hashes: List[int], threshold: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """
+        Closest exported document whose pages all lie within the threshold.
+
+        Returns:
+            (file name, distance) or None
+        """
+        if threshold is None:
+            threshold = self.near_threshold
+        if not hashes:
+            return None
+        with self._lock:
+            if self._known_pages is None:
+                self._known_pages = self._load_known_pages()
+            candidates = list(self._known_pages.get(len(hashes), []))
+
+        best = None
+        for file_name, known_hashes in candidates:
+            distance = document_distance(hashes, known_hashes)
+            if distance is not None and distance <= threshold and (best is None or distance < best[1]):
+                best = (file_name, distance)
+        return best
+
+    def check_file(self, file_path: str, near_duplicates: Optional[bool] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Check an invoice file before any OCR or AI work.
+
+        Args:
+            file_path: Invoice file
+            near_duplicates: Also compare perceptual page hashes (None = NEAR_DUPLICATE_CHECK)
+
+        Returns:
+            (reason if it is a duplicate else None, content hash of the file)
+        """
+        if near_duplicates is None:
+            near_duplicates = NEAR_DUPLICATE_CHECK
+        try:
+            file_hash = file_sha256(file_path)
+        except OSError:
+            # Unreadable files fail later with a proper error
+            return None, None
+
+        reason = self.find(filename_key(file_path), file_hash)
+        if reason is None and near_duplicates:
+            similar = self.find_similar(self.page_hashes_of(file_path, file_hash))
+            if similar is not None:
+                reason = similar_scan_reason(file_path, *similar)
+        return reason, file_hash
+
+    def register(self, company_name: str, invoice_number: str, file_hash: Optional[str], file_name: str,
+                 hashes: Optional[List[int]] = None) -> None:
+        """Remember an exported invoice, with its perceptual page hashes if given"""
+        processed_at = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO processed (company, invoice_number, file_hash, file_name, processed_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (*invoice_key(company_name, invoice_number), file_hash, file_name, processed_at))
+                    if hashes and file_hash:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO page_hashes (file_hash, page, page_hash, file_name) "
+                            "VALUES (?, ?, ?, ?)",
+                            [(file_hash, page, f"{page_hash:x}", file_name) for page, page_hash in enumerate(hashes)])
+            finally:
+                connection.close()
+            if hashes and file_hash and self._known_pages is not None:
+                self._known_pages.setdefault(len(hashes), []).append((file_name, hashes))
+
+    def forget(self, file_paths: List[str]) -> int:
+        """Remove invoices from the index so they can be processed again, returns removed entries"""
+        removed = 0
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    for file_path in file_paths:
+                        key = filename_key(file_path)
+                        if key is not None:
+                            removed += connection.execute(
+                                "DELETE FROM processed WHERE company = ? AND invoice_number = ?", key).rowcount
+                        if os.path.exists(file_path):
+                            file_hash = file_sha256(file_path)
+                            removed += connection.execute(
+                                "DELETE FROM processed WHERE file_hash = ?", (file_hash,)).rowcount
+                            connection.execute("DELETE FROM page_hashes WHERE file_hash = ?", (file_hash,))
+            finally:
+                connection.close()
+            self._known_pages = None
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM page_hashes")
+                    return connection.execute("DELETE FROM processed").rowcount
+            finally:
+                connection.close()
+                self._known_pages = None
+
+
+_duplicate_index: Optional[DuplicateIndex] = None
+_duplicate_index_lock = threading.Lock()
+
+
+def get_duplicate_index() -> DuplicateIndex:
+    """Return the shared duplicate index"""
+    global _duplicate_index
+    with _duplicate_index_lock:
+        if _duplicate_index is None:
+            _duplicate_index = DuplicateIndex()
+        return _duplicate_index
+
+
+def list_invoice_files(folder: str, recursive: bool) -> List[str]:
+    """PDF and TIF files in the folder (and its subfolders), sorted by path"""
+    file_paths = []
+    for root, _, file_names in os.walk(folder):
+        file_paths.extend(os.path.join(root, name) for name in file_names
+                          if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS)
+        if not recursive:
+            break
+    return sorted(file_paths)
+
+
+def dedupe_folder(folder: str, threshold: Optional[int] = None, recursive: bool = False,
+                  index: Optional[DuplicateIndex] = None) -> List[Tuple[str, str]]:
+    """
+    Find exact and near-duplicate scans in a folder, among themselves and
+    (if an index is given) against already exported invoices.
+    The first file of every group in name order is kept.
+
+    Returns:
+        (duplicate file, reason) pairs
+    """
+    if threshold is None:
+        threshold = NEAR_DUPLICATE_THRESHOLD
+    kept: List[Tuple[str, str, List[int]]] = []  # (file_path, content hash, page hashes)
+    duplicates: List[Tuple[str, str]] = []
+
+    for file_path in list_invoice_files(folder, recursive):
+        try:
+            file_hash = file_sha256(file_path)
+            hashes = page_hashes(file_path)
+        except Exception as e:
+            print(f"[WARN] Pominięto {file_path}: {e}")
+            continue
+
+        reason = None
+        if index is not None:
+            reason = index.find(filename_key(file_path), file_hash)
+            if reason is None:
+                similar = index.find_similar(hashes, threshold)
+                if similar is not None:
+                    reason = similar_scan_reason(file_path, *similar)
+        if reason is None:
+            for kept_path, kept_hash, kept_hashes in kept:
+                if kept_hash == file_hash:
+                    reason = f"identyczna z {os.path.basename(kept_path)}"
+                    break
+                distance = document_distance(hashes, kept_hashes)
+                if distance is not None and distance <= threshold:
+                    reason = similar_scan_reason(file_path, os.path.basename(kept_path), distance)
+                    if reason is not None:
+                        break
+
+        if reason is None:
+            kept.append((file_path, file_hash, hashes))
+        else:
+            duplicates.append((file_path, reason))
+    return duplicates
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Zarządzanie indeksem przetworzonych faktur")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check = subparsers.add_parser("check", help="sprawdź, czy faktury były już wyeksportowane")
+    check.add_argument("files", nargs="+")
+    forget = subparsers.add_parser("forget", help="usuń faktury z indeksu, aby przetworzyć je ponownie")
+    forget.add_argument("files", nargs="+")
+    subparsers.add_parser("clear", help="usuń cały indeks")
+    dedupe = subparsers.add_parser("dedupe", help="znajdź duplikaty i podobne skany w folderze")
+    dedupe.add_argument("folder")
+    dedupe.add_argument("--threshold", type=int, default=None,
+                        help=f"maks. różnica bitów na stronę (domyślnie {NEAR_DUPLICATE_THRESHOLD})")
+    dedupe.add_argument("--recursive", action="store_true", help="przeszukaj też podfoldery")
+    dedupe.add_argument("--no-index", action="store_true", help="nie porównuj z wyeksportowanymi fakturami")
+    dedupe.add_argument("--move", metavar="DIR", help="przenieś duplikaty do tego folderu")
+    args = parser.parse_args(argv)
+
+    index = get_duplicate_index()
+    if args.command == "check":
+        for file_path in args.files:
+            reason, _ = index.check_file(file_path)
+            print(f"{os.path.basename(file_path)}: {reason or 'nowa'}")
+    elif args.command == "dedupe":
+        duplicates = dedupe_folder(args.folder, args.threshold, args.recursive, None if args.no_index else index)
+        for file_path, reason in duplicates:
+            print(f"{file_path}: {reason}")
+            if args.move:
+                os.makedirs(args.move, exist_ok=True)
+                shutil.move(file_path, os.path.join(args.move, os.path.basename(file_path)))
+        print(f"Znaleziono {len(duplicates)} duplikatów" + (f", przeniesiono do {args.move}" if args.move else ""))
+    elif args.command == "forget":
+        print(f"Usunięto {index.forget(args.files)} wpisów z {index.db_path}")
+    else:
+        print(f"Usunięto {index.clear()} wpisów z {index.db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,110 +1,193 @@
-from typing import List
-import pandas as pd
+from typing import List, Optional
 import os
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Alignment, Border, Font, Side
+from src.core.rate_table import resolve_rates
 from src.models.CompanyData import CompanyDataModel
 
-def export_to_excel(gathered_data: List[CompanyDataModel], eur_to_pln_rate: float, excel_file=None):
+# Sheet columns and their widths
+COLUMNS = ['Firma', 'Numer Faktury', 'Temat', 'Typ', 'Netto', 'Brutto', 'VAT', 'Waluta', 'Netto EUR', 'Plik',
+           'Data faktury', 'Kurs', 'Data kursu', 'Netto w walucie']
+COLUMN_WIDTHS = {
+    'Firma': 30,
+    'Numer Faktury': 20,
+    'Temat': 15,
+    'Typ': 10,
+    'Netto': 15,
+    'Brutto': 15,
+    'VAT': 15,
+    'Waluta': 10,
+    'Netto EUR': 15,
+    'Plik': 25,
+    'Data faktury': 12,
+    'Kurs': 10,
+    'Data kursu': 12,
+    'Netto w walucie': 15,
+}
+
+# Same look as the header pandas used to write
+_HEADER_FONT = Font(bold=True)
+_HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                        top=Side(style='thin'), bottom=Side(style='thin'))
+_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def build_row(company_data: CompanyDataModel, pln_rate: Optional[float],
+              rate_date: Optional[str] = None) -> dict:
+    """
+    Sheet row of one invoice, foreign-currency amounts converted to PLN.
+
+    Args:
+        company_data: Invoice record
+        pln_rate: PLN per unit of the invoice currency (None = leave the amounts unconverted)
+        rate_date: Date of the NBP table the rate comes from
+    """
+    row = {
+        'Firma': company_data.company_name,
+        'Numer Faktury': company_data.invoice_number,
+        'Temat': company_data.topic_number,
+        'Typ': company_data.invoice_type if company_data.invoice_type else "",
+        'Waluta': company_data.currency,
+        'Plik': os.path.basename(company_data.filepath),
+        'Data faktury': company_data.invoice_date,
+    }
+    if company_data.currency != "PLN" and pln_rate is not None:
+        row.update({
+            'Netto': round(company_data.net_value * pln_rate, 2),  # Converted to PLN
+            'Brutto': round(company_data.gross_value * pln_rate, 2),  # Converted to PLN
+            'VAT': round(company_data.vat_value * pln_rate, 2),  # Converted to PLN
+            'Netto EUR': round(company_data.net_value, 2) if company_data.currency == "EUR" else None,
+            'Kurs': pln_rate,
+            'Data kursu': rate_date,
+            'Netto w walucie': round(company_data.net_value, 2),  # Original amount
+        })
+        return row
+    # PLN, or a currency without a known rate - use original amounts
+    row.update({
+        'Netto': round(company_data.net_value, 2),
+        'Brutto': round(company_data.gross_value, 2),
+        'VAT': round(company_data.vat_value, 2),
+        'Netto EUR': None,
+        'Kurs': None,
+        'Data kursu': None,
+        'Netto w walucie': round(company_data.net_value, 2) if company_data.currency != "PLN" else None,
+    })
+    return row
+
+
+def build_rows(records: List[CompanyDataModel], eur_to_pln_rate: float) -> List[dict]:
+    """Sheet rows of a batch, each converted with the rate for its invoice date"""
+    rates = resolve_rates(records, eur_to_pln_rate)
+    return [build_row(record, *(rate or (None, None))) for record, rate in zip(records, rates)]
+
+
+def _open_ledger(excel_file: str):
+    """
+    Open the existing workbook, or start a new one with the header row.
+    Returns (workbook, worksheet, header) where header is the column order of the sheet.
+    """
+    if os.path.exists(excel_file):
+        try:
+            workbook = load_workbook(excel_file)
+            worksheet = workbook.active
+            header = [cell.value for cell in worksheet[1]] if worksheet.max_row >= 1 else []
+            header = [name for name in header if name is not None]
+            if header:
+                # Columns added since the file was created go to the end
+                for name in COLUMNS:
+                    if name not in header:
+                        header.append(name)
+                        _write_header_cell(worksheet, len(header), name)
+                return workbook, worksheet, header
+            return workbook, worksheet, _write_header(worksheet)
+        except Exception as e:
+            print(f"Warning: Could not read existing Excel file: {e}")
+            print("Creating new file with current data.")
+
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = 'Sheet1'
+    return workbook, worksheet, _write_header(worksheet)
+
+
+def style_header_cell(cell) -> None:
+    """Bold, bordered, centered - the header style of the ledger sheet"""
+    cell.font = _HEADER_FONT
+    cell.border = _HEADER_BORDER
+    cell.alignment = _HEADER_ALIGNMENT
+
+
+def _write_header_cell(worksheet, column: int, name: str) -> None:
+    style_header_cell(worksheet.cell(row=1, column=column, value=name))
+
+
+def _write_header(worksheet) -> List[str]:
+    for column, name in enumerate(COLUMNS, start=1):
+        _write_header_cell(worksheet, column, name)
+    return list(COLUMNS)
+
+
+def _set_column_widths(worksheet, header: List[str]) -> None:
+    for column, name in enumerate(header, start=1):
+        width = COLUMN_WIDTHS.get(name)
+        if width is not None:
+            worksheet.column_dimensions[worksheet.cell(row=1, column=column).column_letter].width = width
+
+
+def export_to_excel(gathered_data: List[CompanyDataModel], eur_to_pln_rate: float,
+                    excel_file: Optional[str] = None):
     """
     Export company data to Excel file without overwriting existing data.
     Uses the new simplified data model with filename-based company information.
+
+    New rows are appended to the existing sheet in place and column widths are
+    set in the same single save - existing rows are never re-read into a DataFrame
+    or written out a second time.
+
+    Foreign-currency amounts are converted with the NBP rate for each invoice date;
+    eur_to_pln_rate is used for EUR invoices when that rate is not available.
     """
-    
+
     # Set default path to Downloads folder if not specified
     if excel_file is None:
         downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
         excel_file = os.path.join(downloads_path, "faktury_data.xlsx")
-    
-    # Convert CompanyDataModel objects to dictionaries
-    new_data = []
+
+    # Collect CompanyDataModel objects to export
+    records = []
     for company_data in gathered_data:
         if isinstance(company_data, CompanyDataModel):
-            # Handle EUR currency conversion
-            if company_data.currency == "EUR":
-                # Convert EUR amounts to PLN
-                pln_net = company_data.net_value * eur_to_pln_rate
-                pln_gross = company_data.gross_value * eur_to_pln_rate
-                pln_vat = company_data.vat_value * eur_to_pln_rate
-                
-                new_data.append({
-                    'Firma': company_data.company_name,
-                    'Numer Faktury': company_data.invoice_number,
-                    'Temat': company_data.topic_number,
-                    'Typ': company_data.invoice_type if company_data.invoice_type else "",
-                    'Netto': round(pln_net, 2),  # Converted to PLN
-                    'Brutto': round(pln_gross, 2),  # Converted to PLN
-                    'VAT': round(pln_vat, 2),  # Converted to PLN
-                    'Waluta': company_data.currency,
-                    'Netto EUR': round(company_data.net_value, 2),  # Original EUR amount
-                    'Plik': os.path.basename(company_data.filepath),
-                })
-            else:
-                # PLN or other currencies - use original amounts
-                new_data.append({
-                    'Firma': company_data.company_name,
-                    'Numer Faktury': company_data.invoice_number,
-                    'Temat': company_data.topic_number,
-                    'Typ': company_data.invoice_type if company_data.invoice_type else "",
-                    'Netto': round(company_data.net_value, 2),
-                    'Brutto': round(company_data.gross_value, 2),
-                    'VAT': round(company_data.vat_value, 2),
-                    'Waluta': company_data.currency,
-                    'Netto EUR': "",  # Empty for non-EUR currencies
-                    'Plik': os.path.basename(company_data.filepath),
-                })
+            # Zero amounts of a failed extraction must not end up in the sheet
+            if company_data.extraction_error:
+                print(f"[WARN] Pominięto w eksporcie {company_data.filepath}: {company_data.extraction_error}")
+                continue
+            records.append(company_data)
         else:
             print(f"Warning: Expected CompanyDataModel but got {type(company_data)}: {company_data}")
-    
+
+    # Convert them to sheet rows - foreign currencies at the NBP rate of each invoice date
+    new_data = build_rows(records, eur_to_pln_rate)
+
     if not new_data:
         print("No valid CompanyDataModel objects found to export.")
         return False
 
-    # Create DataFrame from new data
-    new_df = pd.DataFrame(new_data)
-    
-    # Check if Excel file already exists
-    if os.path.exists(excel_file):
-        try:
-            # Read existing data
-            existing_df = pd.read_excel(excel_file)
-            # Append new data to existing data
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        except Exception as e:
-            print(f"Warning: Could not read existing Excel file: {e}")
-            print("Creating new file with current data.")
-            combined_df = new_df
-    else:
-        # If file doesn't exist, use only new data
-        combined_df = new_df
-    
+    workbook, worksheet, header = _open_ledger(excel_file)
+
     try:
-        # Save to Excel
-        combined_df.to_excel(excel_file, index=False)
-
-
-        workbook = load_workbook(excel_file)
-        worksheet = workbook.active
-        
-        if worksheet:
-            # Set column widths for new structure
-            worksheet.column_dimensions['A'].width = 30  # Firma
-            worksheet.column_dimensions['B'].width = 20  # Numer Faktury
-            worksheet.column_dimensions['C'].width = 15  # Temat
-            worksheet.column_dimensions['D'].width = 10  # Typ
-            worksheet.column_dimensions['E'].width = 15  # Netto
-            worksheet.column_dimensions['F'].width = 15  # Brutto
-            worksheet.column_dimensions['G'].width = 15  # VAT
-            worksheet.column_dimensions['H'].width = 10  # Waluta
-            worksheet.column_dimensions['I'].width = 15  # Netto EUR
-            worksheet.column_dimensions['J'].width = 25  # Plik
+        for row in new_data:
+            worksheet.append([row.get(name) for name in header])
+
+        _set_column_widths(worksheet, header)
 
         workbook.save(excel_file)
-        workbook.close()
-        
+
         print(f"Udało się wyeksprtować {len(new_data)} rekordów do {excel_file}")
-        print(f"Suma rekordów w pliku: {len(combined_df)}")
+        print(f"Suma rekordów w pliku: {worksheet.max_row - 1}")
 
         return True
     except Exception as e:
         print(f"Error saving to Excel: {e}")
-        return False
\ No newline at end of file
+        return False
+    finally:
+        workbook.close()
@@ -1,5 +1,151 @@
-import requests
-from typing import Optional
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_EUR_TO_PLN_RATE = 4.25  # Updated to more current rate (as of 2024)
+
+# Timeout of a single rate request in seconds
+RATE_REQUEST_TIMEOUT = 10
+# Overall time for a lookup across all sources, and the head start each source
+# gets before the next one is queried as well (hedging)
+RATE_LOOKUP_DEADLINE = float(os.getenv('RATE_LOOKUP_DEADLINE', '5'))
+RATE_HEDGE_DELAY = float(os.getenv('RATE_HEDGE_DELAY', '0.5'))
+
+NBP_URL = "http://api.nbp.pl/api/exchangerates/rates/a/eur/?format=json"
+EXCHANGERATE_API_URL = "https://api.exchangerate-api.com/v4/latest/EUR"
+# You can get free API key at https://fixer.io/
+# For now, we'll use a public endpoint that might work
+FIXER_URL = "https://api.fixer.io/latest?base=EUR&symbols=PLN"
+
+# requests is imported with the session - the UI shows the stored rate without it
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> "requests.Session":
+    """
+    Return the shared HTTP session - connections to the rate APIs are pooled
+    and kept alive, so repeated requests skip the TCP/TLS handshake.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def fetch_nbp(url: str = NBP_URL, timeout: float = RATE_REQUEST_TIMEOUT) -> Tuple[float, Optional[str]]:
+    """NBP table A mid rate and the date it is effective for"""
+    response = get_http_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return float(data['rates'][0]['mid']), data['rates'][0].get('effectiveDate')
+
+
+def fetch_exchangerate_api(url: str = EXCHANGERATE_API_URL,
+                           timeout: float = RATE_REQUEST_TIMEOUT) -> Tuple[float, Optional[str]]:
+    response = get_http_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return float(data['rates']['PLN']), data.get('date')
+
+
+def fetch_fixer(url: str = FIXER_URL, timeout: float = RATE_REQUEST_TIMEOUT) -> Tuple[float, Optional[str]]:
+    response = get_http_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return float(data['rates']['PLN']), data.get('date')
+
+
+RateFetcher = Callable[..., Tuple[float, Optional[str]]]
+
+# (source name, fetch function taking timeout=) in order of preference - NBP is the official source
+RATE_SOURCES: List[Tuple[str, RateFetcher]] = [
+    ('nbp', fetch_nbp),
+    ('exchangerate-api', fetch_exchangerate_api),
+    ('fixer', fetch_fixer),
+]
+
+
+def fetch_eur_to_pln_quote(deadline: Optional[float] = None, hedge_delay: Optional[float] = None,
+                           sources: Optional[List[Tuple[str, RateFetcher]]] = None
+                           ) -> Optional[Tuple[float, str, Optional[str]]]:
+    """
+    Fetch the EUR/PLN rate with hedged requests to all sources.
+
+    The preferred source is queried first; each following source starts after
+    hedge_delay, or at once when an earlier one fails. The first valid answer
+    wins (by priority when several are ready together), requests still in flight
+    are abandoned, and the whole lookup is bounded by one deadline.
+
+    Args:
+        deadline: Seconds for the whole lookup (None = RATE_LOOKUP_DEADLINE)
+        hedge_delay: Head start of each source (None = RATE_HEDGE_DELAY, 0 = all at once)
+        sources: (name, fetch) pairs in order of preference (None = RATE_SOURCES)
+
+    Returns:
+        (rate, source name, effective date or None), None if no source answered in time
+    """
+    if deadline is None:
+        deadline = RATE_LOOKUP_DEADLINE
+    if hedge_delay is None:
+        hedge_delay = RATE_HEDGE_DELAY
+    if sources is None:
+        sources = RATE_SOURCES
+
+    expires_at = time.monotonic() + deadline
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="rate-source")
+    pending = {}  # future -> priority
+    next_source = 0
+    next_start = time.monotonic()
+
+    def start_next() -> None:
+        nonlocal next_source, next_start
+        name, fetch = sources[next_source]
+        timeout = max(0.1, min(RATE_REQUEST_TIMEOUT, expires_at - time.monotonic()))
+        pending[executor.submit(fetch, timeout=timeout)] = next_source
+        next_source += 1
+        next_start = time.monotonic() + hedge_delay
+
+    try:
+        while True:
+            now = time.monotonic()
+            while next_source < len(sources) and (now >= next_start or not pending):
+                start_next()
+            if not pending or now >= expires_at:
+                break
+
+            wake_at = expires_at if next_source >= len(sources) else min(expires_at, next_start)
+            done, _ = wait(list(pending), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+            for future in sorted(done, key=lambda item: pending[item]):
+                name = sources[pending.pop(future)][0]
+                try:
+                    rate, effective_date = future.result()
+                except Exception as e:
+                    print(f"[WARN] Nie udało się pobrać kursu EUR/PLN z {name}: {e}")
+                    # A failed source hands over to the next one right away
+                    next_start = time.monotonic()
+                    continue
+                print(f"[OK] Pobrano kurs EUR/PLN z {name}: {rate:.4f}")
+                return rate, name, effective_date
+
+        if pending:
+            print(f"[WARN] Przekroczono limit czasu pobierania kursu EUR/PLN ({deadline:.1f} s)")
+        return None
+    finally:
+        # Abandon slower requests - their threads finish on their own timeouts
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def get_eur_to_pln_rate() -> Optional[float]:
@@ -8,18 +154,10 @@ def get_eur_to_pln_rate() -> Optional[float]:
     Returns None if fetching fails.
     """
     try:
-        # NBP API endpoint for EUR exchange rate
-        url = "http://api.nbp.pl/api/exchangerates/rates/a/eur/?format=json"
-        
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        rate = data['rates'][0]['mid']
-        
+        rate, _ = fetch_nbp()
         print(f"[OK] Pobrano aktualny kurs EUR/PLN: {rate:.4f}")
-        return float(rate)
-        
+        return rate
+
     except Exception as e:
         print(f"[WARN] Nie udało się pobrać kursu EUR/PLN: {e}")
         return None
@@ -29,45 +167,13 @@ def get_eur_to_pln_rate_fallback() -> float:
     """
     Try to get current EUR/PLN rate, fallback to multiple sources if primary fails.
     Returns default rate if all sources fail.
+
+    Always goes to the network - use rate_store.get_eur_to_pln_rate_cached()
+    to serve the stored rate without waiting.
     """
-    default_rate = 4.25  # Updated to more current rate (as of 2024)
-    
-    # Try NBP API first (Polish National Bank - official source)
-    rate = get_eur_to_pln_rate()
-    if rate:
-        return rate
-    
-    # Fallback to exchangerate-api.com
-    try:
-        url = "https://api.exchangerate-api.com/v4/latest/EUR"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        rate = data['rates']['PLN']
-        
-        print(f"[OK] Pobrano kurs EUR/PLN z exchangerate-api: {rate:.4f}")
-        return float(rate)
-        
-    except Exception as e:
-        print(f"[WARN] Backup API też nie działa: {e}")
-    
-    # Last fallback to fixer.io (requires free API key but has free tier)
-    try:
-        # You can get free API key at https://fixer.io/
-        # For now, we'll use a public endpoint that might work
-        url = "https://api.fixer.io/latest?base=EUR&symbols=PLN"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'rates' in data and 'PLN' in data['rates']:
-                rate = data['rates']['PLN']
-                print(f"[OK] Pobrano kurs EUR/PLN z fixer.io: {rate:.4f}")
-                return float(rate)
-                
-    except Exception:
-        pass
-    
-    print(f"[WARN] Używam domyślnego kursu EUR/PLN: {default_rate}")
-    return default_rate
\ No newline at end of file
+    quote = fetch_eur_to_pln_quote()
+    if quote is not None:
+        return quote[0]
+
+    print(f"[WARN] Używam domyślnego kursu EUR/PLN: {DEFAULT_EUR_TO_PLN_RATE}")
+    return DEFAULT_EUR_TO_PLN_RATE
@@ -0,0 +1,187 @@
+import datetime
+import re
+from collections import Counter
+from dataclasses import dataclass
+from itertools import combinations
+from typing import List, Optional
+
+# 1 234,56 | 1.234,56 | 1,234.56 | 1234.56 | 12,00 - always two decimal places
+AMOUNT_PATTERN = re.compile(
+    r'(?<![\d,.])\d{1,3}(?:[ \u00a0.,]\d{3})*[,.]\d{2}(?!\d|[.,]\d)|(?<![\d,.])\d+[,.]\d{2}(?!\d|[.,]\d)'
+)
+
+# net + VAT may differ from gross by rounding of per-line VAT
+ROUNDING_TOLERANCE = 0.02
+
+SUMMARY_LABELS = ('razem', 'suma', 'ogółem', 'ogolem', 'podsumowanie', 'total')
+NET_LABELS = ('netto', 'net ')
+VAT_LABELS = ('vat', 'podatek', 'kwota podatku')
+GROSS_LABELS = ('brutto', 'do zapłaty', 'do zaplaty', 'należność', 'naleznosc', 'gross', 'amount due')
+
+CURRENCY_TOKENS = {
+    'PLN': re.compile(r'\bpln\b|\bzł|\bzl\b|złotych|zloty', re.IGNORECASE),
+    'EUR': re.compile(r'\beur\b|€|\beuro', re.IGNORECASE),
+    'USD': re.compile(r'\busd\b|\$|\bdolar', re.IGNORECASE),
+    'GBP': re.compile(r'\bgbp\b|£', re.IGNORECASE),
+    'CHF': re.compile(r'\bchf\b', re.IGNORECASE),
+}
+
+# 31.01.2024 | 31-01-2024 | 31/01/2024 | 2024-01-31
+DATE_PATTERN = re.compile(
+    r'(?<!\d)(?:(\d{1,2})[./-](\d{1,2})[./-](\d{4})|(\d{4})-(\d{2})-(\d{2}))(?!\d)'
+)
+ISSUE_DATE_LABELS = ('data wystawienia', 'wystawion', 'date of issue', 'issue date', 'invoice date')
+
+
+@dataclass
+class LocalAmounts:
+    """Amounts found by the rule-based extractor"""
+    net_value: float
+    gross_value: float
+    vat_value: float
+    currency: str = "PLN"
+    invoice_date: Optional[str] = None  # YYYY-MM-DD
+
+
+def parse_amount(token: str) -> Optional[float]:
+    """
+    Parse an amount written in Polish or English notation.
+    The last ',' or '.' followed by two digits is the decimal separator,
+    every other space, dot or comma is a thousands separator.
+    """
+    token = token.strip().replace(' ', '').replace('\u00a0', '')
+    match = re.fullmatch(r'([\d.,]*\d)[.,](\d{2})', token)
+    if not match:
+        return None
+    integer_part = re.sub(r'[.,]', '', match.group(1))
+    if not integer_part.isdigit():
+        return None
+    return float(f"{integer_part}.{match.group(2)}")
+
+
+def find_amounts(line: str) -> List[float]:
+    """All amounts on a line, skipping percentages like 23,00%"""
+    amounts = []
+    for match in AMOUNT_PATTERN.finditer(line):
+        if line[match.end():match.end() + 2].strip().startswith('%'):
+            continue
+        value = parse_amount(match.group())
+        if value is not None:
+            amounts.append(value)
+    return amounts
+
+
+def is_consistent(net_value: float, vat_value: float, gross_value: float,
+                  tolerance: float = ROUNDING_TOLERANCE) -> bool:
+    """Check that net + VAT equals gross within rounding and the totals are not empty"""
+    return gross_value > 0 and net_value > 0 and vat_value >= 0 and abs(net_value + vat_value - gross_value) <= tolerance
+
+
+def detect_currency(text: str, default: str = "PLN") -> str:
+    """Most frequent currency marker in the text"""
+    counts = Counter()
+    for currency, pattern in CURRENCY_TOKENS.items():
+        counts[currency] = len(pattern.findall(text))
+    currency, count = counts.most_common(1)[0]
+    return currency if count > 0 else default
+
+
+def _find_dates(line: str) -> List[str]:
+    dates = []
+    for match in DATE_PATTERN.finditer(line):
+        day, month, year, iso_year, iso_month, iso_day = match.groups()
+        try:
+            if year:
+                date = datetime.date(int(year), int(month), int(day))
+            else:
+                date = datetime.date(int(iso_year), int(iso_month), int(iso_day))
+        except ValueError:
+            continue
+        dates.append(date.isoformat())
+    return dates
+
+
+def detect_invoice_date(text: str) -> Optional[str]:
+    """
+    Issue date of the invoice as YYYY-MM-DD: the date on (or right below) an
+    issue date label, otherwise the first date in the text.
+    """
+    lines = text.split('\n')
+    for index, line in enumerate(lines):
+        if _has_label(line.lower(), ISSUE_DATE_LABELS):
+            dates = _find_dates(line) or _find_dates(' '.join(lines[index + 1:index + 2]))
+            if dates:
+                return dates[0]
+    dates = _find_dates(text)
+    return dates[0] if dates else None
+
+
+def _has_label(line: str, labels) -> bool:
+    return any(label in line for label in labels)
+
+
+def _from_summary_lines(lines: List[str]) -> Optional[LocalAmounts]:
+    """'Razem 1 000,00 23% 230,00 1 230,00' - three amounts on one summary row"""
+    for line in reversed(lines):
+        if not _has_label(line.lower(), SUMMARY_LABELS):
+            continue
+        amounts = find_amounts(line)
+        if len(amounts) < 3:
+            continue
+        # Columns are usually net, VAT, gross - try the latest matching triple first
+        for net_value, vat_value, gross_value in reversed(list(combinations(amounts, 3))):
+            if is_consistent(net_value, vat_value, gross_value):
+                return LocalAmounts(net_value, gross_value, vat_value)
+    return None
+
+
+def _labeled_candidates(lines: List[str], labels, exclude=()) -> List[float]:
+    """Amounts on lines with one of the labels, or on the line right after a bare label"""
+    candidates = []
+    for index, line in enumerate(lines):
+        lowered = line.lower()
+        if not _has_label(lowered, labels) or (exclude and _has_label(lowered, exclude)):
+            continue
+        amounts = find_amounts(line)
+        if not amounts and index + 1 < len(lines):
+            amounts = find_amounts(lines[index + 1])
+        candidates.extend(amounts)
+    return candidates
+
+
+def _from_labeled_lines(lines: List[str]) -> Optional[LocalAmounts]:
+    """Separate 'Netto:', 'VAT:' and 'Brutto:'/'Do zapłaty:' lines"""
+    gross_candidates = _labeled_candidates(lines, GROSS_LABELS)
+    net_candidates = _labeled_candidates(lines, NET_LABELS, exclude=GROSS_LABELS)
+    vat_candidates = _labeled_candidates(lines, VAT_LABELS, exclude=NET_LABELS + GROSS_LABELS)
+
+    # Final totals come last - prefer later candidates
+    for gross_value in reversed(gross_candidates):
+        for net_value in reversed(net_candidates):
+            for vat_value in reversed(vat_candidates):
+                if is_consistent(net_value, vat_value, gross_value):
+                    return LocalAmounts(net_value, gross_value, vat_value)
+            # VAT exempt / reverse charge - no VAT amount at all
+            if not vat_candidates and is_consistent(net_value, 0.0, gross_value):
+                return LocalAmounts(net_value, gross_value, 0.0)
+    return None
+
+
+def extract_amounts_locally(invoice_text: str) -> Optional[LocalAmounts]:
+    """
+    Rule-based extraction of net, VAT and gross totals from OCR text.
+
+    Returns a result only when net + VAT matches gross within rounding,
+    otherwise None so the caller can fall back to the AI.
+    """
+    lines = [line for line in invoice_text.split('\n') if line.strip()]
+    if not lines:
+        return None
+
+    amounts = _from_summary_lines(lines) or _from_labeled_lines(lines)
+    if amounts is None:
+        return None
+
+    amounts.currency = detect_currency(invoice_text)
+    amounts.invoice_date = detect_invoice_date(invoice_text)
+    return amounts
@@ -0,0 +1,69 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from src.core.local_extractor import is_consistent
+
+# Models tried in order, cheapest first. A ':full' suffix sends the full invoice text
+# instead of the compacted totals windows - the last resort for unusual layouts.
+AI_MODEL_TIERS = os.getenv('AI_MODEL_TIERS', 'gemini-2.0-flash-lite,gemini-2.0-flash,gemini-2.0-flash:full')
+
+# PLN and every currency of the NBP table A - anything else cannot be converted
+KNOWN_CURRENCIES = (
+    'PLN', 'THB', 'USD', 'AUD', 'HKD', 'CAD', 'NZD', 'SGD', 'EUR', 'HUF', 'CHF', 'GBP', 'UAH', 'JPY', 'CZK',
+    'DKK', 'ISK', 'NOK', 'SEK', 'RON', 'BGN', 'TRY', 'ILS', 'CLP', 'PHP', 'MXN', 'ZAR', 'BRL', 'MYR', 'IDR',
+    'INR', 'KRW', 'CNY', 'XDR',
+)
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """One step of the model cascade"""
+    model: str
+    full_text: bool = False  # Skip prompt compaction
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}:full" if self.full_text else self.model
+
+
+def parse_model_tiers(spec: str) -> List[ModelTier]:
+    """
+    Parse a cascade like 'gemini-2.0-flash-lite,gemini-2.0-flash:full'.
+
+    Raises:
+        ValueError: The spec contains no model or an unknown option
+    """
+    tiers = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, _, option = entry.partition(':')
+        if option not in ('', 'full'):
+            raise ValueError(f"Nieznana opcja poziomu modelu: {entry}")
+        tiers.append(ModelTier(model.strip(), full_text=option == 'full'))
+    if not tiers:
+        raise ValueError("AI_MODEL_TIERS nie zawiera żadnego modelu")
+    return tiers
+
+
+def validate_amounts(net_value: float, vat_value: float, gross_value: float, currency: str) -> Optional[str]:
+    """
+    Arithmetic check of an extracted result.
+
+    Correction invoices have negative totals - accepted when net, VAT and
+    gross all have the same sign (VAT may be zero).
+
+    Returns:
+        None if the result is acceptable, otherwise the reason it was rejected
+    """
+    if gross_value == 0 or net_value == 0:
+        return "zerowe kwoty"
+    if (net_value > 0) != (gross_value > 0) or vat_value * gross_value < 0:
+        return "niezgodne znaki kwot"
+    if not is_consistent(abs(net_value), abs(vat_value), abs(gross_value)):
+        return "netto + VAT != brutto"
+    if currency not in KNOWN_CURRENCIES:
+        return f"nieznana waluta {currency}"
+    return None
@@ -1,143 +1,618 @@
 import os
-from pytesseract import image_to_string                 
-from PIL import Image
+import json
+import atexit
+import hashlib
+import functools
 import io
-import pytesseract
-import sys
-
-# Configure Tesseract path for Windows if needed
-# Try to set Tesseract path on Windows
-if sys.platform.startswith('win'):
-    # Common Tesseract installation paths on Windows
-    possible_paths = [
-        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-        r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME', '')),
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            pytesseract.pytesseract.tesseract_cmd = path
-            print(f"[OK] Znaleziono Tesseract: {path}")
-            break
-    else:
-        print("[WARN] Tesseract nie został znaleziony w standardowych lokalizacjach")
-        print("[INFO] Zainstaluj Tesseract z: https://github.com/UB-Mannheim/tesseract/wiki")
-
-# Import PyMuPDF (preferred method as per user requirements)
-try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-    print("[INFO] Using PyMuPDF for PDF processing")
-except ImportError as e:
-    print(f"Error: PyMuPDF not available: {e}")
-    print("Please install PyMuPDF: pip install PyMuPDF")
-    PYMUPDF_AVAILABLE = False
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+from src.core.app_paths import get_app_data_dir
+from src.core.disk_cache import DiskCache, file_sha256
+from src.core.ocr_engine import OCR_LANGUAGES, close_ocr_engines, get_ocr_engine, get_pytesseract, ocr_engine_name
+from src.core.roi import find_totals_region, has_amounts
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# PIL, PyMuPDF and pytesseract are imported by the functions that use them, so
+# importing this module (e.g. while the UI starts) costs almost nothing.
+
+
+@functools.lru_cache(maxsize=1)
+def _pymupdf_available() -> bool:
+    # PyMuPDF is the preferred method as per user requirements
+    try:
+        import fitz  # noqa: F401  # PyMuPDF
+        print("[INFO] Using PyMuPDF for PDF processing")
+        return True
+    except ImportError as e:
+        print(f"Error: PyMuPDF not available: {e}")
+        print("Please install PyMuPDF: pip install PyMuPDF")
+        return False
+
+
+def _fitz():
+    """PyMuPDF module, imported on first use"""
+    if not _pymupdf_available():
+        raise ValueError("PyMuPDF is required for PDF processing. Please install it with: pip install PyMuPDF")
+    import fitz
+    return fitz
+
+# Number of worker processes for page-level PDF OCR (0 = one per CPU core)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0'))
+
+# Documents with fewer pages than this are OCR'd serially - starting
+# the process pool costs more than it saves on tiny documents
+PARALLEL_MIN_PAGES = 3
+
+# Embedded text layer quality threshold - pages below it are treated as scans.
+# Digital invoices from accounting systems easily pass; scanned PDFs have no
+# text layer at all or only a few stray characters.
+TEXT_LAYER_MIN_CHARS = 50
+TEXT_LAYER_MIN_ALNUM_RATIO = 0.5
+
+# Render pages in grayscale - Tesseract binarizes internally anyway and the
+# page buffer is 3x smaller than RGB
+OCR_GRAYSCALE = os.getenv('OCR_GRAYSCALE', '1') not in ('0', 'false', 'False')
+
+# Render zoom for OCR: 300 DPI would be 300/72 = 4.17, but 2.0 is good balance of quality/speed
+OCR_ZOOM = 2.0  # 2x zoom = ~144 DPI
+
+# Region-of-interest mode: a fast low-resolution pass locates the totals block
+# and only that crop is OCR'd at full quality. Falls back to full-page OCR
+# when the crop has no usable amounts.
+OCR_ROI = os.getenv('OCR_ROI', '0') in ('1', 'true', 'True')
+ROI_SCAN_ZOOM = 0.75  # ~54 DPI, enough to find the summary labels
+ROI_MAX_PAGES = 2     # totals are on the last page, sometimes the one before
+
+# Page images sent straight to a multimodal model (image extraction mode):
+# longest side in pixels, JPEG quality, and 'last' page only or 'all' pages
+MODEL_IMAGE_MAX_SIDE = int(os.getenv('MODEL_IMAGE_MAX_SIDE', '1600'))
+MODEL_IMAGE_QUALITY = 80
+MODEL_IMAGE_PAGES = os.getenv('MODEL_IMAGE_PAGES', 'last')
+
+# Perceptual page hashes for near-duplicate scans: dHash of a tiny grayscale render.
+# 16 -> 256-bit hashes; coarser hashes can't tell apart invoices printed from one template.
+PAGE_HASH_SIZE = 16
+PAGE_HASH_ZOOM = 0.25  # ~18 DPI
+PAGE_HASH_MAX_PAGES = 10
+
+# Persistent OCR result cache - re-runs over unchanged files skip OCR entirely
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE', '1') not in ('0', 'false', 'False')
+OCR_CACHE_MAX_MB = int(os.getenv('OCR_CACHE_MAX_MB', '200'))
+OCR_CACHE_MAX_AGE_DAYS = int(os.getenv('OCR_CACHE_MAX_AGE_DAYS', '90'))
+# Bump when the extraction output format changes
+OCR_CACHE_VERSION = 1
+
+_ocr_cache: Optional[DiskCache] = None
+_ocr_cache_lock = threading.Lock()
+
+# Long-lived page worker pool, each worker keeps a warm OCR engine
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    """Return the effective number of OCR worker processes"""
+    if workers is None:
+        workers = OCR_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
 
 # OCR - automatically extract text from images
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+def _ocr_image(image) -> str:
+    """Run OCR on a single image, Polish first with English as fallback"""
+    return get_ocr_engine().recognize(image)
+
+
+def _init_ocr_worker() -> None:
+    """Process pool initializer - load the OCR engine once per worker, not per page"""
+    get_ocr_engine()
+    atexit.register(close_ocr_engines)
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared page worker pool, (re)creating it for the requested size"""
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_workers != workers:
+            if _page_pool is not None:
+                _page_pool.shutdown(wait=True)
+            _page_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker)
+            _page_pool_workers = workers
+        return _page_pool
+
+
+def shutdown_ocr_workers() -> None:
+    """Stop the page worker pool and release OCR engines of this process"""
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=True, cancel_futures=True)
+            _page_pool = None
+            _page_pool_workers = 0
+    close_ocr_engines()
+
+
+atexit.register(shutdown_ocr_workers)
+
+
+def _pixmap_to_image(pix) -> "Image.Image":
+    """
+    Wrap rendered pixmap samples in a PIL image without a PNG encode/decode round-trip.
+    Grayscale samples are mapped directly (no copy), so the image is only valid
+    while the pixmap is alive.
+    """
+    from PIL import Image
+    mode = "L" if pix.n == 1 else "RGB"
+    samples = pix.samples_mv if hasattr(pix, 'samples_mv') else pix.samples
+    return Image.frombuffer(mode, (pix.width, pix.height), samples, "raw", mode, pix.stride, 1)
+
+
+def _render_page(page, grayscale: bool, zoom: float = OCR_ZOOM, clip=None):
+    """Render a PyMuPDF page (or the clip rectangle of it) to a pixmap, at OCR resolution by default"""
+    fitz = _fitz()
+    mat = fitz.Matrix(zoom, zoom)
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    return page.get_pixmap(matrix=mat, colorspace=colorspace, clip=clip, alpha=False)  # type: ignore
+
+
+def _ocr_page(page, grayscale: bool = OCR_GRAYSCALE) -> str:
+    """Render a single PyMuPDF page to an image and run OCR on it"""
+    pix = _render_page(page, grayscale)
+    
+    try:
+        # Hand the pixmap samples to PIL directly
+        pil_image = _pixmap_to_image(pix)
+        
+        return _ocr_image(pil_image)
+        
+    finally:
+        # Clean up pixmap to free memory
+        pil_image = None
+        pix = None
+
+
+def _ocr_page_roi(page, grayscale: bool) -> Optional[str]:
+    """OCR only the totals block of a page. Returns None if no block was found."""
+    scan_pix = _render_page(page, True, ROI_SCAN_ZOOM)
+    try:
+        words = get_ocr_engine().recognize_words(_pixmap_to_image(scan_pix))
+        region = find_totals_region(words, scan_pix.width, scan_pix.height)
+    finally:
+        scan_pix = None
+    
+    if region is None:
+        return None
+    
+    page_rect = page.rect
+    clip = _fitz().Rect(
+        page_rect.x0 + region[0] * page_rect.width,
+        page_rect.y0 + region[1] * page_rect.height,
+        page_rect.x0 + region[2] * page_rect.width,
+        page_rect.y0 + region[3] * page_rect.height,
+    )
+    
+    pix = _render_page(page, grayscale, clip=clip)
+    try:
+        return _ocr_image(_pixmap_to_image(pix))
+    finally:
+        pix = None
+
+
+def _extract_totals_roi_pdf(pdf_document, use_text_layer: bool, grayscale: bool) -> Optional[str]:
+    """
+    Region-of-interest pass over the last pages of a PDF.
+    Returns text of the first page (from the end) whose totals block has usable amounts.
+    """
+    page_count = len(pdf_document)
+    for page_num in range(page_count - 1, max(-1, page_count - 1 - ROI_MAX_PAGES), -1):
+        page = pdf_document[page_num]
+        
+        text = _get_text_layer(page) if use_text_layer else None
+        if text is None:
+            text = _ocr_page_roi(page, grayscale)
+        
+        if text and has_amounts(text):
+            return f"=== Strona {page_num + 1} ===\n{text}\n"
+    
+    return None
+
+
+def _get_text_layer(page) -> Optional[str]:
+    """
+    Return the embedded text of a PDF page if it is good enough to skip OCR.
+    Returns None for scanned pages or pages with a broken text layer.
+    """
+    text = page.get_text("text")
+    visible = ''.join(text.split())
+    
+    if len(visible) < TEXT_LAYER_MIN_CHARS:
+        return None
+    
+    # Fonts without a Unicode mapping produce replacement characters
+    if '\ufffd' in visible:
+        return None
+    
+    alnum_ratio = sum(1 for char in visible if char.isalnum()) / len(visible)
+    if alnum_ratio < TEXT_LAYER_MIN_ALNUM_RATIO:
+        return None
+    
+    return text
+
+
+def _ocr_pdf_page(pdf_path: str, page_num: int, grayscale: bool = OCR_GRAYSCALE) -> str:
+    """
+    Worker entry point for the process pool.
+    Each worker opens the document itself, since PyMuPDF documents cannot be pickled.
+    """
+    pdf_document = _fitz().open(pdf_path)
+    try:
+        return _ocr_page(pdf_document[page_num], grayscale)
+    finally:
+        pdf_document.close()
+
+
+def extract_text_from_pdf(pdf_path: str, workers: Optional[int] = None, use_text_layer: bool = True,
+                          grayscale: Optional[bool] = None, roi: Optional[bool] = None) -> str:
     """
     Reads data from a PDF file and extracts text using OCR with PyMuPDF.
     Uses Polish OCR first, falls back to English if Polish fails.
+    Pages with a usable embedded text layer skip OCR entirely.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        workers: Number of OCR worker processes (None = OCR_WORKERS, 1 = serial)
+        use_text_layer: Use the embedded text of digital pages instead of OCR
+        grayscale: Render pages in grayscale (None = OCR_GRAYSCALE)
+        roi: OCR only the totals block, full pages as fallback (None = OCR_ROI)
     """
     
-    if not PYMUPDF_AVAILABLE:
-        raise ValueError("PyMuPDF is required for PDF processing. Please install it with: pip install PyMuPDF")
+    # Raises ValueError when PyMuPDF is not installed
+    _fitz()
     
-    return _extract_text_from_pdf_pymupdf(pdf_path)
+    return _extract_text_from_pdf_pymupdf(pdf_path, workers, use_text_layer, grayscale, roi)
 
 
-def _extract_text_from_pdf_pymupdf(pdf_path: str) -> str:
+def _extract_text_from_pdf_pymupdf(pdf_path: str, workers: Optional[int] = None, use_text_layer: bool = True,
+                                   grayscale: Optional[bool] = None, roi: Optional[bool] = None) -> str:
     """Extract text using PyMuPDF with improved resource management"""
+    workers = _resolve_workers(workers)
+    if grayscale is None:
+        grayscale = OCR_GRAYSCALE
+    if roi is None:
+        roi = OCR_ROI
     pdf_document = None
     try:
         # Open PDF with PyMuPDF
-        pdf_document = fitz.open(pdf_path)
+        pdf_document = _fitz().open(pdf_path)
+        page_count = len(pdf_document)
         
-        extracted_text = ''
-        for page_num in range(len(pdf_document)):
-            # Get the page
-            page = pdf_document[page_num]
-            
-            # Convert page to image (PNG format)
-            # Use matrix for 300 DPI: 300/72 = 4.17, but 2.0 is good balance of quality/speed
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom = ~144 DPI
-            pix = page.get_pixmap(matrix=mat, alpha=False)  # type: ignore
+        if roi:
+            roi_text = _extract_totals_roi_pdf(pdf_document, use_text_layer, grayscale)
+            if roi_text is not None:
+                return roi_text
+            print(f"[INFO] Brak kwot w obszarze podsumowania, OCR całych stron: {os.path.basename(pdf_path)}")
+        
+        # Fast path - take the embedded text where it is good enough
+        page_texts: List[Optional[str]] = [None] * page_count
+        if use_text_layer:
+            for page_num in range(page_count):
+                page_texts[page_num] = _get_text_layer(pdf_document[page_num])
+        
+        # Only scanned pages go through OCR
+        ocr_pages = [page_num for page_num in range(page_count) if page_texts[page_num] is None]
+        
+        if workers <= 1 or len(ocr_pages) < PARALLEL_MIN_PAGES:
+            # Serial mode - render and OCR pages one after another
+            for page_num in ocr_pages:
+                page_texts[page_num] = _ocr_page(pdf_document[page_num], grayscale)
+        else:
+            # Workers open their own copy of the document
+            pdf_document.close()
+            pdf_document = None
             
-            try:
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                
-                try:
-                    # Try Polish OCR first
-                    text = image_to_string(pil_image, lang='pol')
-                except:
-                    # Fallback to English OCR if Polish fails
-                    text = image_to_string(pil_image, lang='eng')
-                
-                extracted_text += f"=== Strona {page_num + 1} ===\n{text}\n"
-                
-            finally:
-                # Clean up pixmap to free memory
-                pix = None
+            # Render and OCR pages concurrently, map() keeps results in page order
+            executor = _get_page_pool(workers)
+            ocr_texts = executor.map(_ocr_pdf_page, [pdf_path] * len(ocr_pages), ocr_pages,
+                                     [grayscale] * len(ocr_pages))
+            for page_num, text in zip(ocr_pages, ocr_texts):
+                page_texts[page_num] = text
     
     finally:
         # Always close the PDF document
         if pdf_document:
             pdf_document.close()
     
+    extracted_text = ''
+    for page_num, text in enumerate(page_texts):
+        extracted_text += f"=== Strona {page_num + 1} ===\n{text}\n"
+    
     return extracted_text
 
 
-def extract_text_from_tif(tif_path: str) -> str:
+def _ocr_tif_frame(tif_path: str, frame: int) -> str:
+    """Worker entry point for the process pool - OCR a single TIF frame"""
+    from PIL import Image
+    with Image.open(tif_path) as image:
+        image.seek(frame)
+        return _ocr_image(image)
+
+
+def _ocr_image_roi(image) -> Optional[str]:
+    """OCR only the totals block of a scanned image. Returns None if no block was found."""
+    scale = ROI_SCAN_ZOOM / OCR_ZOOM
+    scan_image = image.convert('L')
+    scan_image = scan_image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    
+    words = get_ocr_engine().recognize_words(scan_image)
+    region = find_totals_region(words, scan_image.width, scan_image.height)
+    if region is None:
+        return None
+    
+    crop = image.crop((
+        int(region[0] * image.width),
+        int(region[1] * image.height),
+        int(region[2] * image.width),
+        int(region[3] * image.height),
+    ))
+    return _ocr_image(crop)
+
+
+def _extract_totals_roi_tif(image) -> Optional[str]:
+    """Region-of-interest pass over the last frames of a TIF, see _extract_totals_roi_pdf"""
+    frame_count = getattr(image, 'n_frames', 1)
+    for page_num in range(frame_count - 1, max(-1, frame_count - 1 - ROI_MAX_PAGES), -1):
+        image.seek(page_num)
+        text = _ocr_image_roi(image)
+        if text and has_amounts(text):
+            return f"=== Strona {page_num + 1} ===\n{text}\n"
+    return None
+
+
+def extract_text_from_tif(tif_path: str, workers: Optional[int] = None, roi: Optional[bool] = None) -> str:
     """
     Reads data from a TIF file and extracts text using OCR.
     Uses Polish OCR first, falls back to English if Polish fails.
+    
+    Args:
+        tif_path: Path to the TIF file
+        workers: Number of OCR worker processes (None = OCR_WORKERS, 1 = serial)
+        roi: OCR only the totals block, full pages as fallback (None = OCR_ROI)
     """
+    workers = _resolve_workers(workers)
+    if roi is None:
+        roi = OCR_ROI
     
     # Handle multi-page TIF files
-    extracted_text = ''
+    page_texts: List[str] = []
     image = None
     
     try:
         # Open the TIF file
+        from PIL import Image
         image = Image.open(tif_path)
+        frame_count = getattr(image, 'n_frames', 1)
         
-        page_num = 0
-        while True:
-            try:
+        if roi:
+            roi_text = _extract_totals_roi_tif(image)
+            if roi_text is not None:
+                return roi_text
+            print(f"[INFO] Brak kwot w obszarze podsumowania, OCR całych stron: {os.path.basename(tif_path)}")
+        
+        if workers <= 1 or frame_count < PARALLEL_MIN_PAGES:
+            for page_num in range(frame_count):
                 image.seek(page_num)
-                try:
-                    # Try Polish OCR first
-                    text = image_to_string(image, lang='pol')
-                except:
-                    # Fallback to English OCR if Polish fails
-                    text = image_to_string(image, lang='eng')
-                
-                extracted_text += f"=== Strona {page_num + 1} ===\n{text}\n"
-                page_num += 1
-            except EOFError:
-                # End of pages reached
-                break
+                page_texts.append(_ocr_image(image))
+        else:
+            image.close()
+            image = None
+            
+            # Workers open the file themselves and OCR one frame each
+            executor = _get_page_pool(workers)
+            page_texts = list(executor.map(_ocr_tif_frame, [tif_path] * frame_count, range(frame_count)))
                 
     finally:
         # Clean up image resource
         if image:
             image.close()
+    
+    extracted_text = ''
+    for page_num, text in enumerate(page_texts):
+        extracted_text += f"=== Strona {page_num + 1} ===\n{text}\n"
         
     return extracted_text
 
-def extract_text_from_file(file_path: str) -> str:
+def _encode_model_image(image: "Image.Image", max_side: int) -> bytes:
+    """Downscale an image to max_side and encode it as JPEG"""
+    image = image.convert('L') if OCR_GRAYSCALE else image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=MODEL_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def _dhash(image: "Image.Image", hash_size: int = PAGE_HASH_SIZE) -> int:
     """
-    Extract text from either PDF or TIF files based on file extension.
+    Difference hash of a page: one bit per horizontally adjacent pixel pair of a
+    (hash_size + 1) x hash_size thumbnail. The content box is hashed, not the
+    whole page, so scans with different margins, crops or DPI give close hashes.
+    """
+    from PIL import Image, ImageOps
+    image = image.convert('L')
+    # Shrink large scans first - the thumbnail needs only a few hundred pixels
+    factor = min(image.size) // 256
+    if factor > 1:
+        image = image.reduce(factor)
+    content_box = ImageOps.invert(image).point(lambda value: 255 if value > 64 else 0).getbbox()
+    if content_box:
+        image = image.crop(content_box)
+    
+    thumbnail = image.resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(thumbnail.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | int(pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def page_hashes(file_path: str, max_pages: int = PAGE_HASH_MAX_PAGES) -> List[int]:
+    """
+    Perceptual hashes of the first max_pages pages, computed from a low-resolution
+    render - a small fraction of the cost of OCR.
+    
+    Raises:
+        ValueError: Unsupported file format
     """
     file_extension = os.path.splitext(file_path)[1].lower()
+    hashes: List[int] = []
     
     if file_extension == '.pdf':
-        return extract_text_from_pdf(file_path)
+        with _fitz().open(file_path) as pdf_document:
+            for page_num in range(min(len(pdf_document), max_pages)):
+                pix = _render_page(pdf_document[page_num], True, PAGE_HASH_ZOOM)
+                hashes.append(_dhash(_pixmap_to_image(pix)))
+                pix = None
     elif file_extension in ['.tif', '.tiff']:
-        return extract_text_from_tif(file_path)
+        from PIL import Image
+        with Image.open(file_path) as image:
+            for frame in range(min(getattr(image, 'n_frames', 1), max_pages)):
+                image.seek(frame)
+                hashes.append(_dhash(image))
     else:
-        raise ValueError(f"Unsupported file format: {file_extension}")
\ No newline at end of file
+        raise ValueError(f"Unsupported file format: {file_extension}")
+    
+    return hashes
+
+
+def render_pages_for_model(file_path: str, pages: Optional[str] = None,
+                           max_side: Optional[int] = None) -> List[bytes]:
+    """
+    Render invoice pages as downscaled JPEG images for a multimodal model, without OCR.
+    
+    Args:
+        file_path: PDF or TIF file
+        pages: 'last' for the last page only (where the totals are) or 'all' (None = MODEL_IMAGE_PAGES)
+        max_side: Longest side of the images in pixels (None = MODEL_IMAGE_MAX_SIDE)
+    
+    Returns:
+        JPEG bytes of the selected pages in page order
+    """
+    if pages is None:
+        pages = MODEL_IMAGE_PAGES
+    if max_side is None:
+        max_side = MODEL_IMAGE_MAX_SIDE
+    
+    file_extension = os.path.splitext(file_path)[1].lower()
+    images: List[bytes] = []
+    
+    if file_extension == '.pdf':
+        with _fitz().open(file_path) as pdf_document:
+            page_numbers = range(len(pdf_document))
+            if pages == 'last':
+                page_numbers = page_numbers[-1:]
+            for page_num in page_numbers:
+                page = pdf_document[page_num]
+                # Render straight at the target size instead of downscaling an OCR-sized pixmap
+                zoom = min(OCR_ZOOM, max_side / max(page.rect.width, page.rect.height))
+                pix = _render_page(page, OCR_GRAYSCALE, zoom)
+                images.append(_encode_model_image(_pixmap_to_image(pix), max_side))
+                pix = None
+    elif file_extension in ['.tif', '.tiff']:
+        from PIL import Image
+        with Image.open(file_path) as image:
+            frame_count = getattr(image, 'n_frames', 1)
+            frames = range(frame_count)
+            if pages == 'last':
+                frames = frames[-1:]
+            for frame in frames:
+                image.seek(frame)
+                images.append(_encode_model_image(image, max_side))
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+    
+    return images
+
+
+@functools.lru_cache(maxsize=1)
+def _tesseract_version() -> str:
+    """Installed Tesseract version, part of the cache key so upgrades invalidate old results"""
+    try:
+        return str(get_pytesseract().get_tesseract_version())
+    except Exception:
+        return "unknown"
+
+
+def get_ocr_cache() -> DiskCache:
+    """Return the shared OCR result cache"""
+    global _ocr_cache
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = DiskCache(
+                get_app_data_dir("ocr_cache"),
+                max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024,
+                max_age_seconds=OCR_CACHE_MAX_AGE_DAYS * 24 * 3600,
+            )
+        return _ocr_cache
+
+
+def _ocr_cache_key(file_path: str, use_text_layer: bool, grayscale: bool, roi: bool) -> str:
+    """Cache key: hash of the file content plus every setting that changes the OCR output"""
+    settings = {
+        'version': OCR_CACHE_VERSION,
+        'content': file_sha256(file_path),
+        'extension': os.path.splitext(file_path)[1].lower(),
+        'zoom': OCR_ZOOM,
+        'languages': OCR_LANGUAGES,
+        'grayscale': grayscale,
+        'text_layer': use_text_layer,
+        'roi': roi,
+        'tesseract': _tesseract_version(),
+        'engine': ocr_engine_name(),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def extract_text_from_file(file_path: str, workers: Optional[int] = None, use_text_layer: bool = True,
+                           grayscale: Optional[bool] = None, use_cache: Optional[bool] = None,
+                           roi: Optional[bool] = None) -> str:
+    """
+    Extract text from either PDF or TIF files based on file extension.
+    Results are served from the persistent OCR cache when the file was processed before.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension not in ['.pdf', '.tif', '.tiff']:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+    
+    if grayscale is None:
+        grayscale = OCR_GRAYSCALE
+    if use_cache is None:
+        use_cache = OCR_CACHE_ENABLED
+    if roi is None:
+        roi = OCR_ROI
+    
+    cache_key = None
+    if use_cache:
+        cache_key = _ocr_cache_key(file_path, use_text_layer, grayscale, roi)
+        cached_text = get_ocr_cache().get(cache_key)
+        if cached_text is not None:
+            print(f"[INFO] OCR z cache: {os.path.basename(file_path)}")
+            return cached_text
+    
+    if file_extension == '.pdf':
+        text = extract_text_from_pdf(file_path, workers, use_text_layer, grayscale, roi)
+    else:
+        text = extract_text_from_tif(file_path, workers, roi)
+    
+    if cache_key is not None:
+        get_ocr_cache().set(cache_key, text)
+    
+    return text
\ No newline at end of file
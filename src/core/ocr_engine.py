@@ -0,0 +1,238 @@
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# (text, left, top, right, bottom) in image pixels
+WordBox = Tuple[str, int, int, int, int]
+
+# pytesseract and tesserocr are imported on first OCR, not at startup - tesserocr
+# loads libtesseract and the Windows install lookup touches the disk
+_pytesseract = None
+_tesserocr_available: Optional[bool] = None
+_import_lock = threading.Lock()
+
+
+def get_pytesseract():
+    """pytesseract, imported on first use with the Tesseract executable located on Windows"""
+    global _pytesseract
+    with _import_lock:
+        if _pytesseract is None:
+            import pytesseract
+            if sys.platform.startswith('win'):
+                _configure_windows_tesseract(pytesseract)
+            _pytesseract = pytesseract
+        return _pytesseract
+
+
+def _configure_windows_tesseract(pytesseract) -> None:
+    # Common Tesseract installation paths on Windows
+    possible_paths = [
+        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+        r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME', '')),
+    ]
+
+    for path in possible_paths:
+        if os.path.exists(path):
+            pytesseract.pytesseract.tesseract_cmd = path
+            print(f"[OK] Znaleziono Tesseract: {path}")
+            break
+    else:
+        print("[WARN] Tesseract nie został znaleziony w standardowych lokalizacjach")
+        print("[INFO] Zainstaluj Tesseract z: https://github.com/UB-Mannheim/tesseract/wiki")
+
+
+def tesserocr_available() -> bool:
+    """
+    tesserocr binds libtesseract directly, so a recognizer stays initialized
+    between pages. Without it we fall back to spawning the tesseract CLI per call.
+    """
+    global _tesserocr_available
+    with _import_lock:
+        if _tesserocr_available is None:
+            try:
+                import tesserocr  # noqa: F401
+                _tesserocr_available = True
+            except ImportError:
+                _tesserocr_available = False
+        return _tesserocr_available
+
+# Languages tried in order - Polish first, English as fallback
+OCR_LANGUAGES: Tuple[str, ...] = ('pol', 'eng')
+
+# auto | tesserocr | pytesseract
+OCR_ENGINE = os.getenv('OCR_ENGINE', 'auto').lower()
+
+
+class PytesseractEngine:
+    """
+    Per-call engine: every recognize() spawns the tesseract CLI,
+    writes a temporary image and loads the language data again.
+    """
+    name = "pytesseract"
+    
+    def __init__(self, languages: Tuple[str, ...] = OCR_LANGUAGES):
+        self.languages = languages
+        self.closed = False
+    
+    def recognize(self, image) -> str:
+        """Run OCR on a PIL image, trying languages in order"""
+        last_error: Optional[Exception] = None
+        for lang in self.languages:
+            try:
+                return get_pytesseract().image_to_string(image, lang=lang)
+            except Exception as e:
+                last_error = e
+        raise RuntimeError(f"OCR nie powiódł się: {last_error}")
+    
+    def recognize_words(self, image) -> List[WordBox]:
+        """Run OCR on a PIL image and return recognized words with bounding boxes"""
+        pytesseract = get_pytesseract()
+        last_error: Optional[Exception] = None
+        for lang in self.languages:
+            try:
+                data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+                break
+            except Exception as e:
+                last_error = e
+        else:
+            raise RuntimeError(f"OCR nie powiódł się: {last_error}")
+        
+        words: List[WordBox] = []
+        for text, left, top, width, height in zip(data['text'], data['left'], data['top'],
+                                                  data['width'], data['height']):
+            if text.strip():
+                words.append((text, left, top, left + width, top + height))
+        return words
+    
+    def close(self) -> None:
+        self.closed = True
+
+
+class TesserocrEngine:
+    """
+    Warm engine: keeps one initialized Tesseract API per language for the
+    lifetime of the process, so pages are streamed in without process
+    startup or traineddata loading.
+    
+    Tesseract APIs are not thread-safe - use one engine per thread
+    (see get_ocr_engine).
+    """
+    name = "tesserocr"
+    
+    def __init__(self, languages: Tuple[str, ...] = OCR_LANGUAGES, tessdata_path: Optional[str] = None):
+        if not tesserocr_available():
+            raise RuntimeError("tesserocr is not installed")
+        import tesserocr
+        
+        if tessdata_path is None:
+            tessdata_path = _find_tessdata_path()
+        
+        self.closed = False
+        self._apis: Dict[str, "tesserocr.PyTessBaseAPI"] = {}
+        for lang in languages:
+            try:
+                if tessdata_path:
+                    self._apis[lang] = tesserocr.PyTessBaseAPI(path=tessdata_path, lang=lang)
+                else:
+                    self._apis[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+            except RuntimeError as e:
+                print(f"[WARN] Nie udało się załadować języka OCR '{lang}': {e}")
+        
+        if not self._apis:
+            raise RuntimeError(f"Brak dostępnych języków OCR: {', '.join(languages)}")
+    
+    def recognize(self, image) -> str:
+        """Run OCR on a PIL image, trying languages in order"""
+        last_error: Optional[Exception] = None
+        for api in self._apis.values():
+            try:
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            except RuntimeError as e:
+                last_error = e
+        raise RuntimeError(f"OCR nie powiódł się: {last_error}")
+    
+    def recognize_words(self, image) -> List[WordBox]:
+        """Run OCR on a PIL image and return recognized words with bounding boxes"""
+        from tesserocr import RIL, iterate_level
+        last_error: Optional[Exception] = None
+        for api in self._apis.values():
+            try:
+                api.SetImage(image)
+                api.Recognize()
+                words: List[WordBox] = []
+                for result in iterate_level(api.GetIterator(), RIL.WORD):
+                    text = result.GetUTF8Text(RIL.WORD)
+                    if text and text.strip():
+                        left, top, right, bottom = result.BoundingBox(RIL.WORD)
+                        words.append((text, left, top, right, bottom))
+                return words
+            except RuntimeError as e:
+                last_error = e
+        raise RuntimeError(f"OCR nie powiódł się: {last_error}")
+    
+    def close(self) -> None:
+        for api in self._apis.values():
+            api.End()
+        self._apis.clear()
+        self.closed = True
+
+
+def _find_tessdata_path() -> Optional[str]:
+    """Locate tessdata next to the configured tesseract executable (Windows installs)"""
+    tesseract_cmd = get_pytesseract().pytesseract.tesseract_cmd
+    if os.path.isabs(tesseract_cmd):
+        tessdata = os.path.join(os.path.dirname(tesseract_cmd), 'tessdata')
+        if os.path.isdir(tessdata):
+            return tessdata
+    return None
+
+
+def ocr_engine_name() -> str:
+    """Name of the engine that get_ocr_engine() will use, without starting it"""
+    if OCR_ENGINE == 'pytesseract':
+        return PytesseractEngine.name
+    if OCR_ENGINE == 'tesserocr' or tesserocr_available():
+        return TesserocrEngine.name
+    return PytesseractEngine.name
+
+
+def create_ocr_engine():
+    """Create a new OCR engine according to OCR_ENGINE"""
+    if ocr_engine_name() == TesserocrEngine.name:
+        try:
+            return TesserocrEngine()
+        except RuntimeError as e:
+            if OCR_ENGINE == 'tesserocr':
+                raise
+            print(f"[WARN] {e} - używam pytesseract")
+    return PytesseractEngine()
+
+
+_thread_local = threading.local()
+_engines: List = []
+_engines_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Return the warm OCR engine of the current thread, creating it on first use"""
+    engine = getattr(_thread_local, 'engine', None)
+    if engine is None or engine.closed:
+        engine = create_ocr_engine()
+        _thread_local.engine = engine
+        with _engines_lock:
+            _engines.append(engine)
+    return engine
+
+
+def close_ocr_engines() -> None:
+    """Release every engine created in this process"""
+    with _engines_lock:
+        for engine in _engines:
+            try:
+                engine.close()
+            except Exception as e:
+                print(f"[WARN] Błąd przy zamykaniu silnika OCR: {e}")
+        _engines.clear()
@@ -0,0 +1,428 @@
+import os
+import queue
+import threading
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.core.ai_processor import (AI_BATCH_DEADLINE, AI_BATCH_MAX_ITEMS, AI_BATCH_TOKEN_BUDGET, AI_CONCURRENCY,
+                                   build_company_data, build_company_data_batch, build_company_data_from_images,
+                                   extraction_stats)
+from src.core.ocr import extract_text_from_file, render_pages_for_model
+from src.core.rate_limiter import estimate_tokens
+from src.core.resilience import Deadline
+from src.core.duplicate_index import (DUPLICATE_CHECK_ENABLED, NEAR_DUPLICATE_CHECK, DuplicateIndex,
+                                      document_distance, filename_key, get_duplicate_index,
+                                      similar_scan_reason)
+from src.core.rate_table import prefetch_record_rates
+from src.core.sinks import DeduplicatingSink, create_sink
+from src.models.CompanyData import CompanyDataModel
+
+# Documents waiting between stages - keeps OCR from running far ahead of
+# the AI stage and bounds how much text sits in memory
+DEFAULT_QUEUE_SIZE = 8
+# AI calls are network-bound, a few of them overlap well with OCR.
+# They share the rate limiter in ai_processor, so the quota holds.
+DEFAULT_AI_WORKERS = AI_CONCURRENCY
+# Records are written to the exporter in chunks of this size
+DEFAULT_FLUSH_EVERY = 20
+
+# How amounts are read: 'ocr' (Tesseract text -> model), 'image' (page images
+# straight to a multimodal model) or 'auto' (images for scanned TIFs, OCR for PDFs)
+EXTRACTION_MODES = ('ocr', 'image', 'auto')
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'ocr')
+
+_DONE = None
+# How often blocked workers check whether the consumer has stopped
+_POLL_SECONDS = 0.2
+
+
+def clean_ocr_text(text: str) -> str:
+    """Drop empty lines from OCR output"""
+    return '\n'.join([line for line in text.split('\n') if line.strip() != ''])
+
+
+@dataclass
+class PipelineResult:
+    """Summary of a pipeline run"""
+    processed: int = 0
+    exported: int = 0
+    export_ok: bool = True
+    failed_files: List[Tuple[str, str]] = field(default_factory=list)  # (file_path, reason)
+    extraction_sources: Dict[str, int] = field(default_factory=dict)  # template / local / cache / ai / failed
+    model_tiers: Dict[str, Dict[str, float]] = field(default_factory=dict)  # hit rate / latency per model tier
+    duplicate_files: List[Tuple[str, str]] = field(default_factory=list)  # (file_path, reason), skipped before OCR
+
+
+def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put into a bounded queue, giving up once the run is stopped - nobody drains it then"""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event):
+    """Next queue item, or _DONE once the run is stopped"""
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _drain(target: queue.Queue) -> None:
+    while True:
+        try:
+            target.get_nowait()
+        except queue.Empty:
+            return
+
+
+class _StageGroup:
+    """Worker threads of one stage; the last worker to finish closes the output queue"""
+
+    def __init__(self, workers: int, output: queue.Queue, downstream_workers: int, stop: threading.Event):
+        self.remaining = workers
+        self.output = output
+        self.downstream_workers = downstream_workers
+        self.stop = stop
+        self.lock = threading.Lock()
+
+    def worker_done(self) -> None:
+        with self.lock:
+            self.remaining -= 1
+            last = self.remaining == 0
+        if last:
+            for _ in range(self.downstream_workers):
+                _put(self.output, _DONE, self.stop)
+
+
+def _uses_images(file_path: str, extraction_mode: str) -> bool:
+    if extraction_mode == 'auto':
+        return os.path.splitext(file_path)[1].lower() in ('.tif', '.tiff')
+    return extraction_mode == 'image'
+
+
+def _extract_records(items: List[tuple], deadline: Optional[Deadline],
+                     batch_token_budget: int) -> List[tuple]:
+    """
+    AI stage work on (index, file_path, payload, error) items from the text queue.
+    Texts of several documents share batched requests when a token budget is set.
+
+    Returns:
+        (index, file_path, record or None, error or None) per item
+    """
+    records: Dict[int, CompanyDataModel] = {}
+    errors: Dict[int, str] = {}
+    texts = [(index, file_path, payload) for index, file_path, payload, error in items
+             if error is None and isinstance(payload, str)]
+    if batch_token_budget > 0 and len(texts) > 1:
+        try:
+            batch = build_company_data_batch([(file_path, payload) for _, file_path, payload in texts],
+                                             batch_token_budget, deadline=deadline)
+            records.update((index, record) for (index, _, _), record in zip(texts, batch))
+        except Exception as e:
+            errors.update((index, str(e)) for index, _, _ in texts)
+
+    results = []
+    for index, file_path, payload, error in items:
+        record = records.get(index)
+        error = error or errors.get(index)
+        if error is None and record is None:
+            try:
+                if isinstance(payload, list):
+                    record = build_company_data_from_images(file_path, payload, deadline=deadline)
+                else:
+                    record = build_company_data(file_path, payload, deadline=deadline)
+            except Exception as e:
+                error = str(e)
+        if error is None:
+            error = record.extraction_error or None
+        results.append((index, file_path, None if error is not None else record, error))
+    return results
+
+
+def iter_records(file_paths: List[str], ocr_workers: int = 1, ai_workers: int = DEFAULT_AI_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 failed_files: Optional[List[Tuple[str, str]]] = None,
+                 deadline: Optional[Deadline] = None,
+                 extraction_mode: Optional[str] = None,
+                 batch_token_budget: Optional[int] = None) -> Iterator[CompanyDataModel]:
+    """
+    Stream documents through OCR and AI extraction, yielding records in input order.
+
+    Each document moves to AI extraction as soon as its OCR finishes, so network-bound
+    AI calls overlap with CPU-bound OCR. Stages are connected by bounded queues, and
+    at most queue_size documents are between the start of OCR and being yielded -
+    results waiting for a slow earlier document count too, so a stalled consumer
+    stops OCR instead of piling records up. When the consumer stops early (an
+    exception or close()), the workers exit after their current document.
+
+    With a batch token budget, an AI worker takes every text already waiting in
+    the queue (up to the budget) and extracts them with batched requests. It
+    never waits for more - batches only form when AI extraction is the bottleneck.
+
+    Args:
+        file_paths: Invoice files to process
+        ocr_workers: Documents OCR'd concurrently (pages are parallelized separately in ocr.py)
+        ai_workers: Concurrent AI extraction calls
+        queue_size: Capacity of the queues between stages and limit of documents in flight
+        failed_files: Optional list that receives (file_path, reason) for skipped documents,
+                      including documents whose AI extraction failed - they can be re-queued
+        deadline: Deadline of the whole batch for AI calls
+        extraction_mode: 'ocr', 'image' or 'auto' (None = EXTRACTION_MODE)
+        batch_token_budget: Input tokens per batched AI request (None = AI_BATCH_TOKEN_BUDGET, 0 = off)
+    """
+    if extraction_mode is None:
+        extraction_mode = EXTRACTION_MODE
+    if extraction_mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {extraction_mode}")
+    if batch_token_budget is None:
+        batch_token_budget = AI_BATCH_TOKEN_BUDGET
+    
+    path_queue: queue.Queue = queue.Queue()
+    text_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    record_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    # One permit per document from OCR start until it is yielded or reported as failed
+    in_flight = threading.Semaphore(max(queue_size, 1))
+    stop = threading.Event()
+
+    for index, file_path in enumerate(file_paths):
+        path_queue.put((index, file_path))
+    for _ in range(ocr_workers):
+        path_queue.put(_DONE)
+
+    ocr_group = _StageGroup(ocr_workers, text_queue, ai_workers, stop)
+    ai_group = _StageGroup(ai_workers, record_queue, 1, stop)
+
+    def ocr_stage():
+        try:
+            while True:
+                # Taken before the path, so permits are held by the earliest unfinished documents
+                while not in_flight.acquire(timeout=_POLL_SECONDS):
+                    if stop.is_set():
+                        return
+                item = path_queue.get()
+                if item is _DONE or stop.is_set():
+                    in_flight.release()
+                    break
+                index, file_path = item
+                try:
+                    if _uses_images(file_path, extraction_mode):
+                        # Image mode skips Tesseract - the stage only renders and downscales pages
+                        payload = render_pages_for_model(file_path)
+                    else:
+                        payload = clean_ocr_text(extract_text_from_file(file_path))
+                    item = (index, file_path, payload, None)
+                except Exception as e:
+                    print(f"Error processing {file_path}: {e}")
+                    item = (index, file_path, None, str(e))
+                if not _put(text_queue, item, stop):
+                    break
+        finally:
+            ocr_group.worker_done()
+
+    def ai_stage():
+        try:
+            done = False
+            while not done:
+                item = _get(text_queue, stop)
+                if item is _DONE:
+                    break
+                items = [item]
+                if batch_token_budget > 0 and isinstance(item[2], str):
+                    # Texts already waiting join the batch; _DONE ends this worker after it
+                    tokens = estimate_tokens(item[2])
+                    while tokens < batch_token_budget and len(items) < AI_BATCH_MAX_ITEMS:
+                        try:
+                            extra = text_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if extra is _DONE:
+                            done = True
+                            break
+                        items.append(extra)
+                        if isinstance(extra[2], str):
+                            tokens += estimate_tokens(extra[2])
+                for result in _extract_records(items, deadline, batch_token_budget):
+                    if not _put(record_queue, result, stop):
+                        return
+        finally:
+            ai_group.worker_done()
+
+    for _ in range(ocr_workers):
+        threading.Thread(target=ocr_stage, daemon=True).start()
+    for _ in range(ai_workers):
+        threading.Thread(target=ai_stage, daemon=True).start()
+
+    # Re-establish input order - results only wait here for slower earlier documents
+    pending = {}
+    next_index = 0
+    try:
+        while True:
+            item = record_queue.get()
+            if item is _DONE:
+                break
+            index, file_path, record, error = item
+            pending[index] = (file_path, record, error)
+
+            while next_index in pending:
+                file_path, record, error = pending.pop(next_index)
+                next_index += 1
+                in_flight.release()
+                if record is not None:
+                    yield record
+                elif failed_files is not None:
+                    failed_files.append((file_path, error))
+
+        # Documents that never came out of a stage are reported, later ones still yielded
+        for index in range(next_index, len(file_paths)):
+            if index not in pending:
+                if failed_files is not None:
+                    failed_files.append((file_paths[index], "przetwarzanie przerwane"))
+                continue
+            file_path, record, error = pending.pop(index)
+            if record is not None:
+                yield record
+            elif failed_files is not None:
+                failed_files.append((file_path, error))
+    finally:
+        # Unblock and stop the workers when the consumer gives up early
+        stop.set()
+        _drain(text_queue)
+        _drain(record_queue)
+
+
+def skip_duplicates(file_paths: List[str], index: DuplicateIndex) -> Tuple[List[str], List[Tuple[str, str]], Dict[str, str]]:
+    """
+    Drop already exported invoices and repeats within the batch before any OCR or AI work.
+    Rescans are matched by perceptual page hashes when NEAR_DUPLICATE_CHECK is on,
+    unless the file names show two different invoices.
+
+    Returns:
+        (files to process, (file_path, reason) of skipped duplicates, content hash per file)
+    """
+    to_process: List[str] = []
+    duplicates: List[Tuple[str, str]] = []
+    file_hashes: Dict[str, str] = {}
+    seen_keys = set()
+    seen_hashes = set()
+    seen_pages: List[Tuple[str, List[int]]] = []
+
+    for file_path in file_paths:
+        reason, file_hash = index.check_file(file_path)
+        key = filename_key(file_path)
+        if reason is None and ((key is not None and key in seen_keys) or (file_hash and file_hash in seen_hashes)):
+            reason = "powtórzona w tej partii"
+        hashes: List[int] = []
+        if reason is None and file_hash and NEAR_DUPLICATE_CHECK:
+            hashes = index.page_hashes_of(file_path, file_hash)
+            for seen_path, seen_page_hashes in seen_pages:
+                distance = document_distance(hashes, seen_page_hashes)
+                if distance is not None and distance <= index.near_threshold:
+                    reason = similar_scan_reason(file_path, os.path.basename(seen_path), distance, " w tej partii")
+                    if reason is not None:
+                        break
+        if reason is not None:
+            duplicates.append((file_path, reason))
+            continue
+        if key is not None:
+            seen_keys.add(key)
+        if file_hash:
+            seen_hashes.add(file_hash)
+            file_hashes[file_path] = file_hash
+        if hashes:
+            seen_pages.append((file_path, hashes))
+        to_process.append(file_path)
+
+    return to_process, duplicates, file_hashes
+
+
+def run_pipeline(file_paths: List[str], eur_to_pln_rate: float, ocr_workers: int = 1,
+                 ai_workers: int = DEFAULT_AI_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 flush_every: int = DEFAULT_FLUSH_EVERY,
+                 exporter: Optional[Callable[[List[CompanyDataModel], float], bool]] = None,
+                 on_record: Optional[Callable[[CompanyDataModel], None]] = None,
+                 deadline_seconds: Optional[float] = None,
+                 extraction_mode: Optional[str] = None,
+                 skip_known: Optional[bool] = None,
+                 batch_token_budget: Optional[int] = None) -> PipelineResult:
+    """
+    Process invoice files end to end: OCR -> AI extraction -> export.
+
+    Completed records are flushed to the exporter every flush_every records
+    instead of waiting for the whole batch.
+
+    Args:
+        file_paths: Invoice files to process
+        eur_to_pln_rate: Rate passed to the exporter
+        ocr_workers: Documents OCR'd concurrently
+        ai_workers: Concurrent AI extraction calls
+        queue_size: Capacity of the queues between stages
+        flush_every: Number of records per exporter call
+        exporter: Export function or sink (None = the LEDGER_SINK sink, the Excel workbook by default)
+        on_record: Optional callback for every completed record (e.g. progress display)
+        deadline_seconds: Time limit for the AI calls of the whole run (None = AI_BATCH_DEADLINE, 0 = none)
+        extraction_mode: 'ocr', 'image' or 'auto' (None = EXTRACTION_MODE)
+        skip_known: Skip invoices already in the duplicate index and refuse duplicate
+                    rows in the exporter (None = DUPLICATE_CHECK_ENABLED)
+        batch_token_budget: Input tokens per batched AI request (None = AI_BATCH_TOKEN_BUDGET, 0 = off)
+
+    Returns:
+        PipelineResult with counts and documents that could not be processed
+    """
+    if exporter is None:
+        exporter = create_sink()
+    if skip_known is None:
+        skip_known = DUPLICATE_CHECK_ENABLED
+    result = PipelineResult()
+
+    if skip_known:
+        index = get_duplicate_index()
+        file_paths, result.duplicate_files, file_hashes = skip_duplicates(file_paths, index)
+        for file_path, reason in result.duplicate_files:
+            print(f"[INFO] Pominięto duplikat {os.path.basename(file_path)}: {reason}")
+        exporter = DeduplicatingSink(exporter, index, file_hashes)
+
+    batch: List[CompanyDataModel] = []
+    extraction_stats.reset()
+    deadline = Deadline(AI_BATCH_DEADLINE if deadline_seconds is None else deadline_seconds)
+
+    def flush():
+        if not batch:
+            return
+        if exporter(list(batch), eur_to_pln_rate):
+            # Duplicates refused by a DeduplicatingSink were not written
+            result.exported += len(batch) - getattr(exporter, 'last_refused', 0)
+        else:
+            result.export_ok = False
+        batch.clear()
+
+    # Closed explicitly, so the workers stop right away when the exporter raises
+    with closing(iter_records(file_paths, ocr_workers, ai_workers, queue_size, result.failed_files,
+                              deadline, extraction_mode, batch_token_budget)) as records:
+        for record in records:
+            result.processed += 1
+            batch.append(record)
+            # The NBP table for the invoice date loads while later documents are read
+            prefetch_record_rates([record])
+            if on_record is not None:
+                on_record(record)
+            if len(batch) >= flush_every:
+                flush()
+
+    flush()
+
+    for file_path, reason in result.failed_files:
+        print(f"[WARN] Pominięto {os.path.basename(file_path)}: {reason}")
+
+    result.extraction_sources = extraction_stats.snapshot()
+    result.model_tiers = extraction_stats.tier_snapshot()
+    print(f"[INFO] {extraction_stats.summary()}")
+
+    return result
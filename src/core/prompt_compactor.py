@@ -0,0 +1,119 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from src.core.local_extractor import (CURRENCY_TOKENS, DATE_PATTERN, GROSS_LABELS, ISSUE_DATE_LABELS, NET_LABELS,
+                                     SUMMARY_LABELS, VAT_LABELS, find_amounts)
+from src.core.rate_limiter import estimate_tokens
+
+# Invoice text sent to the model is cut down to this many tokens (0 = send full text)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1500'))
+# Lines kept above and below every relevant line
+CONTEXT_LINES = 1
+
+GAP_MARKER = "[...]"
+PAGE_MARKER_PREFIX = "=== Strona"
+
+
+@dataclass
+class CompactionResult:
+    """Compacted invoice text with token counts for instrumentation"""
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+
+
+def _line_score(line: str) -> int:
+    """How useful a line is for finding the totals and the issue date - 0 means irrelevant"""
+    lowered = line.lower()
+    has_amount = bool(find_amounts(line))
+    # The issue date picks the exchange rate, so it must survive compaction
+    has_date = bool(DATE_PATTERN.search(line))
+    score = 0
+    if any(label in lowered for label in SUMMARY_LABELS + GROSS_LABELS + ISSUE_DATE_LABELS):
+        score += 3
+    if any(label in lowered for label in NET_LABELS + VAT_LABELS):
+        score += 2
+    if any(pattern.search(line) for pattern in CURRENCY_TOKENS.values()):
+        score += 1
+    if has_amount or has_date:
+        score += 1
+    # Labels without amounts nearby are still worth a little (amount may be on the next line)
+    return score if has_amount or has_date or score >= 2 else 0
+
+
+def compact_invoice_text(invoice_text: str, token_budget: Optional[int] = None,
+                         context_lines: int = CONTEXT_LINES) -> CompactionResult:
+    """
+    Keep only the text windows relevant for the totals within a token budget.
+
+    Lines with amounts, currency markers and summary keywords are kept together
+    with a few lines of context. When they don't all fit, the highest scoring
+    windows win, and later ones win ties (final totals are printed last).
+    Dropped parts are replaced with a gap marker.
+
+    Args:
+        invoice_text: Full OCR text
+        token_budget: Maximum tokens of the result (None = PROMPT_TOKEN_BUDGET, 0 = no compaction)
+        context_lines: Lines kept around each relevant line
+    """
+    if token_budget is None:
+        token_budget = PROMPT_TOKEN_BUDGET
+
+    original_tokens = estimate_tokens(invoice_text)
+    if token_budget <= 0 or original_tokens <= token_budget:
+        return CompactionResult(invoice_text, original_tokens, original_tokens)
+
+    lines = invoice_text.split('\n')
+    scored: List[Tuple[int, int]] = [(_line_score(line), index) for index, line in enumerate(lines)]
+    relevant = [(score, index) for score, index in scored if score > 0]
+
+    if not relevant:
+        # Nothing recognizable - the end of the document is the best guess for totals
+        return _keep_tail(lines, token_budget, original_tokens)
+
+    keep = set()
+    used_tokens = 0
+    # Highest score first, later lines first among equals
+    for score, index in sorted(relevant, key=lambda item: (item[0], item[1]), reverse=True):
+        window = [i for i in range(max(0, index - context_lines), min(len(lines), index + context_lines + 1))
+                  if i not in keep]
+        window_tokens = sum(estimate_tokens(lines[i]) for i in window)
+        if used_tokens + window_tokens > token_budget:
+            continue
+        keep.update(window)
+        used_tokens += window_tokens
+
+    # Page markers of kept lines help the model tell the last page apart
+    current_marker = None
+    markers = set()
+    for index, line in enumerate(lines):
+        if line.startswith(PAGE_MARKER_PREFIX):
+            current_marker = index
+        elif index in keep and current_marker is not None:
+            markers.add(current_marker)
+    keep.update(markers)
+
+    result_lines = []
+    previous = -1
+    for index in sorted(keep):
+        if index > previous + 1:
+            result_lines.append(GAP_MARKER)
+        result_lines.append(lines[index])
+        previous = index
+
+    text = '\n'.join(result_lines)
+    return CompactionResult(text, original_tokens, estimate_tokens(text))
+
+
+def _keep_tail(lines: List[str], token_budget: int, original_tokens: int) -> CompactionResult:
+    kept: List[str] = []
+    used_tokens = 0
+    for line in reversed(lines):
+        line_tokens = estimate_tokens(line)
+        if used_tokens + line_tokens > token_budget:
+            break
+        kept.append(line)
+        used_tokens += line_tokens
+    text = '\n'.join([GAP_MARKER] + list(reversed(kept)))
+    return CompactionResult(text, original_tokens, estimate_tokens(text))
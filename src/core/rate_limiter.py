@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    
+    Holds up to `capacity` tokens and refills continuously at `refill_per_second`.
+    acquire() blocks until enough tokens are available.
+    """
+    
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+    
+    def acquire(self, amount: float = 1.0) -> None:
+        """Block until `amount` tokens are available and take them"""
+        # A single request larger than the bucket could never be served otherwise
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.refill_per_second
+            time.sleep(wait)
+    
+    def consume(self, amount: float) -> None:
+        """Take tokens without waiting - used to correct an estimate after the fact (may go negative)"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter for API quotas.
+    A limit of 0 or None disables that bucket.
+    """
+    
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+    
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        """Block until one request with `estimated_tokens` fits into the quota"""
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None and estimated_tokens > 0:
+            self.tokens.acquire(estimated_tokens)
+    
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket once the real usage of a request is known"""
+        if self.tokens is not None and actual_tokens:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for quota planning (~4 characters per token)"""
+    return len(text) // 4 + 1
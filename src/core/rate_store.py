@@ -0,0 +1,173 @@
+import datetime
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from src.core.app_paths import get_app_data_dir
+from src.core.get_eur_to_pln_rate import DEFAULT_EUR_TO_PLN_RATE, fetch_eur_to_pln_quote
+
+# NBP publishes table A on working days between 11:45 and 12:15 Warsaw time.
+# 11:15 UTC is after publication both in winter (12:15 CET) and summer (13:15 CEST).
+NBP_PUBLICATION_UTC = datetime.time(11, 15)
+# A failed refresh is retried after this long, not at the next publication
+RETRY_AFTER_FAILURE = datetime.timedelta(minutes=15)
+# The only rate kept here - other currencies come from the NBP table (rate_table)
+STORED_CURRENCY = 'EUR'
+
+
+@dataclass
+class StoredRate:
+    """Exchange rate kept on disk, with where and when it came from"""
+    rate: float
+    source: str                       # nbp / exchangerate-api / fixer / default
+    effective_date: Optional[str]     # Date the rate is published for, if the source says
+    fetched_at: str                   # UTC, ISO format
+    expires_at: str                   # UTC, ISO format - next NBP publication
+
+    def is_fresh(self, now: Optional[datetime.datetime] = None) -> bool:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return now < datetime.datetime.fromisoformat(self.expires_at)
+
+
+def next_publication(now: datetime.datetime) -> datetime.datetime:
+    """First NBP table A publication after now (weekends skipped; holidays just cause an extra refresh)"""
+    candidate = datetime.datetime.combine(now.date(), NBP_PUBLICATION_UTC, tzinfo=datetime.timezone.utc)
+    if candidate <= now:
+        candidate += datetime.timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += datetime.timedelta(days=1)
+    return candidate
+
+
+class RateStore:
+    """
+    The current EUR/PLN rate persisted in a JSON file.
+
+    The stored rate is served straight from disk until the next NBP publication;
+    after that it is still served, and a refresh runs in the background.
+    Only the very first fetch waits for the network.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 fetcher: Callable[[], Optional[Tuple[float, str, Optional[str]]]] = fetch_eur_to_pln_quote):
+        self.path = path or os.path.join(get_app_data_dir(), "exchange_rates.json")
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._refreshing: Optional[threading.Thread] = None
+        self._rates: Dict[str, StoredRate] = self._load()
+
+    def _load(self) -> Dict[str, StoredRate]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return {currency: StoredRate(**entry) for currency, entry in json.load(file).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[WARN] Nie udało się wczytać zapisanych kursów walut: {e}")
+            return {}
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({currency: asdict(rate) for currency, rate in self._rates.items()}, file, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Nie udało się zapisać kursów walut: {e}")
+
+    def peek(self) -> Optional[StoredRate]:
+        """Stored rate without any network access, fresh or not"""
+        with self._lock:
+            return self._rates.get(STORED_CURRENCY)
+
+    def refresh(self) -> Optional[StoredRate]:
+        """Fetch the rate now and store it. Returns None if every source failed."""
+        quote = self.fetcher()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            if quote is None:
+                stored = self._rates.get(STORED_CURRENCY)
+                if stored is not None:
+                    # Keep serving the old rate, but don't hammer the sources
+                    stored.expires_at = (now + RETRY_AFTER_FAILURE).isoformat()
+                    self._save()
+                return None
+            rate, source, effective_date = quote
+            stored = StoredRate(
+                rate=rate,
+                source=source,
+                effective_date=effective_date,
+                fetched_at=now.isoformat(timespec='seconds'),
+                expires_at=next_publication(now).isoformat(),
+            )
+            self._rates[STORED_CURRENCY] = stored
+            self._save()
+            return stored
+
+    def refresh_in_background(self, on_done: Optional[Callable[[Optional[StoredRate]], None]] = None) -> None:
+        """Start a refresh unless one is already running"""
+        def run():
+            try:
+                stored = self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = None
+            if on_done is not None:
+                on_done(stored)
+
+        with self._lock:
+            if self._refreshing is not None:
+                return
+            thread = threading.Thread(target=run, daemon=True)
+            self._refreshing = thread
+        thread.start()
+
+    def get(self, wait_if_missing: bool = True) -> Optional[StoredRate]:
+        """
+        Rate for a batch - never waits on the network for a rate already stored.
+
+        Args:
+            wait_if_missing: Fetch synchronously when nothing is stored yet
+
+        Returns:
+            Stored rate (refreshed in the background when expired), None if unavailable
+        """
+        stored = self.peek()
+        if stored is not None:
+            if not stored.is_fresh():
+                self.refresh_in_background()
+            return stored
+        if wait_if_missing:
+            return self.refresh()
+        self.refresh_in_background()
+        return None
+
+
+_rate_store: Optional[RateStore] = None
+_rate_store_lock = threading.Lock()
+
+
+def get_rate_store() -> RateStore:
+    """Return the shared rate store"""
+    global _rate_store
+    with _rate_store_lock:
+        if _rate_store is None:
+            _rate_store = RateStore()
+        return _rate_store
+
+
+def get_eur_to_pln_rate_cached() -> Tuple[float, str]:
+    """
+    EUR/PLN rate for processing: the stored rate instantly, the network only on
+    the very first run, the default rate if even that fails.
+
+    Returns:
+        (rate, source)
+    """
+    stored = get_rate_store().get()
+    if stored is None:
+        print(f"[WARN] Używam domyślnego kursu EUR/PLN: {DEFAULT_EUR_TO_PLN_RATE}")
+        return DEFAULT_EUR_TO_PLN_RATE, 'default'
+    return stored.rate, stored.source
@@ -0,0 +1,374 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from src.core.app_paths import get_app_data_dir
+from src.core.get_eur_to_pln_rate import RATE_REQUEST_TIMEOUT, get_http_session
+from src.models.CompanyData import CompanyDataModel
+
+# Convert every foreign-currency invoice with the NBP rate for its own date
+# instead of a single current EUR rate
+PER_INVOICE_RATES = os.getenv('PER_INVOICE_RATES', '1') not in ('0', 'false', 'False')
+
+# All table A rates published between two dates (inclusive), in one response
+NBP_TABLES_URL = "https://api.nbp.pl/api/exchangerates/tables/A/{start}/{end}/?format=json"
+# Longest range NBP serves in one query
+NBP_MAX_RANGE_DAYS = 93
+# Tables fetched before the earliest invoice date - covers weekends and holiday gaps
+RATE_LOOKBACK_DAYS = 10
+# Days whose request failed are not asked for again for this many seconds,
+# so an offline run doesn't wait for the timeout on every export
+RATE_TABLE_RETRY_AFTER = float(os.getenv('RATE_TABLE_RETRY_AFTER', '300'))
+# Longest time an export waits for a prefetch that is still running
+RATE_TABLE_WAIT = float(os.getenv('RATE_TABLE_WAIT', str(RATE_REQUEST_TIMEOUT)))
+
+# (rate in PLN per unit, date of the NBP table or None for a non-table rate)
+ConversionRate = Tuple[float, Optional[str]]
+
+
+def fetch_nbp_tables(start: datetime.date, end: datetime.date, url: str = NBP_TABLES_URL,
+                     timeout: float = RATE_REQUEST_TIMEOUT) -> Dict[str, Dict[str, float]]:
+    """
+    NBP table A for a date range in a single request.
+
+    Returns:
+        {table date: {currency code: mid rate}} - empty when no table was published in the range
+    """
+    response = get_http_session().get(url.format(start=start.isoformat(), end=end.isoformat()), timeout=timeout)
+    if response.status_code == 404:
+        # NBP answers 404 for a range without any table (weekend, holidays)
+        return {}
+    response.raise_for_status()
+    return {
+        table['effectiveDate']: {rate['code']: float(rate['mid']) for rate in table['rates']}
+        for table in response.json()
+    }
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime.date]:
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def _date_range(start: datetime.date, end: datetime.date) -> List[datetime.date]:
+    return [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _spans(days: Sequence[datetime.date]) -> List[Tuple[datetime.date, datetime.date]]:
+    """Sorted days grouped into contiguous (first, last) spans"""
+    spans = []
+    for day in days:
+        if spans and day == spans[-1][1] + datetime.timedelta(days=1):
+            spans[-1] = (spans[-1][0], day)
+        else:
+            spans.append((day, day))
+    return spans
+
+
+class RateTable:
+    """
+    NBP table A rates of all currencies, kept on disk by date.
+
+    Missing dates are fetched a whole range per request (at most NBP_MAX_RANGE_DAYS
+    each), usually in the background while the invoices are still being read;
+    days whose request failed are retried only after RATE_TABLE_RETRY_AFTER. Lookups follow the accounting rule - the rate of the last table published
+    before the invoice date - and are a dictionary read: every covered day is mapped
+    to its table when the table data changes, not searched for on each lookup.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 fetcher: Callable[[datetime.date, datetime.date], Dict[str, Dict[str, float]]] = fetch_nbp_tables):
+        self.path = path or os.path.join(get_app_data_dir(), "nbp_table_a.json")
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, float]] = {}  # table date -> currency -> mid rate
+        self._covered: Set[datetime.date] = set()       # days already asked for, table or not
+        self._index: Dict[str, str] = {}                # day -> date of the table that applies
+        self._retry_at: Dict[datetime.date, float] = {}  # day -> monotonic time its request may be retried
+        self._queued: Set[datetime.date] = set()        # invoice dates waiting for the background prefetch
+        self._prefetcher: Optional[threading.Thread] = None
+        self._prefetch_idle = threading.Event()
+        self._prefetch_idle.set()
+        self._load()
+        self._rebuild_index()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self._tables = data['tables']
+            for first, last in data['covered']:
+                self._covered.update(_date_range(datetime.date.fromisoformat(first),
+                                                 datetime.date.fromisoformat(last)))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Nie udało się wczytać tabeli kursów NBP: {e}")
+            self._tables, self._covered = {}, set()
+
+    def _save(self) -> None:
+        data = {
+            'tables': self._tables,
+            'covered': [[first.isoformat(), last.isoformat()] for first, last in _spans(sorted(self._covered))],
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Nie udało się zapisać tabeli kursów NBP: {e}")
+
+    def _rebuild_index(self) -> None:
+        """Map each day to the last table published before it, where the days in between are known"""
+        index = {}
+        if self._covered:
+            last_table = None
+            for day in _date_range(min(self._covered), max(self._covered) + datetime.timedelta(days=1)):
+                key = day.isoformat()
+                if last_table is not None:
+                    index[key] = last_table
+                if day not in self._covered:
+                    last_table = None
+                elif key in self._tables:
+                    last_table = key
+        self._index = index
+
+    def _needed_days(self, invoice_dates) -> List[datetime.date]:
+        """Days whose tables decide the rates of the invoice dates"""
+        # The rate of an invoice comes from the table before its date; today's table
+        # may not be published yet, so it is never marked as known
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        needed = set()
+        for invoice_date in invoice_dates:
+            end = min(invoice_date - datetime.timedelta(days=1), yesterday)
+            start = invoice_date - datetime.timedelta(days=RATE_LOOKBACK_DAYS)
+            if start <= end:
+                needed.update(_date_range(start, end))
+        return sorted(needed)
+
+    def prefetch(self, date_from: datetime.date, date_to: datetime.date) -> int:
+        """
+        Make sure rates for invoices dated date_from..date_to can be looked up.
+
+        Returns:
+            Number of requests made
+        """
+        return self.prefetch_dates(_date_range(date_from, date_to))
+
+    def _missing_days(self, invoice_dates) -> List[datetime.date]:
+        """Needed days not fetched yet and not backing off after a failure (call with the lock held)"""
+        now = time.monotonic()
+        return [day for day in self._needed_days(invoice_dates)
+                if day not in self._covered and self._retry_at.get(day, 0) <= now]
+
+    def prefetch_dates(self, invoice_dates) -> int:
+        """
+        Make sure rates for invoices of the given dates can be looked up.
+
+        Only days not fetched before are requested - one request per missing range.
+        When a request fails, the days still missing are not requested again
+        for RATE_TABLE_RETRY_AFTER seconds.
+
+        Returns:
+            Number of requests made
+        """
+        invoice_dates = set(invoice_dates)
+        with self._lock:
+            missing = self._missing_days(invoice_dates)
+        requests_made = 0
+        try:
+            for first, last in _spans(missing):
+                while first <= last:
+                    chunk_end = min(last, first + datetime.timedelta(days=NBP_MAX_RANGE_DAYS - 1))
+                    tables = self.fetcher(first, chunk_end)
+                    requests_made += 1
+                    with self._lock:
+                        self._tables.update(tables)
+                        self._covered.update(_date_range(first, chunk_end))
+                    first = chunk_end + datetime.timedelta(days=1)
+        except Exception:
+            with self._lock:
+                retry_at = time.monotonic() + RATE_TABLE_RETRY_AFTER
+                for day in missing:
+                    if day not in self._covered:
+                        self._retry_at[day] = retry_at
+            raise
+        finally:
+            # Ranges fetched before a failure are kept
+            if requests_made:
+                with self._lock:
+                    self._rebuild_index()
+                    self._save()
+        return requests_made
+
+    def prefetch_in_background(self, invoice_dates) -> None:
+        """Fetch the tables for the invoice dates on a background thread, returns at once"""
+        def run():
+            while True:
+                with self._lock:
+                    dates, self._queued = self._queued, set()
+                    if not dates:
+                        self._prefetcher = None
+                        self._prefetch_idle.set()
+                        return
+                try:
+                    self.prefetch_dates(dates)
+                except Exception as e:
+                    print(f"[WARN] Nie udało się pobrać tabeli kursów NBP: {e}")
+
+        with self._lock:
+            invoice_dates = set(invoice_dates)
+            if not self._missing_days(invoice_dates):
+                return
+            self._queued.update(invoice_dates)
+            if self._prefetcher is not None:
+                return
+            self._prefetch_idle.clear()
+            self._prefetcher = threading.Thread(target=run, daemon=True)
+            thread = self._prefetcher
+        thread.start()
+
+    def wait_for_prefetch(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the background prefetch, returns False if it is still running"""
+        return self._prefetch_idle.wait(timeout)
+
+    def lookup(self, currency: str, day: datetime.date) -> Optional[ConversionRate]:
+        """Rate of the last table published before day, None if it is not in the table"""
+        with self._lock:
+            table_date = self._index.get(day.isoformat())
+            if table_date is None:
+                return None
+            rate = self._tables[table_date].get(currency.upper())
+        return (rate, table_date) if rate is not None else None
+
+
+_rate_table: Optional[RateTable] = None
+_rate_table_lock = threading.Lock()
+
+
+def get_rate_table() -> RateTable:
+    """Return the shared rate table"""
+    global _rate_table
+    with _rate_table_lock:
+        if _rate_table is None:
+            _rate_table = RateTable()
+        return _rate_table
+
+
+def _rate_day(record: CompanyDataModel, today: datetime.date) -> datetime.date:
+    """Invoice date that decides the rate - today when unknown, and a date from
+    the future is an extraction error, so today's rate is used instead"""
+    return min(_parse_date(record.invoice_date) or today, today)
+
+
+def _is_foreign(record) -> bool:
+    return isinstance(record, CompanyDataModel) and record.currency != "PLN"
+
+
+def prefetch_record_rates(records: List[CompanyDataModel], table: Optional[RateTable] = None) -> None:
+    """
+    Start fetching the tables the records will be converted with, in the background.
+
+    Called as records come out of extraction, so the request overlaps with the
+    rest of the batch and the export finds the rates already in the table.
+    """
+    if not PER_INVOICE_RATES:
+        return
+    today = datetime.date.today()
+    days = [_rate_day(record, today) for record in records if _is_foreign(record)]
+    if days:
+        (table or get_rate_table()).prefetch_in_background(days)
+
+
+def resolve_rates(records: List[CompanyDataModel], eur_to_pln_rate: float,
+                  table: Optional[RateTable] = None) -> List[Optional[ConversionRate]]:
+    """
+    PLN conversion rate of every record, read from the rate table.
+
+    Foreign-currency invoices get the NBP rate for their invoice date (today's
+    table when the date is unknown). EUR falls back to eur_to_pln_rate when the
+    table has no rate; other currencies stay unconverted (None).
+
+    Missing tables are fetched in the background; the export waits for that at
+    most RATE_TABLE_WAIT, and not at all for days whose request recently failed.
+
+    Args:
+        records: Records to export
+        eur_to_pln_rate: Current EUR rate, the fallback for EUR invoices
+        table: Rate table (None = the shared one)
+
+    Returns:
+        (rate, table date) per record, None for PLN and for unconverted records
+    """
+    foreign = [_is_foreign(record) for record in records]
+    if not PER_INVOICE_RATES or not any(foreign):
+        return [(eur_to_pln_rate, None) if is_foreign and record.currency == "EUR" else None
+                for record, is_foreign in zip(records, foreign)]
+
+    table = table or get_rate_table()
+    today = datetime.date.today()
+    days = [_rate_day(record, today) if is_foreign else None for record, is_foreign in zip(records, foreign)]
+
+    table.prefetch_in_background(day for day in days if day is not None)
+    if not table.wait_for_prefetch(RATE_TABLE_WAIT):
+        print("[WARN] Tabela kursów NBP wciąż się pobiera - eksport bez czekania")
+
+    rates = []
+    for record, day in zip(records, days):
+        if day is None:
+            rates.append(None)
+            continue
+        rate = table.lookup(record.currency, day)
+        if rate is None:
+            if record.currency == "EUR":
+                rate = (eur_to_pln_rate, None)
+            else:
+                print(f"[WARN] Brak kursu {record.currency} z dnia {day.isoformat()} - "
+                      f"{os.path.basename(record.filepath)} bez przeliczenia")
+        rates.append(rate)
+    return rates
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Kursy walut z tabeli A NBP")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefetch_parser = subparsers.add_parser("prefetch", help="pobierz tabele z zakresu dat")
+    prefetch_parser.add_argument("date_from", type=datetime.date.fromisoformat, help="RRRR-MM-DD")
+    prefetch_parser.add_argument("date_to", type=datetime.date.fromisoformat, help="RRRR-MM-DD")
+
+    lookup_parser = subparsers.add_parser("lookup", help="kurs dla faktury z danego dnia")
+    lookup_parser.add_argument("currency", help="kod waluty, np. EUR")
+    lookup_parser.add_argument("date", type=datetime.date.fromisoformat, help="data faktury RRRR-MM-DD")
+
+    args = parser.parse_args(argv)
+    table = get_rate_table()
+
+    try:
+        if args.command == "prefetch":
+            requests_made = table.prefetch(args.date_from, args.date_to)
+            print(f"Pobrano tabele kursów w {requests_made} zapytaniach")
+            return
+        table.prefetch_dates([args.date])
+    except Exception as e:
+        print(f"[WARN] Nie udało się pobrać tabeli kursów NBP: {e}")
+
+    if args.command == "lookup":
+        rate = table.lookup(args.currency, args.date)
+        if rate is None:
+            print(f"Brak kursu {args.currency.upper()} dla faktury z dnia {args.date.isoformat()}")
+        else:
+            print(f"{args.currency.upper()}: {rate[0]:.4f} (tabela NBP z dnia {rate[1]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar('T')
+
+# HTTP status codes worth retrying - rate limiting and server-side hiccups
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls are refused because the service is considered degraded"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call or batch ran out of time"""
+
+
+class Deadline:
+    """Point in time by which work has to finish. None seconds means no deadline."""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if not seconds else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, None if there is no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def earliest(self, other: Optional['Deadline']) -> 'Deadline':
+        """The stricter of two deadlines"""
+        if other is None or other.expires_at is None:
+            return self
+        if self.expires_at is None or other.expires_at < self.expires_at:
+            return other
+        return self
+
+
+class CircuitBreaker:
+    """
+    Stops calling a degraded service.
+
+    After `failure_threshold` consecutive transient failures the circuit opens
+    and calls are refused for `reset_timeout` seconds. Then a single trial call
+    is let through (half-open); its success closes the circuit again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a call may be made now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_progress:
+                return False
+            # Half-open - let one trial call through
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"[WARN] Usługa AI niedostępna - wstrzymuję wywołania na {self.reset_timeout:.0f} s")
+                self._opened_at = time.monotonic()
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether an error is worth retrying (429/5xx, timeouts, dropped connections)"""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code in TRANSIENT_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # httpx / requests exceptions without importing either library
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connect' in name or 'RemoteProtocol' in name
+
+
+def call_with_retry(func: Callable[[], T], retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                    deadline: Optional[Deadline] = None, breaker: Optional[CircuitBreaker] = None) -> T:
+    """
+    Call func, retrying transient errors with jittered exponential backoff.
+
+    Args:
+        func: Call to make
+        retries: Retries after the first attempt
+        base_delay: Backoff base in seconds, doubled every attempt
+        max_delay: Upper bound of a single backoff
+        deadline: Give up when it expires (DeadlineExceeded)
+        breaker: Refuse calls while the circuit is open (CircuitOpenError)
+
+    Raises:
+        The last error when it is not transient or retries are exhausted
+    """
+    attempt = 0
+    while True:
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("Usługa AI chwilowo niedostępna (circuit breaker)")
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded("Przekroczono limit czasu wywołania AI")
+
+        try:
+            result = func()
+        except Exception as e:
+            if not is_transient_error(e):
+                # The service answered - a bad request says nothing about its health
+                if breaker is not None:
+                    breaker.record_success()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt >= retries:
+                raise
+
+            # Full jitter spreads retries of concurrent callers apart
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            if deadline is not None:
+                remaining = deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceeded(f"Przekroczono limit czasu wywołania AI: {e}") from e
+            print(f"[WARN] Błąd przejściowy AI ({e}) - ponowienie za {delay:.1f} s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,66 @@
+from typing import List, Optional, Tuple
+
+from src.core.local_extractor import AMOUNT_PATTERN
+from src.core.ocr_engine import WordBox
+
+# Labels that open the totals/summary block of a Polish invoice
+SUMMARY_KEYWORDS = ('razem', 'suma', 'zapłaty', 'zaplaty', 'podsumowanie', 'należność', 'naleznosc', 'total')
+# Column labels - also used in the item table header, so only a fallback
+AMOUNT_KEYWORDS = ('netto', 'brutto', 'vat')
+
+# Part of the page (relative height) above the lowest keyword still counted as the same block
+CLUSTER_HEIGHT = 0.3
+# Extra space around the block - amounts are often printed below or next to the labels
+MARGIN_TOP = 0.03
+MARGIN_BOTTOM = 0.1
+
+# (x0, y0, x1, y1) relative to page size, 0.0 - 1.0
+Region = Tuple[float, float, float, float]
+
+
+def _keyword_hits(words: List[WordBox], keywords: Tuple[str, ...]) -> List[WordBox]:
+    hits = []
+    for word in words:
+        normalized = word[0].lower().strip(' :.,;')
+        if any(normalized.startswith(keyword) for keyword in keywords):
+            hits.append(word)
+    return hits
+
+
+def find_totals_region(words: List[WordBox], image_width: int, image_height: int) -> Optional[Region]:
+    """
+    Find the likely totals/summary area from words of a low-resolution OCR pass.
+    
+    Args:
+        words: Recognized words with bounding boxes
+        image_width: Width of the image the boxes refer to
+        image_height: Height of the image the boxes refer to
+    
+    Returns:
+        Region relative to the page size, or None if no summary keywords were found
+    """
+    if image_width <= 0 or image_height <= 0:
+        return None
+    
+    hits = _keyword_hits(words, SUMMARY_KEYWORDS) or _keyword_hits(words, AMOUNT_KEYWORDS)
+    if not hits:
+        return None
+    
+    # Totals close the invoice - take the lowest keyword and everything just above it
+    lowest_bottom = max(hit[4] for hit in hits)
+    cluster_top = lowest_bottom - CLUSTER_HEIGHT * image_height
+    block = [hit for hit in hits if hit[2] >= cluster_top]
+    
+    top = min(hit[2] for hit in block) / image_height - MARGIN_TOP
+    bottom = lowest_bottom / image_height + MARGIN_BOTTOM
+    
+    # Full width - amounts are usually right-aligned, far from their labels
+    return (0.0, max(0.0, top), 1.0, min(1.0, bottom))
+
+
+def has_amounts(text: str) -> bool:
+    """Check whether OCR text contains a summary keyword and at least one amount"""
+    lowered = text.lower()
+    if not any(keyword in lowered for keyword in SUMMARY_KEYWORDS + AMOUNT_KEYWORDS):
+        return False
+    return AMOUNT_PATTERN.search(text) is not None
@@ -0,0 +1,443 @@
+import argparse
+import csv
+import datetime
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+from src.core.disk_cache import file_sha256
+from src.core.duplicate_index import NEAR_DUPLICATE_CHECK, DuplicateIndex, invoice_key
+from src.core.excel_exporter import COLUMN_WIDTHS, COLUMNS, build_rows, export_to_excel, style_header_cell
+from src.models.CompanyData import CompanyDataModel
+
+# Where exported records go: 'excel' (one growing workbook, the original behavior),
+# 'sqlite' or 'csv' (append-only ledgers, XLSX generated on demand)
+LEDGER_SINK = os.getenv('LEDGER_SINK', 'excel')
+# Ledger file, next to the default workbook in Downloads if not set
+LEDGER_PATH = os.getenv('LEDGER_PATH')
+
+SINK_NAMES = ('excel', 'sqlite', 'csv')
+
+# Sheet column -> ledger column
+LEDGER_COLUMNS = {
+    'Firma': 'company',
+    'Numer Faktury': 'invoice_number',
+    'Temat': 'topic',
+    'Typ': 'invoice_type',
+    'Netto': 'net',
+    'Brutto': 'gross',
+    'VAT': 'vat',
+    'Waluta': 'currency',
+    'Netto EUR': 'net_eur',
+    'Plik': 'file',
+    'Data faktury': 'invoice_date',
+    'Kurs': 'rate',
+    'Data kursu': 'rate_date',
+    'Netto w walucie': 'net_original',
+}
+# Ledger columns holding numbers, and the SQL types of columns added after the first release
+NUMERIC_LEDGER_COLUMNS = ('net', 'gross', 'vat', 'net_eur', 'rate', 'net_original')
+_ADDED_SQL_COLUMNS = {
+    'invoice_date': 'TEXT',
+    'rate': 'REAL',
+    'rate_date': 'TEXT',
+    'net_original': 'REAL',
+}
+
+
+def _default_ledger_path(extension: str) -> str:
+    downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
+    return os.path.join(downloads_path, f"faktury_data.{extension}")
+
+
+def _valid_records(records: List[CompanyDataModel]) -> List[CompanyDataModel]:
+    """Records that can be written - failed extractions are re-queued, not stored"""
+    valid = []
+    for record in records:
+        if not isinstance(record, CompanyDataModel):
+            print(f"Warning: Expected CompanyDataModel but got {type(record)}: {record}")
+        elif record.extraction_error:
+            print(f"[WARN] Pominięto w eksporcie {record.filepath}: {record.extraction_error}")
+        else:
+            valid.append(record)
+    return valid
+
+
+class Sink(ABC):
+    """
+    Destination of exported records.
+
+    A sink is called like the exporter function it replaces -
+    sink(records, eur_to_pln_rate) -> bool - so it plugs into run_pipeline.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def write(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        """Store the records, returns False if nothing could be written"""
+
+    def __call__(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        return self.write(records, eur_to_pln_rate)
+
+
+class ExcelSink(Sink):
+    """The workbook ledger - export_to_excel as a sink"""
+
+    name = "excel"
+
+    def __init__(self, excel_file: Optional[str] = None):
+        self.excel_file = excel_file
+
+    def write(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        return export_to_excel(records, eur_to_pln_rate, self.excel_file)
+
+
+class LedgerSink(Sink):
+    """Append-only ledger that can be queried and exported to XLSX on demand"""
+
+    @abstractmethod
+    def query(self, date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None,
+              company: Optional[str] = None, topic: Optional[str] = None,
+              invoice_from: Optional[datetime.date] = None,
+              invoice_to: Optional[datetime.date] = None) -> Iterator[Dict]:
+        """
+        Rows keyed by sheet column, oldest first.
+
+        Args:
+            date_from: First export date to include
+            date_to: Last export date to include
+            company: Only this company
+            topic: Only this topic number
+            invoice_from: First invoice date to include - rows without an invoice date are left out
+            invoice_to: Last invoice date to include - rows without an invoice date are left out
+        """
+
+
+class SQLiteSink(LedgerSink):
+    """
+    Indexed SQLite ledger. Appending is a single INSERT transaction,
+    independent of how many invoices are already stored.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or LEDGER_PATH or _default_ledger_path("sqlite3")
+        self._lock = threading.Lock()
+        connection = self._connect()
+        try:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS invoices (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    exported_at TEXT NOT NULL,
+                    company TEXT,
+                    invoice_number TEXT,
+                    topic TEXT,
+                    invoice_type TEXT,
+                    net REAL,
+                    gross REAL,
+                    vat REAL,
+                    currency TEXT,
+                    net_eur REAL,
+                    file TEXT
+                )""")
+            # Ledgers created before a column existed get it added
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(invoices)")}
+            for column, sql_type in _ADDED_SQL_COLUMNS.items():
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE invoices ADD COLUMN {column} {sql_type}")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_invoices_exported_at ON invoices (exported_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_invoices_company ON invoices (company)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_invoices_topic ON invoices (topic)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_invoices_invoice_date ON invoices (invoice_date)")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def write(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        records = _valid_records(records)
+        if not records:
+            print("No valid CompanyDataModel objects found to export.")
+            return False
+
+        exported_at = datetime.datetime.now().isoformat(timespec='seconds')
+        columns = ['exported_at'] + list(LEDGER_COLUMNS.values())
+        rows = []
+        for row in build_rows(records, eur_to_pln_rate):
+            rows.append([exported_at] + [row[sheet_column] for sheet_column in LEDGER_COLUMNS])
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.executemany(
+                            f"INSERT INTO invoices ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                            rows)
+                finally:
+                    connection.close()
+            print(f"Udało się wyeksprtować {len(rows)} rekordów do {self.db_path}")
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving to SQLite ledger: {e}")
+            return False
+
+    def query(self, date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None,
+              company: Optional[str] = None, topic: Optional[str] = None,
+              invoice_from: Optional[datetime.date] = None,
+              invoice_to: Optional[datetime.date] = None) -> Iterator[Dict]:
+        conditions = []
+        params = []
+        if date_from is not None:
+            conditions.append("exported_at >= ?")
+            params.append(date_from.isoformat())
+        if date_to is not None:
+            # Export timestamps of the last day sort below the next day
+            conditions.append("exported_at < ?")
+            params.append((date_to + datetime.timedelta(days=1)).isoformat())
+        if company is not None:
+            conditions.append("company = ?")
+            params.append(company)
+        if topic is not None:
+            conditions.append("topic = ?")
+            params.append(topic)
+        if invoice_from is not None:
+            conditions.append("invoice_date >= ?")
+            params.append(invoice_from.isoformat())
+        if invoice_to is not None:
+            conditions.append("invoice_date <= ?")
+            params.append(invoice_to.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                f"SELECT {', '.join(LEDGER_COLUMNS.values())} FROM invoices {where} ORDER BY id", params)
+            for values in cursor:
+                yield dict(zip(LEDGER_COLUMNS, values))
+        finally:
+            connection.close()
+
+
+class CsvSink(LedgerSink):
+    """Append-only CSV ledger - opened in append mode, existing rows are never read on export"""
+
+    name = "csv"
+
+    def __init__(self, csv_path: Optional[str] = None):
+        self.csv_path = csv_path or LEDGER_PATH or _default_ledger_path("csv")
+        self._lock = threading.Lock()
+
+    def _existing_header(self) -> Optional[List[str]]:
+        """Header of the ledger file, None if it does not exist yet"""
+        if not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0:
+            return None
+        with open(self.csv_path, 'r', newline='', encoding='utf-8') as file:
+            return next(csv.reader(file), None)
+
+    def write(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        records = _valid_records(records)
+        if not records:
+            print("No valid CompanyDataModel objects found to export.")
+            return False
+
+        exported_at = datetime.datetime.now().isoformat(timespec='seconds')
+        rows = build_rows(records, eur_to_pln_rate)
+        try:
+            with self._lock:
+                fieldnames = self._existing_header()
+                new_file = fieldnames is None
+                if new_file:
+                    fieldnames = ['exported_at'] + list(LEDGER_COLUMNS.values())
+                with open(self.csv_path, 'a', newline='', encoding='utf-8') as file:
+                    # A ledger started before columns were added keeps its header
+                    writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+                    if new_file:
+                        writer.writeheader()
+                    for row in rows:
+                        writer.writerow({'exported_at': exported_at,
+                                         **{LEDGER_COLUMNS[column]: row[column] for column in LEDGER_COLUMNS}})
+            print(f"Udało się wyeksprtować {len(records)} rekordów do {self.csv_path}")
+            return True
+        except OSError as e:
+            print(f"Error saving to CSV ledger: {e}")
+            return False
+
+    def query(self, date_from: Optional[datetime.date] = None, date_to: Optional[datetime.date] = None,
+              company: Optional[str] = None, topic: Optional[str] = None,
+              invoice_from: Optional[datetime.date] = None,
+              invoice_to: Optional[datetime.date] = None) -> Iterator[Dict]:
+        if not os.path.exists(self.csv_path):
+            return
+        with open(self.csv_path, 'r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                exported_on = row['exported_at'][:10]
+                if date_from is not None and exported_on < date_from.isoformat():
+                    continue
+                if date_to is not None and exported_on > date_to.isoformat():
+                    continue
+                if company is not None and row['company'] != company:
+                    continue
+                if topic is not None and row['topic'] != topic:
+                    continue
+                # Ledgers started before the column existed have no invoice dates
+                invoice_date = row.get('invoice_date') or ''
+                if invoice_from is not None and (not invoice_date or invoice_date < invoice_from.isoformat()):
+                    continue
+                if invoice_to is not None and (not invoice_date or invoice_date > invoice_to.isoformat()):
+                    continue
+                result = {}
+                for sheet_column, ledger_column in LEDGER_COLUMNS.items():
+                    value = row.get(ledger_column, '')
+                    if ledger_column in NUMERIC_LEDGER_COLUMNS:
+                        value = float(value) if value else None
+                    result[sheet_column] = value
+                yield result
+
+
+class DeduplicatingSink(Sink):
+    """
+    Refuses records of invoices that were already exported and registers
+    the written ones in the duplicate index once the wrapped sink succeeds.
+    """
+
+    def __init__(self, sink: Callable[[List[CompanyDataModel], float], bool], index: DuplicateIndex,
+                 file_hashes: Optional[Dict[str, str]] = None):
+        self.sink = sink
+        self.index = index
+        # Content hashes computed by the pre-OCR check, so files are not hashed twice
+        self.file_hashes = file_hashes if file_hashes is not None else {}
+        self.name = getattr(sink, 'name', '')
+        # Records refused as duplicates by the last write - they are not exported
+        self.last_refused = 0
+
+    def _file_hash(self, file_path: str) -> Optional[str]:
+        file_hash = self.file_hashes.get(file_path)
+        if file_hash is None and os.path.exists(file_path):
+            file_hash = file_sha256(file_path)
+        return file_hash
+
+    def write(self, records: List[CompanyDataModel], eur_to_pln_rate: float) -> bool:
+        new_records = []
+        seen = set()
+        self.last_refused = 0
+        for record in records:
+            if not isinstance(record, CompanyDataModel) or record.extraction_error:
+                # Left for the wrapped sink to reject with its usual message
+                new_records.append(record)
+                continue
+            key = invoice_key(record.company_name, record.invoice_number)
+            reason = "powtórzona w tej partii" if key in seen else \
+                self.index.find(key, self._file_hash(record.filepath))
+            if reason is not None:
+                print(f"[WARN] Odrzucono duplikat {os.path.basename(record.filepath)}: {reason}")
+                self.last_refused += 1
+                continue
+            seen.add(key)
+            new_records.append(record)
+
+        if not new_records:
+            return True
+        if not self.sink(new_records, eur_to_pln_rate):
+            return False
+
+        for record in new_records:
+            if isinstance(record, CompanyDataModel) and not record.extraction_error:
+                file_hash = self._file_hash(record.filepath)
+                hashes = None
+                if NEAR_DUPLICATE_CHECK and file_hash and os.path.exists(record.filepath):
+                    hashes = self.index.page_hashes_of(record.filepath, file_hash)
+                self.index.register(record.company_name, record.invoice_number, file_hash,
+                                    os.path.basename(record.filepath), hashes)
+        return True
+
+
+def create_sink(name: Optional[str] = None, path: Optional[str] = None) -> Sink:
+    """
+    Create a sink by name.
+
+    Args:
+        name: 'excel', 'sqlite' or 'csv' (None = LEDGER_SINK)
+        path: Workbook / ledger file (None = the default location)
+    """
+    if name is None:
+        name = LEDGER_SINK
+    if name == 'excel':
+        return ExcelSink(path)
+    if name == 'sqlite':
+        return SQLiteSink(path)
+    if name == 'csv':
+        return CsvSink(path)
+    raise ValueError(f"Unknown ledger sink: {name} (expected one of {', '.join(SINK_NAMES)})")
+
+
+def export_ledger_to_xlsx(ledger: LedgerSink, excel_file: str, date_from: Optional[datetime.date] = None,
+                          date_to: Optional[datetime.date] = None, company: Optional[str] = None,
+                          topic: Optional[str] = None, invoice_from: Optional[datetime.date] = None,
+                          invoice_to: Optional[datetime.date] = None) -> int:
+    """
+    Generate a workbook from the ledger, optionally filtered by export date, company,
+    topic or invoice date.
+    Rows are streamed into a write-only workbook, so memory stays flat for large ledgers.
+
+    Returns:
+        Number of exported rows
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sheet1')
+    for column, name in enumerate(COLUMNS, start=1):
+        worksheet.column_dimensions[get_column_letter(column)].width = COLUMN_WIDTHS[name]
+
+    header = []
+    for name in COLUMNS:
+        cell = WriteOnlyCell(worksheet, value=name)
+        style_header_cell(cell)
+        header.append(cell)
+    worksheet.append(header)
+
+    count = 0
+    for row in ledger.query(date_from, date_to, company, topic, invoice_from, invoice_to):
+        worksheet.append([row.get(name) for name in COLUMNS])
+        count += 1
+
+    workbook.save(excel_file)
+    return count
+
+
+def _parse_date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Eksport rejestru faktur do pliku XLSX")
+    parser.add_argument("output", help="plik XLSX do utworzenia")
+    parser.add_argument("--sink", choices=('sqlite', 'csv'), default=LEDGER_SINK if LEDGER_SINK != 'excel' else 'sqlite')
+    parser.add_argument("--ledger", help="plik rejestru (domyślnie w Pobranych)")
+    parser.add_argument("--from", dest="date_from", type=_parse_date, help="data eksportu od (RRRR-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=_parse_date, help="data eksportu do (RRRR-MM-DD)")
+    parser.add_argument("--company", help="tylko ta firma")
+    parser.add_argument("--topic", help="tylko ten temat")
+    parser.add_argument("--invoice-from", type=_parse_date, help="data faktury od (RRRR-MM-DD)")
+    parser.add_argument("--invoice-to", type=_parse_date, help="data faktury do (RRRR-MM-DD)")
+    args = parser.parse_args(argv)
+
+    ledger = create_sink(args.sink, args.ledger)
+    count = export_ledger_to_xlsx(ledger, args.output, args.date_from, args.date_to, args.company, args.topic,
+                                  args.invoice_from, args.invoice_to)
+    print(f"Wyeksportowano {count} rekordów do {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import atexit
+import datetime
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.core.app_paths import get_app_data_dir
+from src.core.local_extractor import LocalAmounts, detect_currency, detect_invoice_date, find_amounts, is_consistent
+
+# Per-vendor layout templates learned from earlier successful extractions
+VENDOR_TEMPLATES_ENABLED = os.getenv('VENDOR_TEMPLATES', '1') not in ('0', 'false', 'False')
+
+# Consecutive validation failures after which a template is dropped and relearned
+MAX_TEMPLATE_FAILURES = 2
+# How far above the amount line the label may be
+MAX_ANCHOR_DISTANCE = 2
+AMOUNT_TOLERANCE = 0.005
+# Hit/failure counter updates written together - templates added or dropped are saved at once
+COUNTER_SAVE_EVERY = 20
+
+FIELDS = ('net_value', 'vat_value', 'gross_value')
+
+PAGE_MARKER = re.compile(r'^=== Strona (\d+) ===$')
+
+
+def _normalize_label(line: str) -> str:
+    """Letters of a line before its first amount, e.g. 'Razem do zapłaty:' -> 'razem do zapłaty'"""
+    label = re.split(r'\d', line, maxsplit=1)[0]
+    label = re.sub(r'[^\w\s]|_', ' ', label.lower())
+    return ' '.join(label.split())[:40]
+
+
+def _layout(invoice_text: str) -> Tuple[List[str], List[Tuple[int, float]]]:
+    """
+    Split text into lines and describe where each line sits:
+    (pages from the end, relative position within the page)
+    """
+    lines: List[str] = []
+    pages: List[int] = []
+    page = 1
+    for line in invoice_text.split('\n'):
+        marker = PAGE_MARKER.match(line.strip())
+        if marker:
+            page = int(marker.group(1))
+            continue
+        if line.strip():
+            lines.append(line)
+            pages.append(page)
+
+    last_page = pages[-1] if pages else 1
+    page_lengths: Dict[int, int] = {}
+    for page in pages:
+        page_lengths[page] = page_lengths.get(page, 0) + 1
+
+    positions = []
+    seen: Dict[int, int] = {}
+    for page in pages:
+        index_in_page = seen.get(page, 0)
+        seen[page] = index_in_page + 1
+        positions.append((last_page - page, index_in_page / max(1, page_lengths[page] - 1)))
+    return lines, positions
+
+
+class VendorTemplateStore:
+    """
+    Learns per company where the totals are printed and reads them back
+    from later invoices without any network call.
+
+    A field template records the anchor label, the line offset from the label
+    to the amount, which amount on that line to take and the page position.
+    Templates are stored as JSON in the application data directory. The file is
+    rewritten when a template is added or dropped; counter updates are written
+    every COUNTER_SAVE_EVERY changes and by flush() (also called at exit).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_app_data_dir(), "vendor_templates.json")
+        self._lock = threading.Lock()
+        self._templates: Dict[str, dict] = self._load()
+        self._unsaved_changes = 0
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARN] Nie udało się wczytać szablonów dostawców: {e}")
+            return {}
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._templates, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._unsaved_changes = 0
+        except OSError as e:
+            print(f"[WARN] Nie udało się zapisać szablonów dostawców: {e}")
+
+    def flush(self) -> None:
+        """Write counter updates not saved yet"""
+        with self._lock:
+            if self._unsaved_changes:
+                self._save()
+
+    @staticmethod
+    def _key(company_name: str) -> str:
+        return company_name.strip().lower()
+
+    def has_template(self, company_name: str) -> bool:
+        with self._lock:
+            return self._key(company_name) in self._templates
+
+    def learn(self, company_name: str, invoice_text: str, net_value: float, vat_value: float,
+              gross_value: float) -> bool:
+        """
+        Learn (or relearn) the layout of a vendor from an invoice with known, consistent totals.
+        Returns True if a template was stored.
+        """
+        if not is_consistent(net_value, vat_value, gross_value):
+            return False
+
+        lines, positions = _layout(invoice_text)
+        values = {'net_value': net_value, 'vat_value': vat_value, 'gross_value': gross_value}
+        fields = {}
+
+        for field_name, value in values.items():
+            field_template = self._locate_field(lines, positions, value)
+            if field_template is None:
+                # VAT-exempt invoices have no VAT line to learn
+                if field_name == 'vat_value' and value == 0:
+                    continue
+                return False
+            fields[field_name] = field_template
+
+        with self._lock:
+            current = self._templates.get(self._key(company_name))
+            if current is not None and current['fields'] == fields:
+                # Same layout relearned - nothing new to store
+                return True
+            self._templates[self._key(company_name)] = {
+                'fields': fields,
+                'hits': 0,
+                'failures': 0,
+                'learned_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            }
+            self._save()
+        return True
+
+    @staticmethod
+    def _locate_field(lines: List[str], positions: List[Tuple[int, float]], value: float) -> Optional[dict]:
+        """Find the last line printing the value and the label it belongs to"""
+        for index in range(len(lines) - 1, -1, -1):
+            amounts = find_amounts(lines[index])
+            matches = [i for i, amount in enumerate(amounts) if abs(amount - value) <= AMOUNT_TOLERANCE]
+            if not matches:
+                continue
+
+            for offset in range(0, MAX_ANCHOR_DISTANCE + 1):
+                anchor_index = index - offset
+                if anchor_index < 0:
+                    break
+                label = _normalize_label(lines[anchor_index])
+                if label:
+                    page_from_end, page_position = positions[index]
+                    return {
+                        'anchor': label,
+                        'line_offset': offset,
+                        # Counted from the end - amount columns are right-aligned
+                        'amount_index': matches[-1] - len(amounts),
+                        'page_from_end': page_from_end,
+                        'page_position': round(page_position, 3),
+                    }
+        return None
+
+    @staticmethod
+    def _read_field(lines: List[str], positions: List[Tuple[int, float]], field_template: dict) -> Optional[float]:
+        """Read one field using its template - the anchor closest to the learned page position wins"""
+        candidates = []
+        for index, line in enumerate(lines):
+            if _normalize_label(line) != field_template['anchor']:
+                continue
+            target = index + field_template['line_offset']
+            if target >= len(lines):
+                continue
+            amounts = find_amounts(lines[target])
+            amount_index = field_template['amount_index']
+            if -len(amounts) <= amount_index < 0:
+                page_from_end, page_position = positions[target]
+                distance = (abs(page_from_end - field_template['page_from_end']),
+                            abs(page_position - field_template['page_position']))
+                candidates.append((distance, amounts[amount_index]))
+
+        if not candidates:
+            return None
+        return min(candidates)[1]
+
+    def extract(self, company_name: str, invoice_text: str) -> Optional[LocalAmounts]:
+        """
+        Extract totals with the vendor's template.
+        Returns None if there is no template or the result does not validate;
+        a template failing repeatedly is dropped so it gets relearned.
+        """
+        key = self._key(company_name)
+        with self._lock:
+            template = self._templates.get(key)
+        if template is None:
+            return None
+
+        lines, positions = _layout(invoice_text)
+        values = {}
+        for field_name in FIELDS:
+            field_template = template['fields'].get(field_name)
+            values[field_name] = 0.0 if field_template is None else self._read_field(lines, positions, field_template)
+
+        valid = all(value is not None for value in values.values()) and \
+            is_consistent(values['net_value'], values['vat_value'], values['gross_value'])
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                return None
+            if valid:
+                template['hits'] += 1
+                template['failures'] = 0
+            else:
+                template['failures'] += 1
+                if template['failures'] >= MAX_TEMPLATE_FAILURES:
+                    print(f"[INFO] Szablon dostawcy '{company_name}' przestał pasować - zostanie wyuczony ponownie")
+                    del self._templates[key]
+            self._unsaved_changes += 1
+            if key not in self._templates or self._unsaved_changes >= COUNTER_SAVE_EVERY:
+                self._save()
+
+        if not valid:
+            return None
+
+        return LocalAmounts(
+            net_value=values['net_value'],
+            gross_value=values['gross_value'],
+            vat_value=values['vat_value'],
+            currency=detect_currency(invoice_text),
+            invoice_date=detect_invoice_date(invoice_text),
+        )
+
+
+_template_store: Optional[VendorTemplateStore] = None
+_template_store_lock = threading.Lock()
+
+
+def get_template_store() -> VendorTemplateStore:
+    """Return the shared vendor template store"""
+    global _template_store
+    with _template_store_lock:
+        if _template_store is None:
+            _template_store = VendorTemplateStore()
+            atexit.register(_template_store.flush)
+        return _template_store
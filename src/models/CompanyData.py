@@ -16,4 +16,8 @@ class CompanyDataModel(BaseModel):
     
     # Derived/calculated fields
     currency: str = "PLN"       # Currency detected from invoice
+    invoice_date: Optional[str] = None  # Issue date (YYYY-MM-DD) - picks the exchange rate
     filepath: str = ""          # Original file path for reference
+    
+    # Set when the amounts could not be extracted - the invoice is re-queued, not exported
+    extraction_error: Optional[str] = None
@@ -5,10 +5,8 @@ import os
 import threading
 import datetime
 
-from src.core.get_eur_to_pln_rate import get_eur_to_pln_rate_fallback
-from src.core.ocr import extract_text_from_file
-from src.core.ai_processor import gather_specific_data
-from src.core.excel_exporter import export_to_excel
+from src.core.get_eur_to_pln_rate import DEFAULT_EUR_TO_PLN_RATE
+from src.core.rate_store import get_eur_to_pln_rate_cached, get_rate_store
 from src.core.filename_parser import validate_filename_format, get_display_name_from_filename
 
 class ModernPDFProcessor:
@@ -18,6 +16,8 @@ class ModernPDFProcessor:
         self.current_rate = None
         self.setup_ui()
         self.fetch_current_rate()
+        # OCR, AI and export modules load once the window is on screen
+        self.root.after(200, self.preload_pipeline)
         
     def setup_ui(self):
         self.root = tk.Tk()
@@ -67,33 +67,58 @@ class ModernPDFProcessor:
                            font=('Segoe UI', 11))
         subtitle.pack(pady=(5, 0))
     
-    def fetch_current_rate(self):
-        """Fetch current EUR/PLN rate in background"""
-        def fetch_rate():
+    def fetch_current_rate(self, force=False):
+        """Show the stored EUR/PLN rate at once and refresh it in background when expired"""
+        store = get_rate_store()
+        stored = store.peek()
+        if stored is not None:
+            self.current_rate = stored.rate
+            self.update_rate_display(stored.rate, stored)
+            if stored.is_fresh() and not force:
+                return
+        
+        def on_refreshed(refreshed):
+            if refreshed is None:
+                if self.current_rate is None:
+                    # Nothing stored and every source failed
+                    rate = DEFAULT_EUR_TO_PLN_RATE
+                    self.current_rate = rate
+                    self.root.after(0, lambda: self.update_rate_display(rate))
+                else:
+                    self.root.after(0, lambda: self.update_rate_display(self.current_rate, store.peek()))
+                return
+            self.current_rate = refreshed.rate
+            # Update UI on main thread
+            self.root.after(0, lambda: self.update_rate_display(refreshed.rate, refreshed))
+        
+        store.refresh_in_background(on_refreshed)
+
+    def preload_pipeline(self):
+        """Import the processing modules in the background so the first run doesn't wait for them"""
+        def load():
             try:
-                rate = get_eur_to_pln_rate_fallback()
-                self.current_rate = rate
-                # Update UI on main thread - THIS is where update_rate_display gets called
-                self.root.after(0, lambda: self.update_rate_display(rate))
+                import src.core.pipeline  # noqa: F401
             except Exception as e:
-                print(f"Error fetching rate: {e}")
-                self.current_rate = 4.8
-                self.root.after(0, lambda: self.update_rate_display(4.8))
+                # Reported again by the first processing run
+                print(f"[WARN] Nie udało się załadować modułów przetwarzania: {e}")
         
-        # Run in background thread
-        threading.Thread(target=fetch_rate, daemon=True).start()
+        threading.Thread(target=load, daemon=True).start()
 
-    def update_rate_display(self, rate):
-        """Update the rate display with current rate"""
+    def update_rate_display(self, rate, stored=None):
+        """Update the rate display with current rate and where it came from"""
         if hasattr(self, 'rate_display'):
             self.rate_display.config(text=f"{rate:.4f} PLN")
             
             # Update the info label
             if hasattr(self, 'rate_info_label'):
-                current_time = datetime.datetime.now().strftime("%H:%M")
-                self.rate_info_label.config(
-                    text=f"Kurs z NBP (Narodowy Bank Polski) - ostatnia aktualizacja: {current_time}"
-                )
+                if stored is None:
+                    text = "Kurs domyślny - nie udało się pobrać aktualnego kursu"
+                else:
+                    source = "NBP (Narodowy Bank Polski)" if stored.source == 'nbp' else stored.source
+                    fetched_at = datetime.datetime.fromisoformat(stored.fetched_at).astimezone().strftime("%d.%m %H:%M")
+                    effective = f" z dnia {stored.effective_date}" if stored.effective_date else ""
+                    text = f"Kurs z {source}{effective} - ostatnia aktualizacja: {fetched_at}"
+                self.rate_info_label.config(text=text)
 
     def refresh_exchange_rate(self):
         """Manually refresh the exchange rate"""
@@ -101,7 +126,7 @@ class ModernPDFProcessor:
             self.rate_display.config(text="Ładowanie...")
         if hasattr(self, 'rate_info_label'):
             self.rate_info_label.config(text="Pobieranie aktualnego kursu...")
-        self.fetch_current_rate()
+        self.fetch_current_rate(force=True)
 
     def create_file_section(self):
         # File selection card
@@ -325,35 +350,34 @@ class ModernPDFProcessor:
     def process_pdfs_thread(self):
         """Run the actual processing in a separate thread"""
         try:
-            invoice_data = []
+            # Loaded by preload_pipeline, normally already imported by now
+            from src.core.pipeline import run_pipeline
             
-            # Process each selected file - extract text and pair with filepath
-            for file_path in self.selected_files:
-                try:
-                    text = extract_text_from_file(file_path)
-                    clean_text = '\n'.join([line for line in text.split('\n') if line.strip() != ''])
-                    invoice_data.append((file_path, clean_text))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {e}")
-                    continue
+            # Use current rate if available, otherwise the stored (or default) one
+            eur_to_pln_rate = self.current_rate if self.current_rate else get_eur_to_pln_rate_cached()[0]
             
-            if invoice_data:
-                # Gather data using AI processor with new structure
-                gathered_data = gather_specific_data(invoice_data)  
-                
-                # Use current rate if available, otherwise fallback
-                eur_to_pln_rate = self.current_rate if self.current_rate else get_eur_to_pln_rate_fallback()
-                
-                # Export to Excel
-                success = export_to_excel(gathered_data, eur_to_pln_rate)
-                
-                if success:
-                    result_msg = f"Pomyślnie przetworzono {len(gathered_data)} faktury i wyeksportowano do pliku Excel."
-                    self.root.after(0, lambda: self.processing_success(result_msg))
-                else:
-                    self.root.after(0, lambda: self.processing_error("Błąd podczas eksportowania do pliku Excel"))
+            # OCR, AI extraction and export overlap - records are exported as they complete
+            result = run_pipeline(list(self.selected_files), eur_to_pln_rate)
+            
+            failed_msg = ""
+            if result.failed_files:
+                failed_names = ", ".join(os.path.basename(path) for path, _ in result.failed_files[:5])
+                failed_msg = f"\n\nNie udało się przetworzyć {len(result.failed_files)} plików ({failed_names}) - spróbuj ponownie później."
+            
+            if result.duplicate_files:
+                failed_msg += f"\n\nPominięto {len(result.duplicate_files)} faktur wyeksportowanych już wcześniej."
+            
+            if result.processed == 0 and result.duplicate_files and not result.failed_files:
+                info_msg = "Wszystkie wybrane faktury zostały już wcześniej wyeksportowane."
+                self.root.after(0, lambda: self.processing_success(info_msg))
+            elif result.processed == 0:
+                error_msg = "Nie znaleziono prawidłowych plików do przetworzenia" + failed_msg
+                self.root.after(0, lambda: self.processing_error(error_msg))
+            elif result.export_ok:
+                result_msg = f"Pomyślnie przetworzono {result.processed} faktury i wyeksportowano do pliku Excel." + failed_msg
+                self.root.after(0, lambda: self.processing_success(result_msg))
             else:
-                self.root.after(0, lambda: self.processing_error("Nie znaleziono prawidłowych plików do przetworzenia"))
+                self.root.after(0, lambda: self.processing_error("Błąd podczas eksportowania do pliku Excel"))
                 
         except Exception as e:
             error_msg = f"Błąd podczas przetwarzania: {str(e)}"